@@ -7,6 +7,7 @@ from itsdangerous import URLSafeTimedSerializer
 from flask import Flask, render_template, request, session
 from flask_login import current_user
 from celery import Celery
+from sqlalchemy.orm import joinedload
 from logging.handlers import SMTPHandler
 from werkzeug.middleware.proxy_fix import ProxyFix
 
@@ -19,9 +20,9 @@ from badmintontv.blueprints.billing.views.stripe_webhook import stripe_webhook
 from badmintontv.blueprints.video.views import video
 from badmintontv.blueprints.user.models import User
 from badmintontv.blueprints.billing.template_processors import format_currency, current_year
-from badmintontv.blueprints.admin.template_processors import hms_to_s
-from badmintontv.blueprints.video.template_processors import format_country
-from badmintontv.extensions import debug_toolbar, csrf, db, login_manager, babel
+from badmintontv.blueprints.admin.template_processors import hms_to_s, s_to_hms
+from badmintontv.blueprints.video.template_processors import format_country, poster_url
+from badmintontv.extensions import debug_toolbar, csrf, db, login_manager, babel, page_cache
 
 # List of Celery tasks 
 CELERY_TASK_LIST = [
@@ -29,6 +30,7 @@ CELERY_TASK_LIST = [
     'badmintontv.blueprints.user.tasks',
     'badmintontv.blueprints.billing.tasks',
     'badmintontv.blueprints.admin.tasks',
+    'badmintontv.blueprints.video.tasks',
 ]
 
 
@@ -172,6 +174,7 @@ def extensions(app):
     db.init_app(app)
     login_manager.init_app(app)
     babel.init_app(app)
+    page_cache.init_app(app)
 
 
 def template_processors(app):
@@ -187,7 +190,9 @@ def template_processors(app):
     # Allow these filters to be called from any template 
     app.jinja_env.filters['format_currency'] = format_currency
     app.jinja_env.filters['hms_to_s'] = hms_to_s
+    app.jinja_env.filters['s_to_hms'] = s_to_hms
     app.jinja_env.filters['format_country'] = format_country
+    app.jinja_env.filters['poster_url'] = poster_url
     
     # Allow this variable to be used in any template 
     app.jinja_env.globals.update(current_year=current_year)
@@ -214,9 +219,9 @@ def authentication(app, user_model):
         
         This is used when calling `flask_login.current_user`
         
-        In this case, we get User by ID
+        In this case, we get User by ID, with their subscription (checked by `video_lock` on every match page)
         '''
-        return user_model.query.get(uid)
+        return user_model.query.options(joinedload(user_model.subscription)).get(uid)
 
 
 def locale(app):
@@ -1,21 +1,43 @@
-import datetime
+from libs.util_datetime import time_to_seconds
 
 
 def hms_to_s(hms):
     '''
     Converts hours-minutes-seconds to seconds 
     
+    Note: Durations are stored in seconds, which are returned as they are
+    
     Params:
-        hms (datetime.time)
+        hms (datetime.time, str or int)
         
     Returns:
         seconds (int)
     '''
     
-    seconds = datetime.timedelta(
-        hours=hms.hour,
-        minutes=hms.minute,
-        seconds=hms.second
-    ).total_seconds()
+    return time_to_seconds(hms)
+
+
+def s_to_hms(seconds):
+    '''
+    Converts seconds to hours-minutes-seconds, for display
+    
+    Hours don't wrap around at 24 (unlike `seconds_to_time`), since this shows totals of watch time
+    
+    eg.
+        303 --> '00:05:03'
+        90000 --> '25:00:00'
+    
+    Params:
+        seconds (int)
+        
+    Returns:
+        hms (str), or None if `seconds` is None
+    '''
+    
+    if seconds is None:
+        return None
+    
+    minutes, second = divmod(int(seconds), 60)
+    hour, minute = divmod(minutes, 60)
     
-    return int(seconds)
+    return '{:02}:{:02}:{:02}'.format(hour, minute, second)
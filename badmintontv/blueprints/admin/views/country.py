@@ -7,7 +7,7 @@ from sqlalchemy import text
 
 import libs.util_sqlalchemy as utils
 
-from badmintontv.blueprints.video.models import Country, Team, Video, videos_teams
+from badmintontv.blueprints.video.models import Country, Team, Video, matches_teams
 from badmintontv.blueprints.admin.forms import SearchForm, BulkDeleteForm, CountryForm
 from badmintontv.blueprints.admin.views.dashboard import admin
 from badmintontv.extensions import db, csrf
@@ -6,14 +6,15 @@ from flask_login import login_required
 
 
 from config import settings
-from libs.util_datetime import localize_datetime
+from libs.util_datetime import localize_datetime, time_to_seconds
 from badmintontv.blueprints.admin.models import Dashboard
 from badmintontv.blueprints.admin.forms import AddVideosForm
 from badmintontv.blueprints.user.models import User
 from badmintontv.blueprints.user.decorators import role_required
 from badmintontv.blueprints.billing.models.subscription import Subscription
-from badmintontv.blueprints.video.models import Video, Tournament, Team, Country, videos_teams
-from badmintontv.blueprints.view.models import View
+from badmintontv.blueprints.video.models import Match, Video, Tournament, Team, Country
+from badmintontv.blueprints.view.models import View, WATCH_TIME_GROUPS
+from badmintontv.extensions import db, page_cache
 
 admin = Blueprint(
     'admin', 
@@ -51,6 +52,12 @@ def dashboard():
         if num_new_videos > 0:
             flash('{} videos added'.format(num_new_videos), 'success')
             
+            # Add the new videos to "Up next" lists, and make them faststart in the background, which then 
+            # segments them into HLS, and makes their posters & scrubbing previews (once their files won't move)
+            from badmintontv.blueprints.video.tasks import compute_related_videos, make_videos_faststart
+            compute_related_videos.delay()
+            make_videos_faststart.delay()
+            
         # Flash error message
         else:
             flash('No videos to add', 'error')
@@ -79,6 +86,12 @@ def dashboard():
         model=View,
         field=View.country
     )
+    
+    # Most watched tournaments, teams, ... (summed in the DB)
+    watch_time = {
+        by: View.watch_time(by, limit=10) 
+        for by in WATCH_TIME_GROUPS
+    }
 
     return render_template(
         'admin/page/dashboard.html', 
@@ -91,6 +104,8 @@ def dashboard():
         group_and_count_region=group_and_count_region,
         group_and_count_locale=group_and_count_locale,
         group_and_count_view=group_and_count_view,
+        watch_time=watch_time,
+        page_cache_stats=page_cache.stats(),
         prices=settings.STRIPE_PRICES,
         LANGUAGES=settings.LANGUAGES
     )
@@ -107,6 +122,9 @@ def _new_videos(add=False):
     Note: `tournament_folder`, `match_folder` and `highlights_type` can never be 
     updated since we use them to search for the corresponding video
     
+    Note: Each match is committed once, with its tournament, teams and all of its new videos, so a 
+    match is never saved without its videos
+    
     Params:
         add (bool): If True, add new videos; False to just return their metadata
     
@@ -158,6 +176,9 @@ def _new_videos(add=False):
                 metadata_run = json.load(open(metadata_run_path))
                 metadata_match = json.load(open(metadata_match_path))
                 
+                # Shared by the videos added below
+                match_obj = None
+                
                 # Add video entries for each of the video types
                 for highlights_type in ['Highlights', 'Extended Highlights']:
                 
@@ -167,6 +188,9 @@ def _new_videos(add=False):
                         if highlights_type == 'Extended Highlights' \
                         else metadata_run['version_to_metadata']['3']['duration_filtered_highlights']
                     
+                    # Stored in seconds 
+                    highlights_duration = time_to_seconds(highlights_duration)
+                    
                     # Search for video in DB
                     video = Video.find_by_folder_name_highlights_type(
                         folder=tournament, 
@@ -219,24 +243,27 @@ def _new_videos(add=False):
                         team2 = metadata_match['team2']
                         teams = create_teams(team1, team2, country1, country2)
                         
-                        # Video                         
-                        metadata = {
+                        # Match (shared by all highlights types)
+                        match_metadata = {
                             'folder': metadata_run['tournament_folder'],
                             'name': metadata_run['match_folder'],
                             'filename': metadata_run['match_filename'],
                             
-                            'highlights_datetime': highlights_datetime,
-                            'highlights_type': highlights_type,
-                            'highlights_filename': highlights_filename,
-                            'highlights_duration': highlights_duration,
-                            
                             'date': date,
                             'round': metadata_match['round'] if metadata_match['round'] is not None else 'Not Recognized',
                             'discipline': metadata_match['discipline'] if metadata_match['discipline'] is not None else 'Not Recognized',
                             
                             # Relationships 
-                            'tournament_id': tournament_obj.id,
-                            'teams': teams,
+                            'tournament': tournament_obj,
+                            'teams': teams
+                        }
+                        
+                        # Video                         
+                        metadata = {
+                            'highlights_datetime': highlights_datetime,
+                            'highlights_type': highlights_type,
+                            'highlights_filename': highlights_filename,
+                            'highlights_duration': highlights_duration,
                             
                             # AI metadata
                             'model_name': metadata_run['tasks']['Action Spotting']['model_name']
@@ -244,21 +271,35 @@ def _new_videos(add=False):
                         
                         # Add new video to DB 
                         if add:
-                            video = Video(**metadata)
-                            video.save()
+                            
+                            # The match exists if another highlights type was already added 
+                            if match_obj is None:
+                                match_obj = Match.find_by_folder_name(
+                                    folder=match_metadata['folder'],
+                                    name=match_metadata['name']
+                                )
+                            if not match_obj:
+                                match_obj = Match(**match_metadata)
+                            
+                            # Committed with its match below (added with it, by cascade)
+                            db.session.add(Video(match=match_obj, **metadata))
                         
                         # Make sure key exists 
-                        folder = metadata['folder']
+                        folder = match_metadata['folder']
                         if folder not in new_videos_metadata:
                             new_videos_metadata[folder] = []
                         
                         # Note this tournament-match-highlights combo
                         new_videos_metadata[folder].append({
-                            'name': metadata['name'],                                
+                            'name': match_metadata['name'],                                
                             'highlights_type': metadata['highlights_type'],
                         })
                         
                         num_new_videos += 1
+                
+                # Commit the match with its new videos at once
+                if add and match_obj is not None:
+                    db.session.commit()
 
     return new_videos_metadata, num_new_videos
 
@@ -267,6 +308,8 @@ def create_tournament(name, date):
     '''
     Ensures tournament with `name` is in DB, and its start-end dates are updated
     
+    Note: It's committed with its match (see `_new_videos`)
+    
     Returns:
         tournament (Tournament)
     '''
@@ -283,7 +326,7 @@ def create_tournament(name, date):
             start_date=date,
             end_date=date
         )
-        tournament.save()
+        db.session.add(tournament)
     
     # Edit start-end dates
     else:
@@ -295,8 +338,6 @@ def create_tournament(name, date):
         # End date 
         if date > tournament.end_date:
             tournament.end_date = date
-        
-        tournament.save()
     
     return tournament
 
@@ -319,7 +360,7 @@ def create_countries(country1, country2):
         country = Country.find_by_name(name)
         if not country:
             country = Country(name)
-            country.save()
+            db.session.add(country)
         
         countries.append(country)
     
@@ -348,7 +389,10 @@ def create_teams(team1, team2, country1, country2):
         team = Team.find_by_name(name)
         if not team:
             team = Team(name, country)
-            team.save()
+            
+            # eg. 'Kamura_Sonoda' --> 'Kamura', 'Sonoda'
+            team.link_players()
+            db.session.add(team)
         
         teams.append(team)
     
@@ -59,6 +59,9 @@ def teams_edit(id):
 
         # Populate teams with form 
         form.populate_obj(team)
+        
+        # The name may have changed, so re-link its players
+        team.link_players()
 
         # Save to DB
         team.save()
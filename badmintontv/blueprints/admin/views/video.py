@@ -6,7 +6,7 @@ from flask_login import login_required
 
 import libs.util_sqlalchemy as utils
 
-from badmintontv.blueprints.video.models import Video, Tournament, Team, Country, videos_teams
+from badmintontv.blueprints.video.models import Match, Video, Tournament, Team, Country, matches_teams
 from badmintontv.blueprints.admin.forms import SearchForm, BulkDeleteForm, VideoForm
 from badmintontv.blueprints.admin.views.dashboard import admin
 
@@ -24,8 +24,10 @@ def videos(page):
         model=Video
     )
 
-    paginated_videos, count = utils.simple_paginate(
+    # Joined, so it can be sorted by the match's name or date
+    paginated_videos, count = utils.paginate_join(
         model=Video,
+        model_join_on=Match,
         order_values=order_values,
         page=page
     )
@@ -47,25 +49,25 @@ def videos_edit(id):
     # Get user by ID 
     video = Video.query.get(id)
     
-    # Populate form with video data
-    form = VideoForm(obj=video)
+    # Populate form with match data (shared by all of its highlights types)
+    form = VideoForm(obj=video.match)
     
     # POST request 
     if form.validate_on_submit():
         
-        old_tournament = video.tournament
+        old_tournament = video.match.tournament
 
-        # Populate video with form 
-        form.populate_obj(video)
+        # Populate match with form 
+        form.populate_obj(video.match)
         
         # Edit tournament start-end dates
-        new_tournament = video.tournament
+        new_tournament = video.match.tournament
         _edit_tournament_dates(
             tournaments=[old_tournament, new_tournament]
         )
 
         # Save to DB
-        video.save()
+        video.match.save()
 
         # Flash confirmation message
         flash('Video has been updated successfully.', 'success')
@@ -74,8 +76,8 @@ def videos_edit(id):
         return redirect(url_for('admin.videos_edit', id=id))
 
     # Get all countries for this video
-    all_countries = Country.query.join(Team).join(videos_teams).join(Video).filter(
-        Video.name == video.name
+    all_countries = Country.query.join(Team).join(matches_teams).filter(
+        matches_teams.c.match_id == video.match_id
     ).all()
 
     # Form submission failed - keep form data 
@@ -93,8 +95,8 @@ def _edit_tournament_dates(tournaments):
         
         start_date = None
         end_date = None
-        for video_temp in tournament.videos:
-            date = video_temp.date
+        for match_temp in tournament.matches:
+            date = match_temp.date
             
             # Initial assignment 
             if not start_date and not end_date:
@@ -1,7 +1,8 @@
+import time
 import stripe
 
 from functools import wraps
-from flask import redirect, url_for, flash
+from flask import redirect, url_for, flash, abort, session, current_app
 from flask_login import current_user
 
 
@@ -30,13 +31,57 @@ def video_lock(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         
-        if not current_user.is_authenticated or not (current_user.subscription or current_user.role == 'admin'):
+        if not _can_watch():
             return redirect(url_for('billing.pricing'))
 
         return f(*args, **kwargs)
     return decorated_function
 
 
+def stream_lock(f):
+    '''
+    Locks a video stream, like `video_lock`, but only checks the user once per session
+
+    A player sends many (range) requests per video, so the 1st allowed request stores a grant in 
+    the signed session cookie, and the next ones are let through without loading the user & their 
+    subscription. The grant is tied to the logged-in user, and expires after `STREAM_GRANT_DURATION`
+    (so a cancelled subscription is noticed)
+
+    Note: Answers 403 rather than redirecting, since the pricing page can't be played
+
+    Returns: Function
+    '''
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        
+        grant = session.get('stream_grant')
+        
+        # Flask-Login keeps the logged-in user's ID in `session['user_id']`
+        is_granted = (
+            grant is not None 
+            and grant['user_id'] == session.get('user_id') 
+            and grant['expires'] > time.time()
+        )
+        
+        if not is_granted:
+            if not _can_watch():
+                abort(403)
+
+            duration = current_app.config['STREAM_GRANT_DURATION']
+            session['stream_grant'] = {
+                'user_id': session.get('user_id'),
+                'expires': int(time.time() + duration.total_seconds())
+            }
+
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _can_watch():
+    '''Is the current user allowed to watch videos? (Subscribers & admins)'''
+    return current_user.is_authenticated and bool(current_user.subscription or current_user.role == 'admin')
+
+
 def handle_stripe_exceptions(f):
     '''
     Handle Stripe exceptions so they do not throw 500s errors back to the user
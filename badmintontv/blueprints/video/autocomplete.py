@@ -0,0 +1,181 @@
+import threading
+
+from bisect import bisect_left
+
+from badmintontv.blueprints.video.catalog import catalog_cache
+
+# Number of keystrokes before suggesting anything
+AUTOCOMPLETE_MIN_LENGTH = 2
+
+# Order of suggestion kinds, when names start the same
+AUTOCOMPLETE_KINDS = ('team', 'player', 'tournament')
+
+# Max number of keys looked at per suggestion asked for, so a short prefix starting 
+# thousands of later words (eg. 'li') stays a short scan
+AUTOCOMPLETE_SCAN_FACTOR = 3
+
+
+class Suggestion(object):
+    '''
+    1 name that can be suggested
+
+    eg.
+        Suggestion('player', 'Yuta Watanabe', 'Yuta Watanabe', 'JPN')
+    '''
+
+    __slots__ = ('kind', 'name', 'query', 'country')
+
+    def __init__(self, kind, name, query, country=None):
+        self.kind = kind
+        self.name = name
+        self.query = query
+        self.country = country
+
+
+def _normalize(text):
+    '''Case-insensitive form of `text`, with doubles' separators ('_' or ' / ') turned into spaces'''
+    return ' '.join(text.replace('_', ' ').replace('/', ' ').casefold().split())
+
+
+class AutocompleteIndex(object):
+    '''
+    Sorted array of every searchable key, looked up by binary search
+
+    Each name is stored under its full name and under every later word, so 'mom' finds
+    'Kento Momota'. Keys are kept in parallel lists (rather than a trie of dicts), so the
+    index is small and a lookup is 1 `bisect` + a short scan of consecutive keys
+
+    Attributes:
+        keys (list):          Sorted, normalized keys
+        suggestions (list):   `Suggestion` of each key
+        full_names (list):    Whether each key is the full name (rather than a later word)
+    '''
+
+    __slots__ = ('catalog', 'keys', 'suggestions', 'full_names')
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.keys = []
+        self.suggestions = []
+        self.full_names = []
+
+    @classmethod
+    def build(cls, catalog):
+        '''
+        Index the teams, players and tournaments of `catalog`
+
+        Note: Only doubles players are suggested (a singles player is already suggested as a team), 
+        and they suggest all of their matches, with any partner
+
+        Params:
+            catalog (Catalog)
+
+        Returns: AutocompleteIndex
+        '''
+
+        index = cls(catalog)
+
+        suggestions = []
+        players = {}
+        for team in catalog.teams:
+            country = team.country.name if team.country else None
+
+            suggestions.append(Suggestion('team', team.name.replace('_', ' / '), team.name, country))
+
+            # A player can be in several doubles teams, but is only suggested once
+            if len(team.players) > 1:
+                for player in team.players:
+                    players.setdefault(player, Suggestion('player', player, player, country))
+        
+        suggestions.extend(players.values())
+
+        # Tournaments link to their year, and the same name comes back every year, so only its latest edition is suggested
+        tournaments = {}
+        for tournament in sorted(catalog.tournaments, key=lambda tournament: tournament.start_date, reverse=True):
+            tournaments.setdefault(tournament.name, Suggestion('tournament', tournament.name, tournament.start_date.year))
+
+        suggestions.extend(tournaments.values())
+
+        entries = []
+        for suggestion in suggestions:
+            words = _normalize(suggestion.name).split(' ')
+
+            for i in range(len(words)):
+                entries.append((' '.join(words[i:]), AUTOCOMPLETE_KINDS.index(suggestion.kind), len(entries), suggestion))
+
+        entries.sort(key=lambda entry: entry[:3])
+
+        index.keys = [entry[0] for entry in entries]
+        index.suggestions = [entry[3] for entry in entries]
+        index.full_names = [entry[0] == _normalize(entry[3].name) for entry in entries]
+
+        return index
+
+    def suggest(self, prefix, limit=10):
+        '''
+        Get the names starting with `prefix` (or with a word starting with `prefix`)
+
+        Params:
+            prefix (str):   What was typed so far
+            limit (int):    Max number of suggestions
+
+        Returns: List of `Suggestion`s, full-name matches first
+
+        Note: At most `limit * AUTOCOMPLETE_SCAN_FACTOR` keys are looked at, so a full-name match sorted after 
+        many later-word matches can be left out
+        '''
+
+        prefix = _normalize(prefix)
+        if len(prefix) < AUTOCOMPLETE_MIN_LENGTH:
+            return []
+
+        keys = self.keys
+
+        # Keys starting with `prefix` are consecutive, starting at `bisect_left`
+        full, partial = [], []
+        position = bisect_left(keys, prefix)
+        end = min(len(keys), position + limit * AUTOCOMPLETE_SCAN_FACTOR)
+        while position < end and keys[position].startswith(prefix) and len(full) < limit:
+            (full if self.full_names[position] else partial).append(self.suggestions[position])
+            position += 1
+
+        # Full-name matches first; A name can match on several of its words, so only keep it once
+        suggestions = []
+        seen = set()
+        for suggestion in full + partial:
+            if id(suggestion) in seen:
+                continue
+            seen.add(id(suggestion))
+
+            suggestions.append(suggestion)
+            if len(suggestions) == limit:
+                break
+
+        return suggestions
+
+
+class AutocompleteIndexCache(object):
+    '''Keeps the `AutocompleteIndex` of the current catalog version'''
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        '''
+        Get the autocomplete index, rebuilding it if the catalog changed
+
+        Returns: AutocompleteIndex
+        '''
+
+        catalog = catalog_cache.get()
+
+        if self._index is None or self._index.catalog is not catalog:
+            with self._lock:
+                if self._index is None or self._index.catalog is not catalog:
+                    self._index = AutocompleteIndex.build(catalog)
+
+        return self._index
+
+
+autocomplete_index_cache = AutocompleteIndexCache()
@@ -0,0 +1,589 @@
+import time
+import datetime
+import threading
+
+from array import array
+from itertools import chain
+from flask import current_app
+from sqlalchemy import event, select, inspect
+from sqlalchemy.orm import MANYTOONE
+
+from libs.util_cache import LRUBackend
+from badmintontv.extensions import db, page_cache
+from badmintontv.blueprints.video.models import CatalogVersion, Match, Video, Tournament, Team, Country, Player, RelatedVideos, matches_teams, teams_players
+
+# Models that make up the catalog; Changing any of them bumps the catalog version
+CATALOG_MODELS = (Match, Video, Tournament, Team, Country, Player)
+
+# Models only shown on the match page; Changing them bumps the match version instead (see `CatalogVersion`),
+# so the catalog isn't rebuilt, and cached pages are kept
+MATCH_PAGE_MODELS = (RelatedVideos,)
+
+# Columns of `Video` only shown on the match page (its derived files); Changing only these bumps the match 
+# version too, and only drops that video's cached match page (see `MatchCache`)
+MATCH_PAGE_COLUMNS = frozenset(('hls_manifest', 'hls_master', 'hls_ladder', 'sprites'))
+
+# Columns of `Video` no page shows (file bookkeeping); Changing only these bumps nothing
+UNSHOWN_COLUMNS = frozenset(('faststart',))
+
+
+# -------------------------------------------
+# ----------------- Records -----------------
+# -------------------------------------------
+
+class CountryRecord(object):
+    '''Read-only copy of a `Country`'''
+
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+class TeamRecord(object):
+    '''Read-only copy of a `Team`, with the names of its players'''
+
+    __slots__ = ('id', 'name', 'country', 'players')
+
+    def __init__(self, id, name, country):
+        self.id = id
+        self.name = name
+        self.country = country
+        self.players = []
+
+
+class TournamentRecord(object):
+    '''Read-only copy of a `Tournament`'''
+
+    __slots__ = ('id', 'name', 'start_date', 'end_date')
+
+    def __init__(self, id, name, start_date, end_date):
+        self.id = id
+        self.name = name
+        self.start_date = start_date
+        self.end_date = end_date
+
+
+class MatchRecord(object):
+    '''Read-only copy of the `Match` fields used by the browse pages'''
+
+    __slots__ = ('id', 'folder', 'name', 'date', 'round', 'discipline', 'tournament', 'teams', 'renditions')
+
+    def __init__(self, id, folder, name, date, round, discipline, tournament):
+        self.id = id
+        self.folder = folder
+        self.name = name
+        self.date = date
+        self.round = round
+        self.discipline = discipline
+        self.tournament = tournament
+        self.teams = []
+        self.renditions = []
+
+    def find_rendition(self, highlights_type):
+        '''Get the `RenditionRecord` of `highlights_type`, or None'''
+
+        for rendition in self.renditions:
+            if rendition.highlights_type == highlights_type:
+                return rendition
+
+        return None
+
+    @property
+    def poster(self):
+        '''Poster key of the match's 1st video that has one, or None'''
+
+        for rendition in self.renditions:
+            if rendition.poster is not None:
+                return rendition.poster
+
+        return None
+
+
+class RenditionRecord(object):
+    '''Read-only copy of a `Video` (1 highlights type of a match)'''
+
+    __slots__ = ('id', 'highlights_type', 'poster', 'match')
+
+    def __init__(self, id, highlights_type, poster, match):
+        self.id = id
+        self.highlights_type = highlights_type
+        self.poster = poster
+        self.match = match
+
+
+# -------------------------------------------
+# ----------------- Catalog -----------------
+# -------------------------------------------
+
+class Catalog(object):
+    '''
+    In-memory snapshot of all tournaments, teams, countries, matches and their videos
+
+    `matches` is stored in browse order (see `Match.find_for_browse`), and each index
+    maps a key to an array of positions in `matches`, so every lookup is already sorted
+
+    Indexes:
+        matches_by_id (dict):           Match ID --> `MatchRecord`
+        matches_by_year (dict):         Tournament year --> positions
+        matches_by_tournament (dict):   Tournament ID --> positions
+        matches_by_team (dict):         Team name --> positions
+        matches_by_country (dict):      Country name --> positions
+        matches_by_pair (dict):         `pair_key` of 2 team names --> positions (head-to-head)
+        matches_by_player (dict):       Player name --> positions (singles and every doubles partnership)
+        renditions_by_id (dict):        Video ID --> `RenditionRecord`
+    '''
+
+    __slots__ = (
+        'version', 'updated_on', 'matches', 'tournaments', 'teams', 'countries', 'years', 'teams_by_name',
+        'tournaments_by_id', '_latest_tournament', 'renditions_by_id',
+        'matches_by_id', 'matches_by_year', 'matches_by_tournament', 'matches_by_team', 'matches_by_country', 'matches_by_pair',
+        'matches_by_player'
+    )
+
+    def __init__(self, version, updated_on=None):
+        self.version = version
+        self.updated_on = updated_on
+
+        self.matches = []
+        self.tournaments = []
+        self.teams = []
+        self.countries = []
+        self.years = []
+        self.teams_by_name = {}
+        self.tournaments_by_id = {}
+        
+        # `(day, TournamentRecord)` memo of `find_latest_tournament`
+        self._latest_tournament = None
+
+        self.renditions_by_id = {}
+
+        self.matches_by_id = {}
+        self.matches_by_year = {}
+        self.matches_by_tournament = {}
+        self.matches_by_team = {}
+        self.matches_by_country = {}
+        self.matches_by_pair = {}
+        self.matches_by_player = {}
+
+    @classmethod
+    def build(cls, version):
+        '''
+        Load the whole catalog from the DB
+
+        Note: This runs 9 plain SELECTs, no matter how big the catalog is
+
+        Params:
+            version (int): Catalog version being loaded
+
+        Returns: Catalog
+        '''
+
+        # When the catalog was last changed
+        updated_on = db.session.query(CatalogVersion.updated_on).filter(CatalogVersion.id == 1).scalar()
+
+        catalog = cls(version, updated_on)
+
+        # Countries
+        countries = {}
+        for row in db.session.execute(select(Country.id, Country.name).order_by(Country.name.asc())):
+            countries[row.id] = CountryRecord(row.id, row.name)
+
+        # Teams
+        teams = {}
+        for row in db.session.execute(select(Team.id, Team.name, Team.country_id).order_by(Team.name.asc())):
+            teams[row.id] = TeamRecord(row.id, row.name, countries.get(row.country_id))
+
+        # Players of each team
+        query = select(
+                teams_players.c.team_id, Player.name
+            ).join(
+                Player, teams_players.c.player_id == Player.id
+            )
+        for row in db.session.execute(query):
+            if row.team_id in teams:
+                teams[row.team_id].players.append(row.name)
+        
+        # In the order of the team's name (eg. 'Kamura_Sonoda' --> ['Kamura', 'Sonoda'])
+        for team in teams.values():
+            if len(team.players) > 1:
+                order = Player.names_in(team.name)
+                team.players.sort(key=lambda name: order.index(name) if name in order else len(order))
+
+        # Tournaments
+        tournaments = {}
+        for row in db.session.execute(select(Tournament.id, Tournament.name, Tournament.start_date, Tournament.end_date)):
+            tournaments[row.id] = TournamentRecord(row.id, row.name, row.start_date, row.end_date)
+
+        # Matches, in browse order
+        matches = {}
+        query = select(
+                Match.id, Match.folder, Match.name, Match.date,
+                Match.round, Match.discipline, Match.tournament_id
+            ).join(
+                Tournament, Match.tournament_id == Tournament.id
+            ).order_by(
+                Tournament.start_date.desc(),
+                Tournament.id.desc(),
+                Match.date.desc(),
+                Match.id.desc()
+            )
+        for row in db.session.execute(query):
+            matches[row.id] = MatchRecord(
+                row.id, row.folder, row.name, row.date,
+                row.round, row.discipline, tournaments[row.tournament_id]
+            )
+
+        # Teams of each match
+        for row in db.session.execute(select(matches_teams.c.match_id, matches_teams.c.team_id)):
+            if row.match_id in matches and row.team_id in teams:
+                matches[row.match_id].teams.append(teams[row.team_id])
+
+        # Videos of each match
+        renditions = {}
+        query = select(Video.id, Video.match_id, Video.highlights_type, Video.poster).order_by(Video.highlights_type, Video.id)
+        for row in db.session.execute(query):
+            match = matches.get(row.match_id)
+            if match is not None:
+                rendition = renditions[row.id] = RenditionRecord(row.id, row.highlights_type, row.poster, match)
+                match.renditions.append(rendition)
+
+        catalog.countries = list(countries.values())
+        catalog.teams = list(teams.values())
+        catalog.tournaments = list(tournaments.values())
+        catalog.teams_by_name = {team.name: team for team in catalog.teams}
+        catalog.matches_by_id = matches
+        catalog.renditions_by_id = renditions
+        catalog.tournaments_by_id = tournaments
+        catalog.years = Tournament.find_years()
+
+        # Build indexes
+        for position, match in enumerate(matches.values()):
+            catalog.matches.append(match)
+
+            _index(catalog.matches_by_year, match.tournament.start_date.year, position)
+            _index(catalog.matches_by_tournament, match.tournament.id, position)
+
+            # Make sure a match is only indexed once per country (eg. JPN vs JPN)
+            for country_name in set(team.country.name for team in match.teams if team.country):
+                _index(catalog.matches_by_country, country_name, position)
+
+            for team in match.teams:
+                _index(catalog.matches_by_team, team.name, position)
+            
+            if len(match.teams) == 2:
+                _index(catalog.matches_by_pair, cls.pair_key(match.teams[0].name, match.teams[1].name), position)
+            
+            # Make sure a match is only indexed once per player (eg. a team with a misspelt duplicate)
+            for player in set(player for team in match.teams for player in team.players):
+                _index(catalog.matches_by_player, player, position)
+
+        return catalog
+
+    @staticmethod
+    def pair_key(team_a, team_b):
+        '''
+        Key of `matches_by_pair`; Same key whichever side each team played on
+        
+        eg.
+            Catalog.pair_key('Viktor Axelsen', 'Kento Momota') --> ('Kento Momota', 'Viktor Axelsen')
+        
+        Returns: tuple
+        '''
+        return (team_a, team_b) if team_a <= team_b else (team_b, team_a)
+
+    def find_matches(self, index, key):
+        '''
+        Get all matches stored under `key` in `index`
+
+        eg.
+            catalog.find_matches(catalog.matches_by_team, 'Kento Momota')
+
+        Params:
+            index (dict):   One of the `matches_by_*` indexes
+            key:            Key to look up
+
+        Returns: Generator of `MatchRecord`s, in browse order
+        '''
+
+        matches = self.matches
+
+        return (matches[position] for position in index.get(key, ()))
+
+    def find_renditions_by_id(self, ids):
+        '''
+        Get the videos with these IDs, skipping those that no longer exist
+        
+        Params:
+            ids (list): Video IDs
+        
+        Returns: List of `RenditionRecord`s, in the order of `ids`
+        '''
+        
+        renditions_by_id = self.renditions_by_id
+        
+        return [renditions_by_id[id] for id in ids if id in renditions_by_id]
+
+    def find_latest_tournament(self, today=None):
+        '''
+        Get the tournament that starts closest to `today` (older tournament wins ties)
+        
+        Looked up with `Tournament.find_latest` once per day; The memo lives as long as 
+        this catalog, so it's dropped as soon as tournaments change
+        
+        Params:
+            today (datetime.date): Defaults to today
+        
+        Returns: `TournamentRecord` or None
+        '''
+        
+        if today is None:
+            today = datetime.date.today()
+        
+        memo = self._latest_tournament
+        if memo is None or memo[0] != today:
+            tournament = Tournament.find_latest(today)
+            
+            memo = self._latest_tournament = (today, self.tournaments_by_id.get(tournament.id) if tournament else None)
+        
+        return memo[1]
+
+
+def _index(index, key, position):
+    '''Append `position` to the array stored under `key` in `index`'''
+
+    if key not in index:
+        index[key] = array('I')
+
+    index[key].append(position)
+
+
+class CatalogCache(object):
+    '''
+    Keeps 1 `Catalog` per worker, and rebuilds it lazily when the catalog version changes
+
+    The version is only checked every `CATALOG_VERSION_CHECK_INTERVAL` seconds,
+    so most requests are served without touching the DB
+
+    Attributes:
+        match_version (int):   Match version seen by the last check (see `CatalogVersion`)
+    '''
+
+    def __init__(self):
+        self._catalog = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        self.match_version = 0
+
+    def get(self):
+        '''
+        Get the current catalog, rebuilding it if it's out of date
+
+        Returns: Catalog
+        '''
+
+        interval = current_app.config.get('CATALOG_VERSION_CHECK_INTERVAL', 0)
+
+        if self._catalog is not None and time.monotonic() - self._checked_at < interval:
+            return self._catalog
+
+        with self._lock:
+            version, self.match_version = CatalogVersion.current()
+
+            if self._catalog is None or self._catalog.version != version:
+                self._catalog = Catalog.build(version)
+
+            self._checked_at = time.monotonic()
+
+        return self._catalog
+
+    def invalidate(self):
+        '''Force a version check on the next `get`'''
+        self._checked_at = 0
+
+    def clear(self):
+        '''Drop the catalog, so the next `get` rebuilds it'''
+        self._catalog = None
+
+
+catalog_cache = CatalogCache()
+
+
+class MatchCache(object):
+    '''
+    Keeps the match page's video (see `Video.find_for_match`) per `(id, highlights_type)`, 
+    for the current catalog version
+    
+    Videos are kept detached from any session, and merged into the current session on every hit 
+    (`load=False` never queries the DB), so requests never share an instance
+    
+    When the match version changes, only the videos whose derived files changed are dropped
+    '''
+    
+    def __init__(self, max_size=1024):
+        self._backend = LRUBackend(max_size)
+        self._match_version = None
+        self._lock = threading.Lock()
+    
+    def get(self, id, highlights_type):
+        '''
+        Get a video (with its match, and the match's other videos), loading it on a miss
+        
+        Returns: Video, or None if it doesn't exist
+        '''
+        
+        version = catalog_cache.get().version
+        self._discard_changed(version, catalog_cache.match_version)
+        
+        key = (version, id, highlights_type)
+        
+        video = self._backend.get(key)
+        if video is None:
+            video = Video.find_for_match(id, highlights_type)
+            if video is None:
+                return None
+            
+            _expunge(video)
+            
+            self._backend.set(key, video)
+        
+        return db.session.merge(video, load=False)
+    
+    def clear(self):
+        self._backend.clear()
+    
+    def _discard_changed(self, version, match_version):
+        '''
+        Drop the videos whose derived files changed since the last match version seen (1 query, 
+        only when it changed)
+        
+        Params:
+            version (int):         Current catalog version
+            match_version (int):   Current match version
+        '''
+        
+        if match_version == self._match_version:
+            return
+        
+        with self._lock:
+            if self._match_version is not None and match_version != self._match_version:
+                for id, highlights_type in Video.find_changed_since(self._match_version):
+                    self._backend.delete((version, id, highlights_type))
+            
+            self._match_version = match_version
+
+
+def _expunge(video):
+    '''Detach `video` and everything `find_for_match` loaded with it from the session'''
+    
+    match = video.match
+    
+    objs = [match, match.tournament]
+    objs.extend(match.renditions)
+    for team in match.teams:
+        objs.extend((team, team.country))
+    
+    for obj in objs:
+        if obj is not None and obj in db.session:
+            db.session.expunge(obj)
+
+
+match_cache = MatchCache()
+
+
+# ------------------------------------------
+# ----------------- Events -----------------
+# ------------------------------------------
+
+@event.listens_for(db.session, 'after_flush')
+def _bump_catalog_version(session, flush_context):
+    '''
+    Bump the catalog version whenever a catalog model is added, edited or deleted, 
+    or the match version for match page models, and videos whose derived files changed
+    '''
+
+    catalog_changed = match_changed = False
+    video_ids = []
+
+    # Note: `new`, `dirty` and `deleted` still hold their pre-flush state here
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Video) and obj in session.dirty:
+            changed = _changed_columns(obj)
+
+            # eg. Only its views changed (they're in another table), or only unshown columns
+            if not changed or changed <= UNSHOWN_COLUMNS:
+                continue
+
+            if changed <= MATCH_PAGE_COLUMNS | UNSHOWN_COLUMNS:
+                video_ids.append(obj.id)
+                continue
+
+        if isinstance(obj, CATALOG_MODELS):
+            catalog_changed = True
+        elif isinstance(obj, MATCH_PAGE_MODELS):
+            match_changed = True
+
+    if catalog_changed:
+        CatalogVersion.bump(session.connection())
+        session.info['catalog_changed'] = True
+
+    if match_changed or video_ids:
+        CatalogVersion.bump_match_version(session.connection(), video_ids)
+        session.info['match_changed'] = True
+
+
+def _changed_columns(obj):
+    '''
+    Names of the attributes of `obj` changed since it was loaded (before the flush), that are stored 
+    in its own row: its columns, and many-to-one relationships (eg. `Video.match`)
+
+    Note: Collections (eg. `Video.views`) are stored in other tables, which bump the version themselves if needed
+    '''
+    state = inspect(obj)
+    relationships = state.mapper.relationships
+
+    return {
+        attribute.key for attribute in state.attrs
+        if attribute.history.has_changes()
+        and (attribute.key not in relationships or relationships[attribute.key].direction is MANYTOONE)
+    }
+
+
+@event.listens_for(db.session, 'after_bulk_delete')
+@event.listens_for(db.session, 'after_bulk_update')
+def _bump_catalog_version_bulk(context):
+    '''Same as `_bump_catalog_version`, for `Model.query.delete()` and `Model.query.update()`'''
+
+    if context.mapper.class_ in CATALOG_MODELS:
+        CatalogVersion.bump(context.session.connection())
+        context.session.info['catalog_changed'] = True
+
+    elif context.mapper.class_ in MATCH_PAGE_MODELS:
+        CatalogVersion.bump_match_version(context.session.connection())
+        context.session.info['match_changed'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _catalog_changed(session):
+    '''
+    Drop everything rendered from the old catalog
+
+    Note: Other workers' in-process caches are keyed on the catalog version, so they
+    miss as soon as they see the new version
+    '''
+
+    if session.info.pop('catalog_changed', False):
+        catalog_cache.invalidate()
+        match_cache.clear()
+        page_cache.clear()
+
+    # Only the match page's validators change, once the new match version is seen
+    if session.info.pop('match_changed', False):
+        catalog_cache.invalidate()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _catalog_unchanged(session):
+    session.info.pop('catalog_changed', None)
+    session.info.pop('match_changed', None)
@@ -0,0 +1,198 @@
+import hashlib
+import datetime
+
+from functools import wraps
+from flask import request, session, make_response, current_app, abort, g
+from flask_babel import get_locale
+from flask_login import current_user
+
+from badmintontv.blueprints.billing.decorators import stream_lock
+from badmintontv.blueprints.video.catalog import catalog_cache
+from badmintontv.blueprints.video.signing import verify_video_url
+
+
+def conditional_get(f=None, since=None, match_page=False):
+    '''
+    Answer `If-None-Match` / `If-Modified-Since` with a 304, before running the view
+
+    Pages in this blueprint only change when the catalog changes, or with who is looking at them
+    (locale, subscription/role, and the username shown in the layout), so the validator is built
+    from those alone. A repeat visit then costs no catalog lookup and no template rendering
+
+    Note: The validators also change every day, since "latest tournament" depends on the date
+
+    eg.
+        @conditional_get
+        @conditional_get(since=video_url_window_start, match_page=True)
+
+    Params:
+        since (function):    When the page last changed for another reason than the catalog
+                             (eg. its signed URLs were renewed), as an unaware UTC `datetime`
+        match_page (bool):   Whether the page also shows what only bumps the match version (see `CatalogVersion`);
+                             It has no timestamp, so these pages are only validated by their ETag
+
+    Returns: Function
+    '''
+    if f is None:
+        return lambda f: conditional_get(f, since=since, match_page=match_page)
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+
+        catalog = catalog_cache.get()
+        today = datetime.date.today()
+        changed_on = since() if since else None
+
+        match_version = catalog_cache.match_version if match_page else None
+
+        etag = _catalog_etag(catalog, today, changed_on, match_version)
+        last_modified = _last_modified(catalog, today, changed_on) if not match_page else None
+
+        if _is_not_modified(etag, last_modified):
+            response = current_app.response_class(status=304)
+
+        else:
+            response = make_response(f(*args, **kwargs))
+
+            # Only validate actual pages (not redirects, errors, ...)
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+
+        # Browsers/proxies may keep the page, but must check with us before re-using it
+        response.cache_control.no_cache = True
+        response.vary.update(('Cookie', 'Accept-Language'))
+
+        return response
+    return decorated_function
+
+
+def video_url_lock(f):
+    '''
+    Locks a video file: its URL must be signed (see `signing.signed_video_url`), or the session allowed 
+    to stream (see `stream_lock`)
+
+    A signed URL is checked from the URL alone (no session, no query). Its seconds left are kept in 
+    `g.video_url_seconds_left` (None without a signed URL), for how long the file may be cached
+
+    Returns: Function
+    '''
+    locked = stream_lock(f)
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+
+        if 'signature' not in request.args:
+            g.video_url_seconds_left = None
+            return locked(*args, **kwargs)
+
+        seconds_left = verify_video_url(kwargs['id'], kwargs['highlights_type'], request.args)
+        if seconds_left is None:
+            abort(403)
+
+        g.video_url_seconds_left = seconds_left
+
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _catalog_etag(catalog, today, changed_on=None, match_version=None):
+    '''
+    Strong validator for the current catalog, as seen by the current user
+
+    Params:
+        catalog (Catalog)
+        today (datetime.date)
+        changed_on (datetime.datetime):   See `conditional_get(since=...)`
+        match_version (int):              See `conditional_get(match_page=...)`
+
+    Returns: str
+    '''
+
+    user_id = current_user.get_id() if current_user.is_authenticated else None
+
+    validator = '{}|{}|{}|{}|{}|{}|{}|{}'.format(
+        catalog.version,
+        catalog.updated_on,
+        today,
+        get_locale(),
+        _entitlement(),
+        user_id,
+        changed_on,
+        match_version
+    )
+
+    return hashlib.sha1(validator.encode('utf-8')).hexdigest()
+
+
+def _last_modified(catalog, today, changed_on=None):
+    '''
+    When the catalog last changed, or the start of `today` (or `changed_on`) if that's later
+
+    Returns: Unaware UTC `datetime`, or None if the catalog was never changed
+    '''
+
+    if catalog.updated_on is None:
+        return None
+
+    # Local midnight, like `datetime.date.today()`
+    midnight = datetime.datetime.combine(today, datetime.time()).astimezone()
+
+    last_modified = max(_to_naive_utc(catalog.updated_on), _to_naive_utc(midnight))
+    if changed_on is not None:
+        last_modified = max(last_modified, _to_naive_utc(changed_on))
+
+    return last_modified
+
+
+def _entitlement():
+    '''
+    What the current user is allowed to watch
+
+    Returns: str
+    '''
+
+    if not current_user.is_authenticated:
+        return 'anonymous'
+
+    if current_user.role == 'admin':
+        return 'admin'
+
+    if current_user.subscription:
+        return 'subscriber'
+
+    return 'member'
+
+
+def _is_not_modified(etag, last_modified):
+    '''
+    Does the client already have this version of the page?
+
+    Note: `If-Modified-Since` is ignored when `If-None-Match` is sent (RFC 7232)
+
+    Returns: bool
+    '''
+
+    # Pending flash messages still need to be rendered
+    if '_flashes' in session:
+        return False
+
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+
+    if request.if_modified_since and last_modified:
+        return _to_naive_utc(last_modified).replace(microsecond=0) <= _to_naive_utc(request.if_modified_since)
+
+    return False
+
+
+def _to_naive_utc(dt):
+    '''Converts a `datetime` --> unaware UTC `datetime` (unaware ones are assumed to be UTC)'''
+
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    return dt
@@ -0,0 +1,180 @@
+import threading
+
+from array import array
+from collections import Counter
+
+from badmintontv.blueprints.video.catalog import catalog_cache
+
+# Facets that matches can be filtered on, in display order
+FACETS = ('year', 'tournament', 'country', 'team', 'discipline', 'round', 'highlights_type')
+
+
+def _facet_values(match, facet):
+    '''
+    Get the value(s) of `facet` for a `MatchRecord`
+
+    Note: `team` and `country` have 2 values, 1 per side, and `highlights_type` has 1 per video
+
+    Returns: List of values
+    '''
+
+    if facet == 'year':
+        return [match.tournament.start_date.year]
+
+    if facet == 'tournament':
+        return [match.tournament.id]
+
+    if facet == 'team':
+        return [team.name for team in match.teams]
+
+    if facet == 'country':
+        return list(set(team.country.name for team in match.teams if team.country))
+
+    if facet == 'highlights_type':
+        return [rendition.highlights_type for rendition in match.renditions]
+
+    return [getattr(match, facet)]
+
+
+class FacetIndex(object):
+    '''
+    Positions of the catalog's matches for every value of every facet, plus the unfiltered counts
+
+    Built once per catalog version, so it's rebuilt after each ingestion
+
+    Attributes:
+        positions (dict):   Facet --> value --> array of positions in `catalog.matches`
+        counts (dict):      Facet --> value --> number of matches, with no filters
+    '''
+
+    __slots__ = ('catalog', 'positions', 'counts')
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.positions = {}
+        self.counts = {}
+
+    @classmethod
+    def build(cls, catalog):
+        '''
+        Index every match of `catalog` on every facet
+
+        Params:
+            catalog (Catalog)
+
+        Returns: FacetIndex
+        '''
+
+        index = cls(catalog)
+
+        # Re-use the catalog's indexes where they exist
+        index.positions['year'] = catalog.matches_by_year
+        index.positions['tournament'] = catalog.matches_by_tournament
+        index.positions['team'] = catalog.matches_by_team
+        index.positions['country'] = catalog.matches_by_country
+
+        for facet in ('discipline', 'round', 'highlights_type'):
+            positions = index.positions[facet] = {}
+
+            for position, match in enumerate(catalog.matches):
+                for value in _facet_values(match, facet):
+
+                    if value not in positions:
+                        positions[value] = array('I')
+
+                    positions[value].append(position)
+
+        for facet in FACETS:
+            index.counts[facet] = Counter({
+                value: len(positions) for value, positions in index.positions[facet].items()
+            })
+
+        return index
+
+    def search(self, filters, offset=0, limit=None):
+        '''
+        Filter the catalog's matches, and count every facet value within the results
+
+        Counts are "disjunctive": a facet's counts ignore that facet's own filter, so they show
+        how many matches each value *would* return (eg. with `year=2022` selected, the other
+        years still have their counts)
+
+        Params:
+            filters (dict):   Facet --> selected value
+            offset (int):     Number of matched matches to skip
+            limit (int):      Max number of matched matches to return
+
+        Returns:
+            matches (list):  1 page of matched `MatchRecord`s, in browse order
+            total (int):     Number of matched matches
+            counts (dict):   Facet --> `Counter` of value --> number of matches
+        '''
+
+        selected = {
+            facet: set(self.positions[facet].get(value, ()))
+            for facet, value in filters.items()
+        }
+
+        counts = {}
+        for facet in FACETS:
+
+            # Unfiltered counts are precomputed
+            others = [positions for other, positions in selected.items() if other != facet]
+            if not others:
+                counts[facet] = self.counts[facet]
+                continue
+
+            counter = Counter()
+            for position in self._intersect(others):
+                counter.update(_facet_values(self.catalog.matches[position], facet))
+
+            counts[facet] = counter
+
+        # Positions are in browse order
+        matched = self._intersect(selected.values())
+        if matched is None:
+            positions = range(len(self.catalog.matches))
+        else:
+            positions = sorted(matched)
+
+        end = offset + limit if limit is not None else None
+        matches = [self.catalog.matches[position] for position in positions[offset:end]]
+
+        return matches, len(positions), counts
+
+    @staticmethod
+    def _intersect(sets):
+        '''Intersect sets of positions, smallest first; Returns None if there are no sets'''
+
+        sets = sorted(sets, key=len)
+        if not sets:
+            return None
+
+        return sets[0].intersection(*sets[1:])
+
+
+class FacetIndexCache(object):
+    '''Keeps the `FacetIndex` of the current catalog version'''
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        '''
+        Get the facet index, rebuilding it if the catalog changed
+
+        Returns: FacetIndex
+        '''
+
+        catalog = catalog_cache.get()
+
+        if self._index is None or self._index.catalog is not catalog:
+            with self._lock:
+                if self._index is None or self._index.catalog is not catalog:
+                    self._index = FacetIndex.build(catalog)
+
+        return self._index
+
+
+facet_index_cache = FacetIndexCache()
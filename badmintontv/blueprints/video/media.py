@@ -0,0 +1,617 @@
+import os
+import shutil
+import struct
+import hashlib
+import logging
+import subprocess
+import numpy as np
+
+from PIL import Image
+from billiard import Pool
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from imageio_ffmpeg import get_ffmpeg_exe, read_frames
+
+# Target length of an HLS segment, in seconds (segments are cut on keyframes, so it's approximate)
+HLS_SEGMENT_SECONDS = 6
+
+# Name of each playlist, and of the master playlist, in a video's HLS folder
+HLS_PLAYLIST = 'index.m3u8'
+HLS_MASTER = 'master.m3u8'
+
+# Sub-folder of the video's own streams, segmented without re-encoding
+HLS_SOURCE = 'source'
+
+# 1 rendition of the bitrate ladder, in its own sub-folder of the HLS folder
+Rung = namedtuple('Rung', ('name', 'height', 'video_kbps', 'audio_kbps'))
+
+# Renditions the player can switch between, smallest first (only those not taller than the video are made)
+LADDER = (
+    Rung('360p', 360, 800, 96),
+    Rung('720p', 720, 2800, 128),
+    Rung('1080p', 1080, 5000, 160)
+)
+
+# Number of frames compared to pick a video's poster, spread over its length
+POSTER_CANDIDATES = 6
+
+# Width of posters, in pixels
+POSTER_WIDTH = 480
+
+# Formats of each poster: extension --> Pillow `save` options
+POSTER_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'jpg': {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True}
+}
+
+# Scrubbing previews: 1 tile every `SPRITE_SECONDS`, `SPRITE_TILE_WIDTH` pixels wide, in sheets of `SPRITE_COLUMNS` x `SPRITE_ROWS` tiles
+SPRITE_SECONDS = 5
+SPRITE_TILE_WIDTH = 160
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 10
+
+# Name of the WebVTT track, in a video's sprites folder
+SPRITE_TRACK = 'thumbnails.vtt'
+
+# Size of an MP4 box header (32-bit size & type), and of its 64-bit size when the 32-bit size is 1
+MP4_BOX_HEADER = struct.Struct('>I4s')
+MP4_BOX_LARGESIZE = struct.Struct('>Q')
+
+logger = logging.getLogger(__name__)
+
+
+def hls_folder(filename):
+    '''
+    Folder of a video's HLS playlist & segments, next to its file
+
+    eg.
+        hls_folder('[Highlights] m0.mp4') --> '[Highlights] m0.hls'
+
+    Returns: str
+    '''
+    return os.path.splitext(filename)[0] + '.hls'
+
+
+def segment_hls(path):
+    '''
+    Segments the video file at `path` into HLS (fMP4 segments), in the `source` folder of its HLS folder
+
+    Streams are copied, not re-encoded, so this is about as fast as copying the file
+
+    eg.
+        segment_hls('<VID_DIR>/<folder>/<name>/[Highlights] m0.mp4') --> '[Highlights] m0.hls/source/index.m3u8'
+
+    Params:
+        path (str): Video file
+
+    Returns: Path of the playlist, relative to the video's folder
+    '''
+
+    directory, filename = os.path.split(path)
+    folder = hls_folder(filename)
+
+    _write_hls(os.path.join(directory, folder, HLS_SOURCE), '-i', path, '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy')
+
+    return '{}/{}/{}'.format(folder, HLS_SOURCE, HLS_PLAYLIST)
+
+
+def encode_ladder(path, duration, workers=2):
+    '''
+    Encodes the `LADDER` renditions of the video file at `path` into its HLS folder, then writes 
+    the master playlist of every rendition (including the `source` one, if it's segmented)
+
+    Renditions are encoded by up to `workers` ffmpeg processes at once. Keyframes are forced on 
+    segment boundaries, so every rendition is segmented the same way, and the player can switch 
+    between them at any segment
+
+    Note: Resumable: renditions that already exist are skipped, and each is written to a temporary 
+    folder first, so an interrupted encoding leaves no partial rendition
+
+    eg.
+        encode_ladder('<VID_DIR>/<folder>/<name>/[Highlights] m0.mp4', 300) --> ('[Highlights] m0.hls/master.m3u8', ['360p', '720p'])
+
+    Params:
+        path (str):       Video file
+        duration (int):   Length of the video, in seconds (for the bitrate of the `source` rendition)
+        workers (int):    Max number of renditions encoded at once
+
+    Returns:
+        master (str):    Path of the master playlist, relative to the video's folder
+        rungs (list):    Names of the encoded renditions
+    '''
+
+    directory, filename = os.path.split(path)
+    folder = hls_folder(filename)
+    output = os.path.join(directory, folder)
+
+    width, height = video_size(path)
+    rungs = [rung for rung in LADDER if rung.height <= height]
+
+    missing = [rung for rung in rungs if not os.path.exists(os.path.join(output, rung.name, HLS_PLAYLIST))]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_encode_rung, path, output, rung) for rung in missing]
+
+    # Raise the 1st error, once every other rendition is done (they're kept for the next try)
+    for future in futures:
+        future.result()
+
+    variants = []
+    for rung in rungs:
+        bandwidth = (rung.video_kbps + rung.audio_kbps) * 1000
+        variants.append((bandwidth, _scaled_width(width, height, rung.height), rung.height, rung.name))
+
+    if os.path.exists(os.path.join(output, HLS_SOURCE, HLS_PLAYLIST)) and duration:
+        bandwidth = int(os.path.getsize(path) * 8 / duration)
+        variants.append((bandwidth, width, height, HLS_SOURCE))
+
+    _write_master(os.path.join(output, HLS_MASTER), sorted(variants))
+
+    return '{}/{}'.format(folder, HLS_MASTER), [rung.name for rung in rungs]
+
+
+def video_size(path):
+    '''
+    Width & height of the video file at `path`, read from ffmpeg's header (no frame is decoded)
+
+    Returns: Tuple of int
+    '''
+
+    reader = read_frames(path)
+    try:
+        metadata = next(reader)
+    finally:
+        reader.close()
+
+    return tuple(metadata['size'])
+
+
+def _encode_rung(path, output, rung):
+    '''Encodes 1 rendition of the video file at `path`, into `<output>/<rung.name>`'''
+
+    _write_hls(
+        os.path.join(output, rung.name),
+        '-i', path,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-vf', 'scale=-2:{}'.format(rung.height),
+        '-c:v', 'libx264', '-preset', 'veryfast', '-profile:v', 'main', '-pix_fmt', 'yuv420p',
+        '-b:v', '{}k'.format(rung.video_kbps),
+        '-maxrate', '{}k'.format(rung.video_kbps * 107 // 100),
+        '-bufsize', '{}k'.format(rung.video_kbps * 3 // 2),
+        '-force_key_frames', 'expr:gte(t,n_forced*{})'.format(HLS_SEGMENT_SECONDS),
+        '-sc_threshold', '0',
+        '-c:a', 'aac', '-b:a', '{}k'.format(rung.audio_kbps)
+    )
+
+
+def _write_hls(output, *args):
+    '''
+    Runs ffmpeg with `args` (input & codecs) to write an HLS playlist & its segments into the folder `output`
+
+    Everything is written to a temporary folder, which then replaces `output`, so a player never 
+    sees a partial playlist
+    '''
+
+    temporary = '{}.tmp-{}'.format(output, os.getpid())
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+
+    try:
+        run_ffmpeg(
+            *args,
+            '-f', 'hls',
+            '-hls_time', str(HLS_SEGMENT_SECONDS),
+            '-hls_playlist_type', 'vod',
+            '-hls_segment_type', 'fmp4',
+            '-hls_fmp4_init_filename', 'init.mp4',
+            '-hls_segment_filename', os.path.join(temporary, 'segment_%05d.m4s'),
+            os.path.join(temporary, HLS_PLAYLIST)
+        )
+
+        _replace_folder(temporary, output)
+
+    except Exception:
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+
+
+def _replace_folder(temporary, output):
+    '''
+    Moves the finished folder `temporary` to `output`, replacing the old `output` folder
+
+    The old folder is moved aside first, and deleted once the new one is in place, so `output` is only 
+    missing between 2 renames (rather than while all of its files are deleted)
+    '''
+
+    old = '{}.old-{}'.format(output, os.getpid())
+    shutil.rmtree(old, ignore_errors=True)
+
+    if os.path.exists(output):
+        os.replace(output, old)
+
+    os.replace(temporary, output)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _write_master(path, variants):
+    '''Writes a master playlist of `(bandwidth, width, height, folder)` variants, replacing `path` at once'''
+
+    lines = ['#EXTM3U', '#EXT-X-VERSION:7', '#EXT-X-INDEPENDENT-SEGMENTS']
+    for bandwidth, width, height, folder in variants:
+        lines.append('#EXT-X-STREAM-INF:BANDWIDTH={},RESOLUTION={}x{}'.format(bandwidth, width, height))
+        lines.append('{}/{}'.format(folder, HLS_PLAYLIST))
+
+    temporary = '{}.tmp-{}'.format(path, os.getpid())
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    os.replace(temporary, path)
+
+
+def _scaled_width(width, height, scaled_height):
+    '''Width of a `width` x `height` video scaled to `scaled_height`, rounded to even like ffmpeg's `scale=-2:h`'''
+    return int(round(width * scaled_height / height / 2)) * 2
+
+
+def make_poster_batch(jobs, cache_dir, workers=2):
+    '''
+    Makes the posters of several videos, in a pool of `workers` processes (see `make_poster`)
+
+    Note: Uses Celery's `billiard` pool, since a Celery worker's processes can't start a `multiprocessing` pool
+
+    Params:
+        jobs (list):        `(id, path, duration)` of each video
+        cache_dir (str):    Folder of the poster cache
+        workers (int):      Number of processes
+
+    Returns: Dict of video ID --> poster key (videos whose poster failed are left out, and logged)
+    '''
+
+    with Pool(processes=workers) as pool:
+
+        # 1 task per video: `Pool.map` credits every chunk to 1 process, so the others wait 30s for it to exit
+        pending = [pool.apply_async(_make_poster_job, ((id, path, duration, cache_dir),)) for id, path, duration in jobs]
+        results = [result.get() for result in pending]
+
+    return {id: key for id, key in results if key is not None}
+
+
+def make_poster(path, duration, cache_dir):
+    '''
+    Makes the poster of the video file at `path`: the sharpest of `POSTER_CANDIDATES` frames, 
+    resized to `POSTER_WIDTH`, in every `POSTER_FORMATS`
+
+    Posters are content-addressed: they're named after a hash of their pixels, so identical posters 
+    are stored once, and an existing one is never re-encoded
+
+    eg.
+        make_poster('<VID_DIR>/.../[Highlights] m0.mp4', 300, '<POSTER_DIR>') --> '3f/3fa4...'
+        (files: '<POSTER_DIR>/3f/3fa4....webp' & '<POSTER_DIR>/3f/3fa4....jpg')
+
+    Params:
+        path (str):        Video file
+        duration (int):    Length of the video, in seconds
+        cache_dir (str):   Folder of the poster cache
+
+    Returns: Poster key (its path in `cache_dir`, without extension)
+    '''
+
+    frames = []
+    for i in range(POSTER_CANDIDATES):
+
+        # Evenly spread, away from the very start & end (titles, fades, ...)
+        frame = read_frame(path, duration * (i + 1) / (POSTER_CANDIDATES + 1))
+        if frame is not None:
+            frames.append(frame)
+
+    if not frames:
+        raise ValueError('No frame could be read from {}'.format(path))
+
+    image = Image.fromarray(max(frames, key=sharpness))
+    if image.width > POSTER_WIDTH:
+        image = image.resize((POSTER_WIDTH, round(image.height * POSTER_WIDTH / image.width)), Image.LANCZOS)
+
+    digest = hashlib.sha256(image.tobytes()).hexdigest()
+    key = '{}/{}'.format(digest[:2], digest)
+
+    os.makedirs(os.path.join(cache_dir, digest[:2]), exist_ok=True)
+
+    for extension, options in POSTER_FORMATS.items():
+        poster = os.path.join(cache_dir, '{}.{}'.format(key, extension))
+        if os.path.exists(poster):
+            continue
+
+        # Written under a temporary name, so a page never links to a partial poster
+        temporary = '{}.tmp-{}'.format(poster, os.getpid())
+        image.save(temporary, **options)
+        os.replace(temporary, poster)
+
+    return key
+
+
+def read_frame(path, seconds):
+    '''
+    Decodes the frame of the video file at `path` at `seconds` (ffmpeg seeks to the nearest keyframe 
+    first, so only a few frames are decoded)
+
+    Returns: RGB `numpy` array of shape (height, width, 3), or None if there's no frame there
+    '''
+
+    reader = read_frames(path, input_params=['-ss', '{:.3f}'.format(seconds)], output_params=['-frames:v', '1'])
+    try:
+        width, height = next(reader)['size']
+        frame = next(reader, None)
+    finally:
+        reader.close()
+
+    if frame is None:
+        return None
+
+    return np.frombuffer(frame, dtype=np.uint8).reshape(height, width, 3)
+
+
+def sharpness(frame):
+    '''
+    How sharp (ie. not blurry) a frame is: the variance of its Laplacian, in grayscale
+
+    Blur removes edges, so a blurry frame's Laplacian is flat (low variance). Computed on whole 
+    arrays (no Python loop over pixels)
+
+    Params:
+        frame (numpy.ndarray): RGB frame, of shape (height, width, 3)
+
+    Returns: float
+    '''
+
+    gray = frame.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+    # 4-neighbour Laplacian of every inner pixel
+    laplacian = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4 * gray[1:-1, 1:-1]
+    )
+
+    return float(laplacian.var())
+
+
+def _make_poster_job(job):
+    '''Runs `make_poster` in a pool process; Returns: `(id, key)`, or `(id, None)` if it failed'''
+
+    id, path, duration, cache_dir = job
+
+    try:
+        return id, make_poster(path, duration, cache_dir)
+    except Exception:
+        logger.exception('Poster of video %s (%s) failed', id, path)
+        return id, None
+
+
+def sprites_folder(filename):
+    '''
+    Folder of a video's sprite sheets & their WebVTT track, next to its file
+
+    eg.
+        sprites_folder('[Highlights] m0.mp4') --> '[Highlights] m0.sprites'
+
+    Returns: str
+    '''
+    return os.path.splitext(filename)[0] + '.sprites'
+
+
+def make_sprites(path):
+    '''
+    Makes the scrubbing previews of the video file at `path`: sprite sheets of 1 frame every 
+    `SPRITE_SECONDS`, and a WebVTT track mapping each time range to its tile (`sheet.jpg#xywh=x,y,w,h`)
+
+    ffmpeg samples & scales the frames, which are streamed in 1 at a time, and copied into the 
+    tiles of the current sheet (1 `numpy` array, re-used), so memory is bounded by 1 sheet whatever 
+    the video's length. Each full sheet is laid out with 1 reshape, then saved by Pillow
+
+    Note: Everything is written to a temporary folder, which then replaces the sprites folder
+
+    eg.
+        make_sprites('<VID_DIR>/<folder>/<name>/[Highlights] m0.mp4') --> '[Highlights] m0.sprites/thumbnails.vtt'
+
+    Params:
+        path (str): Video file
+
+    Returns: Path of the WebVTT track, relative to the video's folder, or None if no frame was read
+    '''
+
+    directory, filename = os.path.split(path)
+    folder = sprites_folder(filename)
+
+    output = os.path.join(directory, folder)
+    temporary = '{}.tmp-{}'.format(output, os.getpid())
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+
+    reader = read_frames(
+        path, 
+        output_params=['-vf', 'fps=1/{},scale={}:-2'.format(SPRITE_SECONDS, SPRITE_TILE_WIDTH)]
+    )
+
+    try:
+        metadata = next(reader)
+        width, height = metadata['size']
+
+        tiles = np.zeros((SPRITE_COLUMNS * SPRITE_ROWS, height, width, 3), dtype=np.uint8)
+        cues = []
+        num_tiles = 0
+
+        for i, frame in enumerate(reader):
+            tile = i % len(tiles)
+            tiles[tile] = np.frombuffer(frame, dtype=np.uint8).reshape(height, width, 3)
+
+            sheet = 'sprite_{:03d}.jpg'.format(i // len(tiles))
+            row, column = divmod(tile, SPRITE_COLUMNS)
+            cues.append((i * SPRITE_SECONDS, sheet, column * width, row * height))
+
+            num_tiles = tile + 1
+            if num_tiles == len(tiles):
+                _save_sheet(os.path.join(temporary, sheet), tiles, num_tiles)
+                num_tiles = 0
+
+        if num_tiles:
+            _save_sheet(os.path.join(temporary, sheet), tiles, num_tiles)
+
+        # eg. A video without frames: There's nothing to preview, rather than an empty track
+        if not cues:
+            shutil.rmtree(temporary, ignore_errors=True)
+            return None
+
+        _write_track(os.path.join(temporary, SPRITE_TRACK), cues, width, height, metadata.get('duration'))
+
+        _replace_folder(temporary, output)
+
+    except Exception:
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+
+    finally:
+        reader.close()
+
+    return '{}/{}'.format(folder, SPRITE_TRACK)
+
+
+def _save_sheet(path, tiles, num_tiles):
+    '''
+    Saves the 1st `num_tiles` of `tiles` as a sprite sheet, row by row (a partial sheet only keeps 
+    the rows it uses, with blank tiles at the end)
+    '''
+
+    rows = -(-num_tiles // SPRITE_COLUMNS)
+    tiles[num_tiles:rows * SPRITE_COLUMNS] = 0
+
+    _, height, width, channels = tiles.shape
+
+    # (rows, columns, height, width) --> (rows, height, columns, width): each row of the sheet 
+    # is then the same row of pixels of every tile of a row, side by side
+    sheet = tiles[:rows * SPRITE_COLUMNS].reshape(rows, SPRITE_COLUMNS, height, width, channels)
+    sheet = sheet.transpose(0, 2, 1, 3, 4).reshape(rows * height, SPRITE_COLUMNS * width, channels)
+
+    Image.fromarray(sheet).save(path, format='JPEG', quality=70, optimize=True)
+
+
+def _write_track(path, cues, width, height, duration=None):
+    '''Writes the WebVTT track of `(start, sheet, x, y)` tiles (each shown until the next one, the last until `duration`)'''
+
+    lines = ['WEBVTT', '']
+    for i, (start, sheet, x, y) in enumerate(cues):
+        if i + 1 < len(cues):
+            end = cues[i + 1][0]
+        else:
+            end = duration if duration and duration > start else start + SPRITE_SECONDS
+
+        lines.append('{} --> {}'.format(_vtt_timestamp(start), _vtt_timestamp(end)))
+        lines.append('{}#xywh={},{},{},{}'.format(sheet, x, y, width, height))
+        lines.append('')
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+
+
+def _vtt_timestamp(seconds):
+    '''WebVTT timestamp of `seconds` (eg. 3725.5 --> '01:02:05.500')'''
+
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+
+    return '{:02d}:{:02d}:{:02d}.{:03d}'.format(hours, minutes, milliseconds // 1000, milliseconds % 1000)
+
+
+def is_faststart(path):
+    '''
+    Is the `moov` box (the index of the samples) of the MP4 file at `path` before its `mdat` box (the samples)?
+
+    Otherwise, a browser has to fetch the end of the file before it can play anything. Only the 
+    headers of the top-level boxes are read, skipping their content, so it's a few small reads
+
+    Params:
+        path (str): Video file
+
+    Returns: True / False, or None if the file isn't an MP4 with both boxes
+    '''
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+
+        offset = 0
+        while offset + MP4_BOX_HEADER.size <= size:
+            f.seek(offset)
+            box_size, box_type = MP4_BOX_HEADER.unpack(f.read(MP4_BOX_HEADER.size))
+            header_size = MP4_BOX_HEADER.size
+
+            # 64-bit size, after the type
+            if box_size == 1:
+                largesize = f.read(MP4_BOX_LARGESIZE.size)
+                if len(largesize) < MP4_BOX_LARGESIZE.size:
+                    return None
+                box_size = MP4_BOX_LARGESIZE.unpack(largesize)[0]
+                header_size += MP4_BOX_LARGESIZE.size
+
+            # Last box, up to the end of the file
+            elif box_size == 0:
+                box_size = size - offset
+
+            if box_type == b'moov':
+                return True
+            if box_type == b'mdat':
+                return False
+
+            # Not a valid box (eg. not an MP4 file)
+            if box_size < header_size:
+                return None
+
+            offset += box_size
+
+    return None
+
+
+def make_faststart(path):
+    '''
+    Moves the `moov` box of the MP4 file at `path` before its `mdat` box, if it isn't already (see `is_faststart`)
+
+    Streams are copied, not re-encoded. The file is written next to `path` (on the same file system),
+    then replaces it at once, so a player (or another task) reading it never sees a partial file
+
+    Params:
+        path (str): Video file
+
+    Returns: True if the file is (now) faststart, False if it isn't an MP4 file that can be
+    '''
+
+    faststart = is_faststart(path)
+    if faststart is not False:
+        return bool(faststart)
+
+    folder, filename = os.path.split(path)
+    temporary = os.path.join(folder, '.{}.tmp-{}.mp4'.format(filename, os.getpid()))
+
+    try:
+        run_ffmpeg('-i', path, '-map', '0', '-c', 'copy', '-movflags', '+faststart', temporary)
+        os.replace(temporary, path)
+
+    except Exception:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+    return True
+
+
+def run_ffmpeg(*args):
+    '''
+    Runs the ffmpeg binary bundled with `imageio-ffmpeg`
+
+    Raises: `subprocess.CalledProcessError` (with ffmpeg's errors in `stderr`) if ffmpeg fails
+
+    Returns: `subprocess.CompletedProcess`
+    '''
+
+    return subprocess.run(
+        [get_ffmpeg_exe(), '-nostdin', '-hide_banner', '-loglevel', 'error', '-y'] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True
+    )
@@ -1,23 +1,30 @@
+import os
+import re
 import datetime
-import math 
 
-from sqlalchemy import or_
+from sqlalchemy import or_, and_, tuple_, func, distinct, event, inspect, select, cast, literal_column
+from sqlalchemy.orm import contains_eager, joinedload, aliased
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.dialects.postgresql import TSVECTOR, insert
 from sqlalchemy.sql.expression import extract
 
 from libs.util_sqlalchemy import ResourceMixin, AwareDateTime
+from libs.util_datetime import seconds_to_time, tzware_datetime
 from badmintontv.extensions import db
 from badmintontv.blueprints.view.models import View
+from badmintontv.blueprints.video.template_processors import format_country
 
-# Association table for many-to-many relationship of Video/Team
-videos_teams = db.Table(
-    "videos_teams",
+# Association table for many-to-many relationship of Match/Team
+matches_teams = db.Table(
+    "matches_teams",
     db.Column(
-        "video_id", 
+        "match_id", 
         db.ForeignKey(
-            "videos.id",
+            "matches.id",
             onupdate='CASCADE',
             ondelete='SET NULL'
-        )
+        ),
+        index=True
     ),
     db.Column(
         "team_id", 
@@ -25,10 +32,129 @@ videos_teams = db.Table(
             "teams.id",
             onupdate='CASCADE',
             ondelete='SET NULL'
-        )
+        ),
+        index=True
+    ),
+)
+
+
+# Association table for many-to-many relationship of Team/Player
+teams_players = db.Table(
+    "teams_players",
+    db.Column(
+        "team_id", 
+        db.ForeignKey(
+            "teams.id",
+            onupdate='CASCADE',
+            ondelete='CASCADE'
+        ),
+        index=True
+    ),
+    db.Column(
+        "player_id", 
+        db.ForeignKey(
+            "players.id",
+            onupdate='CASCADE',
+            ondelete='CASCADE'
+        ),
+        index=True
     ),
 )
 
+# Separates the players of a doubles team's name (eg. 'Kamura_Sonoda')
+PLAYER_SEPARATOR = '_'
+
+
+# Max number of videos in each "Up next" list 
+RELATED_VIDEOS_LIMIT = 6
+
+
+class CatalogVersion(ResourceMixin, db.Model):
+    '''
+    Single-row counter that is bumped every time the video catalog changes
+    
+    Every worker keeps an in-memory copy of the catalog (see `catalog.py`), 
+    and compares its version to this one to know when to rebuild it
+    
+    What only the match page shows (eg. "Up next" lists) bumps `match_version` instead, 
+    which only changes the match page's validators, without rebuilding the catalog
+    '''
+    
+    __tablename__ = 'catalog_versions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    
+    version = db.Column(db.Integer, nullable=False, default=0)
+    match_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    @classmethod
+    def current(cls):
+        '''
+        Get the current catalog version, and match version, in 1 query
+        
+        Returns: `(version, match_version)`
+        '''
+        row = db.session.query(cls.version, cls.match_version).filter(cls.id == 1).first()
+        
+        return (row.version, row.match_version) if row else (0, 0)
+    
+    @classmethod
+    def bump(cls, connection):
+        '''
+        Increment the catalog version
+        
+        Note: This is run while flushing, so it uses the flush's `connection`
+        and is committed (or rolled back) along with the changes that caused it
+        
+        The row is created by the first change ever, in the same statement (`ON CONFLICT`), so 2 
+        first changes at once never fail on its primary key (which would roll back the change)
+        
+        Params:
+            connection: SQLAlchemy connection
+        '''
+        
+        # `onupdate` isn't applied to `ON CONFLICT DO UPDATE`, so `updated_on` is set here 
+        connection.execute(
+            insert(cls.__table__).values(
+                id=1, 
+                version=1
+            ).on_conflict_do_update(
+                index_elements=[cls.id],
+                set_={'version': cls.version + 1, 'updated_on': tzware_datetime()}
+            )
+        )
+    
+    @classmethod
+    def bump_match_version(cls, connection, video_ids=()):
+        '''
+        Increment the match version (like `bump`, which has the details)
+        
+        Params:
+            connection: SQLAlchemy connection
+            video_ids (list):  Videos whose derived files changed; They're stamped with the new version 
+                               (see `Video.find_changed_since`)
+        '''
+        
+        connection.execute(
+            insert(cls.__table__).values(
+                id=1, 
+                version=0,
+                match_version=1
+            ).on_conflict_do_update(
+                index_elements=[cls.id],
+                set_={'match_version': cls.match_version + 1}
+            )
+        )
+        
+        if video_ids:
+            connection.execute(
+                Video.__table__.update().where(
+                    Video.id.in_(video_ids)
+                ).values(
+                    match_version=select(cls.match_version).where(cls.id == 1).scalar_subquery()
+                )
+            )
+
 
 class Tournament(ResourceMixin, db.Model):
     
@@ -37,13 +163,13 @@ class Tournament(ResourceMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
 
     name = db.Column(db.String(100), nullable=False)
-    start_date = db.Column(db.Date, nullable=False)
+    start_date = db.Column(db.Date, index=True, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
     
-    # [Tournament] One (Tournament) has Many (Videos)
-    videos = db.relationship(
-        'Video',
-        backref='tournaments',
+    # [Tournament] One (Tournament) has Many (Matches)
+    matches = db.relationship(
+        'Match',
+        back_populates='tournament',
         passive_deletes=True
     )
 
@@ -61,34 +187,90 @@ class Tournament(ResourceMixin, db.Model):
     @classmethod
     def find_by_year(cls, year):
         return cls.query.filter(
-            extract('year', cls.start_date) == year
+            cls.in_years(year)
         ).order_by(cls.start_date.desc())
     
     @classmethod
-    def find_latest(cls, today=datetime.datetime.today().date()):
-        '''Get latest tournament'''
+    def in_years(cls, first, last=None):
+        '''
+        Filter tournaments starting in years `first` to `last` (included)
+        
+        The filter is a half-open date range (`first`-01-01 <= start_date < `last + 1`-01-01), 
+        rather than `extract('year', start_date)`, so it's answered by the `start_date` index
+        
+        eg.
+            Tournament.query.filter(Tournament.in_years(2022))
+            Tournament.query.filter(Tournament.in_years(2010, 2019))
+        
+        Params:
+            first (int):   First year 
+            last (int):    Last year; Defaults to `first`
+        
+        Returns: SQLAlchemy filter
+        '''
+        
+        if last is None:
+            last = first
+        
+        return and_(
+            cls.start_date >= datetime.date(first, 1, 1),
+            cls.start_date < datetime.date(last + 1, 1, 1)
+        )
+    
+    @classmethod
+    def find_years(cls):
+        '''
+        Get every year with a tournament, without loading the tournaments
+        
+        Note: Cached in the catalog (`Catalog.years`), which is only rebuilt when the catalog changes
+        
+        Order: Newest-to-Oldest
+        
+        Returns: List of int
+        '''
+        
+        year = cast(extract('year', cls.start_date), db.Integer)
+        
+        return [row[0] for row in db.session.query(year).distinct().order_by(year.desc())]
+    
+    @classmethod
+    def find_latest(cls, today=None):
+        '''
+        Get the tournament that starts closest to `today` (the older one wins ties)
+        
+        This is a single statement: The closest tournament on each side of `today` is found 
+        with 1 probe of the `start_date` index each, then only those 2 rows are compared
         
-        # Find the closest events which are greater/less than the timestamp
-        gt_event = cls.query.filter(
-                cls.start_date > today
+        Params:
+            today (datetime.date): Defaults to today
+        
+        Returns: Tournament or None
+        '''
+        
+        # Note: Not a default argument, which would be evaluated once at import
+        if today is None:
+            today = datetime.date.today()
+        
+        upcoming = select(cls.id).where(
+                cls.start_date >= today
             ).order_by(
-                cls.start_date.asc()
-            ).first()
+                cls.start_date.asc(), cls.id.asc()
+            ).limit(1).subquery()
         
-        lt_event = cls.query.filter(
+        past = select(cls.id).where(
                 cls.start_date < today
             ).order_by(
-                cls.start_date.desc()
+                cls.start_date.desc(), cls.id.desc()
+            ).limit(1).subquery()
+        
+        candidates = select(upcoming.c.id).union_all(select(past.c.id))
+        
+        return cls.query.filter(
+                cls.id.in_(candidates)
+            ).order_by(
+                func.abs(cls.start_date - today),
+                cls.start_date.asc()
             ).first()
-
-        # Find diff between events and the timestamp 
-        # Note: If no event found, default to infintiy
-        gt_diff = (gt_event.start_date - today).total_seconds() if gt_event else math.inf
-        lt_diff = (today - lt_event.start_date).total_seconds() if lt_event else math.inf
-
-        # Return the newest event, if it's closer to the timestampe, else older event
-        # Note: If an event is None, its diff will always be greater (since we set it to infinity)
-        return gt_event if gt_diff < lt_diff else lt_event
     
     @classmethod
     def search(cls, query):
@@ -126,10 +308,10 @@ class Team(ResourceMixin, db.Model):
 
     name = db.Column(db.String(50), nullable=False)
 
-    # [Team] One (Team) has Many (Videos)
-    videos = db.relationship(
-        'Video', 
-        secondary='videos_teams', 
+    # [Team] One (Team) has Many (Matches)
+    matches = db.relationship(
+        'Match', 
+        secondary='matches_teams', 
         back_populates='teams'
     )
     
@@ -145,18 +327,77 @@ class Team(ResourceMixin, db.Model):
         nullable=True
     )
     country = db.relationship('Country')
+    
+    # [Team] Many (Team) to Many (Player); 1 player for singles, 2 for doubles
+    players = db.relationship(
+        'Player', 
+        secondary='teams_players', 
+        back_populates='teams'
+    )
 
 
     def __init__(self, name, country):
         self.name = name
         self.country = country
     
+    def link_players(self):
+        '''
+        Link this team to the players in its name, creating the missing ones
+        
+        eg.
+            Team('Kamura_Sonoda', jpn).link_players() --> [Player('Kamura'), Player('Sonoda')]
+        
+        Returns: List of `Player`s
+        '''
+        
+        self.players = [Player.find_or_create(name) for name in Player.names_in(self.name)]
+        
+        return self.players
+    
     @classmethod
     def find_by_name(cls, name):
         return cls.query.filter(
             cls.name == name
         ).first()
     
+    @classmethod
+    def initials(cls):
+        '''Get the sorted list of first letters of all team names'''
+        return _initials(cls.name)
+    
+    @classmethod
+    def directory(cls, initial=None):
+        '''
+        Get every team, with its match stats, in a single grouped query
+        
+        Params:
+            initial (str): Only get teams whose name starts with this letter
+        
+        Returns: List of directory entries (see `_fold_directory`), sorted by name
+        '''
+        
+        query = db.session.query(
+                cls.id, 
+                cls.name, 
+                Country.name.label('country'),
+                *_directory_aggregates()
+            ).outerjoin(
+                Country, cls.country_id == Country.id
+            ).outerjoin(
+                matches_teams, matches_teams.c.team_id == cls.id
+            ).outerjoin(
+                Match, matches_teams.c.match_id == Match.id
+            ).group_by(
+                cls.id, cls.name, Country.name, Match.discipline
+            ).order_by(
+                cls.name.asc(), cls.id
+            )
+        
+        if initial:
+            query = query.filter(_initial(cls.name) == initial)
+        
+        return _fold_directory(query)
+    
     @classmethod
     def search(cls, query):
         '''
@@ -209,6 +450,52 @@ class Country(ResourceMixin, db.Model):
             cls.name == name
         ).first()
     
+    @classmethod
+    def initials(cls):
+        '''
+        Get the sorted list of first letters of all country names, as they're shown (see `format_country`)
+        
+        Note: Countries are stored by code (eg. 'INA' is shown as 'Indonesia'), so the letters are picked in Python
+        '''
+        return sorted({_country_initial(name) for name, in db.session.query(cls.name) if name})
+    
+    @classmethod
+    def directory(cls, initial=None):
+        '''
+        Get every country, with the match stats of all its teams, in a single grouped query
+        
+        Note: Like `initials`, countries are filtered & sorted by their shown name, in Python 
+        (there are only a few hundred)
+        
+        Params:
+            initial (str): Only get countries whose shown name starts with this letter
+        
+        Returns: List of directory entries (see `_fold_directory`), sorted by shown name
+        '''
+        
+        query = db.session.query(
+                cls.id, 
+                cls.name, 
+                *_directory_aggregates()
+            ).outerjoin(
+                Team, Team.country_id == cls.id
+            ).outerjoin(
+                matches_teams, matches_teams.c.team_id == Team.id
+            ).outerjoin(
+                Match, matches_teams.c.match_id == Match.id
+            ).group_by(
+                cls.id, cls.name, Match.discipline
+            ).order_by(
+                cls.name.asc(), cls.id
+            )
+        
+        entries = _fold_directory(query)
+        
+        if initial:
+            entries = [entry for entry in entries if _country_initial(entry['name']) == initial]
+        
+        return sorted(entries, key=lambda entry: format_country(entry['name']))
+    
     @classmethod
     def search(cls, query):
         '''
@@ -237,9 +524,136 @@ class Country(ResourceMixin, db.Model):
         return or_(*search_chain)
 
 
-class Video(ResourceMixin, db.Model):
+class Player(ResourceMixin, db.Model):
+    '''
+    1 player, whether they play singles (a team of 1) or doubles with any partner
+    
+    Players are found in team names at ingestion (see `Team.link_players`), so all of a player's 
+    matches are found through the `teams_players` index, rather than by scanning team names
+    '''
+    
+    __tablename__ = 'players'
 
-    __tablename__ = 'videos'
+    id = db.Column(db.Integer, primary_key=True)
+
+    name = db.Column(db.String(50), unique=True, index=True, nullable=False)
+    
+    # [Player] Many (Player) to Many (Team)
+    teams = db.relationship(
+        'Team', 
+        secondary='teams_players', 
+        back_populates='players'
+    )
+    
+    def __init__(self, name):
+        self.name = name
+    
+    @classmethod
+    def find_by_name(cls, name):
+        return cls.query.filter(
+            cls.name == name
+        ).first()
+    
+    @classmethod
+    def find_or_create(cls, name):
+        '''
+        Get the player called `name`, creating it if it doesn't exist
+        
+        Note: The new player is only added to the session, and saved along with its team
+        
+        Returns: Player
+        '''
+        
+        player = cls.find_by_name(name)
+        if not player:
+            player = cls(name)
+            db.session.add(player)
+        
+        return player
+    
+    @staticmethod
+    def names_in(team_name):
+        '''
+        Get the player names in a team name
+        
+        eg.
+            'Kento Momota' --> ['Kento Momota']
+            'Kamura_Sonoda' --> ['Kamura', 'Sonoda']
+        
+        Returns: List of str
+        '''
+        
+        return [name.strip() for name in team_name.split(PLAYER_SEPARATOR) if name.strip()]
+    
+    @classmethod
+    def backfill(cls):
+        '''
+        Link every team to its players, creating the missing ones
+        
+        All players and teams are loaded up front (2 queries), rather than looked up 1 by 1.
+        Safe to re-run: Existing links are kept, and renamed teams are re-linked
+        
+        Returns: Number of teams whose players changed
+        '''
+        
+        players = {player.name: player for player in cls.query}
+        
+        num_teams = 0
+        for team in Team.query.options(joinedload(Team.players)):
+            
+            names = cls.names_in(team.name)
+            if [player.name for player in team.players] == names:
+                continue
+            
+            for name in names:
+                if name not in players:
+                    players[name] = cls(name)
+                    db.session.add(players[name])
+            
+            team.players = [players[name] for name in names]
+            num_teams += 1
+        
+        db.session.commit()
+        
+        return num_teams
+    
+    @classmethod
+    def search(cls, query):
+        '''
+        Search a resource by 1 or more fields
+        
+        This search:
+        - Supports partial-words 
+        - Is case-insensitive
+        - Filters through: `name`
+
+        Params:
+            query (str): Search query
+        
+        Returns: SQLAlchemy filter
+        '''
+        
+        if query == '':
+            return ''
+
+        search_query = '%{}%'.format(query)
+        
+        search_chain = (
+            Player.name.ilike(search_query),
+        )
+
+        return or_(*search_chain)
+
+
+class Match(ResourceMixin, db.Model):
+    '''
+    1 match, whatever highlights types it was cut into
+    
+    Holds everything its videos (1 per highlights type, see `Video`) have in common, so the 
+    browse pages only read 1 row (and 2 team links) per match 
+    '''
+
+    __tablename__ = 'matches'
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -252,67 +666,126 @@ class Video(ResourceMixin, db.Model):
     name = db.Column(db.String(120), nullable=False)
     filename = db.Column(db.String(120), nullable=False)
 
-    highlights_datetime = db.Column(AwareDateTime(), nullable=False)
-    highlights_type = db.Column(db.String(30), nullable=False)
-    highlights_filename = db.Column(db.String(150), nullable=False)
-    highlights_duration = db.Column(db.Time, nullable=False)
-
     date = db.Column(db.Date, nullable=False)
     round = db.Column(db.String(25), nullable=False)
     discipline = db.Column(db.String(15), nullable=False)
     
-    model_name = db.Column(db.String(150), nullable=False)
+    # Full-text search document, kept up to date by `_refresh_search_vectors`
+    # Note: Deferred, since it's only ever read by Postgres itself
+    search_vector = db.deferred(db.Column(TSVECTOR, nullable=True))
+
+    __table_args__ = (
+        db.Index('ix_matches_search_vector', 'search_vector', postgresql_using='gin'),
+        
+        # A match is found by its folder/name at ingestion
+        db.Index('ix_matches_folder_name', 'folder', 'name', unique=True),
+    )
 
 
     # ---------------------------------------------
     # --------------- Relationships ---------------
     # ---------------------------------------------
 
-    # [Video] One (Video) to One (Tournament)
+    # [Match] One (Match) to One (Tournament)
     tournament_id = db.Column(
         db.Integer, 
         db.ForeignKey(
             'tournaments.id',
             onupdate='CASCADE',
-            ondelete='SET NULL'  # If a Tournament is deleted, we DO NOT delete its Videos
+            ondelete='SET NULL'  # If a Tournament is deleted, we DO NOT delete its Matches
         ),
         index=True, 
         nullable=True
     )
-    tournament = db.relationship('Tournament')
+    tournament = db.relationship('Tournament', back_populates='matches')
     
-    # [Video] One (Video) has Many (Team)
+    # [Match] One (Match) has Many (Team)
     teams = db.relationship(
         'Team', 
-        secondary='videos_teams',
-        back_populates='videos',
+        secondary='matches_teams',
+        back_populates='matches',
         passive_deletes=True
     )
-
-    # [Video] One (Video) has Many (Views)
-    views = db.relationship(
-        View,
-        backref='videos',
+    
+    # [Match] One (Match) has Many (Video), 1 per highlights type
+    renditions = db.relationship(
+        'Video',
+        back_populates='match',
+        order_by='Video.highlights_type',
         passive_deletes=True
     )
 
     def __init__(self, **kwargs):
-        super(Video, self).__init__(**kwargs)
+        super(Match, self).__init__(**kwargs)
 
     @classmethod
-    def find_by_folder_name_highlights_type(cls, folder, name, highlights_type):        
+    def find_by_folder_name(cls, folder, name):
         return cls.query.filter_by(
             folder=folder,
-            name=name,
-            highlights_type=highlights_type
+            name=name
         ).first()
+
+    @classmethod
+    def find_for_browse(cls, *criteria):
+        '''
+        Get all matches matching `criteria`, ready to be grouped by tournament
+        
+        Everything the browse pages render is loaded in a single SELECT:
+        - `tournament` is joined (and used for ordering)
+        - `teams` and each team's `country` are eager-loaded
+        - `renditions` are eager-loaded
+        
+        Iterating the result never triggers a lazy load, so a browse page costs 
+        exactly 1 query no matter how many tournaments/matches it shows
+        
+        Order: Tournament newest-to-oldest, then match newest-to-oldest
         
+        Params:
+            *criteria: 0 or more SQLAlchemy filters 
+        
+        Returns: SQLAlchemy query
+        '''
+        return cls.query.join(
+                cls.tournament
+            ).options(
+                contains_eager(cls.tournament),
+                joinedload(cls.teams).joinedload(Team.country),
+                joinedload(cls.renditions)
+            ).filter(
+                *criteria
+            ).order_by(
+                Tournament.start_date.desc(),
+                Tournament.id.desc(),
+                cls.date.desc(),
+                cls.id.desc()
+            )
+
     @classmethod
-    def find_by_id_highlights_type(cls, id, highlights_type):
-        return cls.query.filter_by(
-            id=id,
-            highlights_type=highlights_type
-        ).first()
+    def find_page_for_browse(cls, criteria, after=None, limit=50):
+        '''
+        Get 1 page of `find_for_browse`, using keyset pagination
+        
+        Rather than using an OFFSET (which scans every skipped row), the page starts right 
+        after the browse-order key of the last match of the previous page 
+        
+        Params:
+            criteria (list):   SQLAlchemy filters
+            after (tuple):     `(tournament start_date, tournament id, match date, match id)` of the last 
+                               match on the previous page; None for the 1st page
+            limit (int):       Number of matches per page
+        
+        Returns: List of matches
+        '''
+        
+        query = cls.find_for_browse(*criteria)
+        
+        # Browse order is descending on every key, so the next page has smaller keys
+        if after is not None:
+            query = query.filter(
+                tuple_(Tournament.start_date, Tournament.id, cls.date, cls.id) < tuple_(*after)
+            )
+        
+        return query.limit(limit).all()
 
     @classmethod
     def search(cls, query):
@@ -325,7 +798,6 @@ class Video(ResourceMixin, db.Model):
         - Filters through:
             - folder
             - name
-            - highlights_type
             - round
             - discipline
 
@@ -344,14 +816,717 @@ class Video(ResourceMixin, db.Model):
         
         # Search fields
         search_chain = (
-            Video.folder.ilike(search_query),
-            Video.name.ilike(search_query),
-            Video.highlights_type.ilike(search_query),
-            Video.round.ilike(search_query),
-            Video.discipline.ilike(search_query),
+            Match.folder.ilike(search_query),
+            Match.name.ilike(search_query),
+            Match.round.ilike(search_query),
+            Match.discipline.ilike(search_query),
         )
 
-        # Allow matching to work on email, username, OR both  
-        # Note: Alternatively, `and_` returns results on email AND username 
         return or_(*search_chain)
+
+    @classmethod
+    def search_ranked(cls, query):
+        '''
+        Full-text search over the tournament name, team names, round, discipline, folder and name
+        
+        Uses the GIN index on `search_vector`, so only matching rows are read and ranked. 
+        Every word of `query` is matched as a prefix (eg. 'momo jap' finds 'Kento Momota' at 'Japan Open')
+        
+        Order: Best match first (team names weigh the most, then tournament, round/discipline, folder/name), 
+        then newest-to-oldest
+        
+        Params:
+            query (str): Search query
+        
+        Returns: SQLAlchemy query, or None if `query` has no words
+        '''
+        
+        tsquery = _prefix_tsquery(query)
+        if tsquery is None:
+            return None
+        
+        tsquery = func.to_tsquery(SEARCH_CONFIG, tsquery)
+        
+        return cls.query.options(
+                joinedload(cls.tournament),
+                joinedload(cls.teams).joinedload(Team.country),
+                joinedload(cls.renditions)
+            ).filter(
+                cls.search_vector.op('@@')(tsquery)
+            ).order_by(
+                func.ts_rank_cd(cls.search_vector, tsquery).desc(),
+                cls.date.desc(),
+                cls.id.desc()
+            )
+
+    @classmethod
+    def search_document(cls):
+        '''
+        SQL expression that builds a match's `search_vector`
+        
+        Weights: 
+            A: Team names 
+            B: Tournament name 
+            C: Round, discipline
+            D: Folder, name
+        
+        Note: A generated column can't read other tables (tournament/team names), 
+        so the vector is stored by `refresh_search_vectors` instead
+        
+        Returns: SQLAlchemy expression
+        '''
+        
+        tournament_name = select(
+                Tournament.name
+            ).where(
+                Tournament.id == cls.tournament_id
+            ).scalar_subquery()
+        
+        team_names = select(
+                func.string_agg(Team.name, ' ')
+            ).select_from(
+                matches_teams.join(Team)
+            ).where(
+                matches_teams.c.match_id == cls.id
+            ).scalar_subquery()
+        
+        return _weighted(team_names, 'A') \
+            .op('||')(_weighted(tournament_name, 'B')) \
+            .op('||')(_weighted(cls.round + ' ' + cls.discipline, 'C')) \
+            .op('||')(_weighted(cls.folder + ' ' + cls.name, 'D'))
+
+    @classmethod
+    def refresh_search_vectors(cls, connection, *criteria):
+        '''
+        Rebuild `search_vector` of the matches matching `criteria`, in a single UPDATE
+        
+        Params:
+            connection (SQLAlchemy connection)
+            *criteria: 0 or more SQLAlchemy filters; Rebuilds every match if there's none
+        '''
+        
+        connection.execute(
+            cls.__table__.update().where(
+                *criteria
+            ).values(
+                search_vector=cls.search_document(),
+                
+                # Not an edit of the match, so keep `updated_on` as it is 
+                updated_on=cls.__table__.c.updated_on
+            )
+        )
+
+
+class Video(ResourceMixin, db.Model):
+    '''
+    1 highlights type (eg. 'Extended Highlights') of a `Match`, and its file
+    '''
+
+    __tablename__ = 'videos'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+
+    # ---------------------------------------------
+    # --------------- Details ---------------
+    # ---------------------------------------------
+
+    highlights_datetime = db.Column(AwareDateTime(), nullable=False)
+    highlights_type = db.Column(db.String(30), nullable=False)
+    highlights_filename = db.Column(db.String(150), nullable=False)
+    
+    # Length, in seconds
+    highlights_duration = db.Column(db.Integer, nullable=False)
+    
+    model_name = db.Column(db.String(150), nullable=False)
+
+
+    # ---------------------------------------------
+    # --------------- Derived files ---------------
+    # ---------------------------------------------
+    
+    # Files made from the video's file, in the same folder (see `media.py`); None until they're made
+    
+    # HLS playlist of the video's own streams (eg. '[Highlights] m0.hls/source/index.m3u8')
+    hls_manifest = db.Column(db.String(255))
+    
+    # HLS master playlist of every rendition (eg. '[Highlights] m0.hls/master.m3u8'), and the encoded renditions (eg. ['360p', '720p'])
+    hls_master = db.Column(db.String(255))
+    hls_ladder = db.Column(db.ARRAY(db.String(10)))
+    
+    # Poster key, in the poster cache (eg. '3f/3fa4...', see `media.make_poster`)
+    poster = db.Column(db.String(70))
+    
+    # WebVTT track of the scrubbing previews' sprite sheets (eg. '[Highlights] m0.sprites/thumbnails.vtt')
+    sprites = db.Column(db.String(255))
+    
+    # Whether the file's `moov` box is before its `mdat` box, once checked (& remuxed if it wasn't, see `media.make_faststart`); False if it can't be
+    faststart = db.Column(db.Boolean)
+    
+    # `CatalogVersion.match_version` that last changed its derived files, so workers only drop its own cached match page
+    match_version = db.Column(db.Integer, index=True)
+
+
+    # ---------------------------------------------
+    # --------------- Relationships ---------------
+    # ---------------------------------------------
+
+    # [Video] Many (Video) to One (Match)
+    # Note: `selectin` loads the matches of a whole page of videos (eg. admin tables) in 1 extra query
+    match_id = db.Column(
+        db.Integer, 
+        db.ForeignKey(
+            'matches.id',
+            onupdate='CASCADE',
+            ondelete='CASCADE'
+        ),
+        index=True, 
+        nullable=False
+    )
+    match = db.relationship('Match', back_populates='renditions', lazy='selectin')
+
+    __table_args__ = (
+        db.UniqueConstraint('match_id', 'highlights_type', name='uq_videos_match_id_highlights_type'),
+    )
+
+    # [Video] One (Video) has Many (Views)
+    views = db.relationship(
+        View,
+        backref='videos',
+        passive_deletes=True
+    )
+
+    def __init__(self, **kwargs):
+        super(Video, self).__init__(**kwargs)
+    
+    @hybrid_property
+    def highlights_duration_hms(self):
+        '''Length as a `datetime.time` (eg. 00:05:03), for display'''
+        return seconds_to_time(self.highlights_duration)
+    
+    @highlights_duration_hms.expression
+    def highlights_duration_hms(cls):
+        return cls.highlights_duration * literal_column("interval '1 second'")
+    
+    @property
+    def name(self):
+        '''Name of the match (shown in the admin tables)'''
+        return self.match.name
+    
+    @property
+    def date(self):
+        '''Date of the match (shown in the admin tables)'''
+        return self.match.date
+    
+    def path(self, root):
+        '''
+        Path of this video's file
+        
+        eg.
+            video.path(current_app.config['VID_DIR']) --> '<VID_DIR>/<folder>/<name>/[Highlights] <filename>'
+        
+        Params:
+            root (str): Videos directory
+        
+        Returns: str
+        '''
+        
+        return os.path.join(
+            root,
+            self.match.folder,
+            self.match.name,
+            '[{}] {}'.format(self.highlights_type, self.match.filename)
+        )
+    
+    def derived_path(self, root, relative_path):
+        '''
+        Path of a file made from this video's file (eg. its `hls_manifest`), which are relative to its folder
+        
+        eg.
+            video.derived_path(root, video.hls_manifest) --> '<VID_DIR>/<folder>/<name>/[Highlights] <filename>.hls/index.m3u8'
+        
+        Returns: str
+        '''
+        return os.path.join(os.path.dirname(self.path(root)), relative_path)
+    
+    @classmethod
+    def sort_by(cls, field, direction):
+        '''
+        Validate the sort field and direction (see `ResourceMixin.sort_by`)
+        
+        The match's `name` and `date` (shown in the admin tables) are sorted on its table, 
+        so the query must join `Match`
+        
+        eg.
+            Video.sort_by('name', 'asc') --> ('matches.name', 'asc')
+            Video.sort_by('highlights_type', 'asc') --> ('videos.highlights_type', 'asc')
+        
+        Returns: `(field, direction)` tuple, with the field's table
+        '''
+        
+        if field in ('name', 'date'):
+            field, direction = Match.sort_by(field, direction)
+            return '{}.{}'.format(Match.__tablename__, field), direction
+        
+        field, direction = super(Video, cls).sort_by(field, direction)
+        
+        return '{}.{}'.format(cls.__tablename__, field), direction
+
+    @classmethod
+    def find_ids_without(cls, column, *criteria):
+        '''
+        IDs of the videos whose derived file `column` (eg. `Video.hls_manifest`) isn't made yet
+        
+        eg.
+            Video.find_ids_without(Video.hls_master, Video.hls_manifest.isnot(None))
+        
+        Params:
+            column:       Derived file column
+            *criteria:    Other filters (eg. files it's made after)
+        
+        Returns: List of int, oldest first
+        '''
+        return [id for id, in db.session.query(cls.id).filter(column.is_(None), *criteria).order_by(cls.id)]
+
+    @classmethod
+    def find_changed_since(cls, match_version):
+        '''
+        Videos whose derived files changed after `match_version` (see `CatalogVersion.bump_match_version`)
+        
+        Params:
+            match_version (int)
+        
+        Returns: List of `(id, highlights_type)`
+        '''
+        return db.session.query(cls.id, cls.highlights_type).filter(cls.match_version > match_version).all()
+
+    @classmethod
+    def find_by_folder_name_highlights_type(cls, folder, name, highlights_type):        
+        return cls.query.join(
+                cls.match
+            ).filter(
+                Match.folder == folder,
+                Match.name == name,
+                cls.highlights_type == highlights_type
+            ).first()
+        
+    @classmethod
+    def find_by_id_highlights_type(cls, id, highlights_type):
+        return cls.query.filter_by(
+            id=id,
+            highlights_type=highlights_type
+        ).first()
+
+    @classmethod
+    def find_for_match(cls, id, highlights_type):
+        '''
+        Get everything the match page renders, in a single SELECT:
+        - The video, its match, the match's `tournament`, `teams` and each team's `country`
+        - Its siblings: The match's other `renditions` (ie. the other highlights types)
+        
+        Params:
+            id (int)
+            highlights_type (str)
+        
+        Returns: Video, or None if it doesn't exist
+        '''
+        
+        return cls.query.options(
+                joinedload(cls.match).joinedload(Match.tournament),
+                joinedload(cls.match).joinedload(Match.teams).joinedload(Team.country),
+                joinedload(cls.match).joinedload(Match.renditions)
+            ).filter(
+                cls.id == id,
+                cls.highlights_type == highlights_type
+            ).first()
+
+    @classmethod
+    def search(cls, query):
+        '''
+        Search a resource by 1 or more fields
+        
+        This search:
+        - Supports partial-words 
+        - Is case-insensitive
+        - Filters through:
+            - highlights_type
+            - The match's folder, name, round and discipline (see `Match.search`)
+
+        Params:
+            query (str): Search query
+        
+        Returns: SQLAlchemy filter
+        '''
+        
+        # Return empty string if there's no search query
+        if query == '':
+            return ''
+
+        # This tells SQLAlchemy that we want to search for partial-words 
+        search_query = '%{}%'.format(query)
+        
+        # Search fields
+        # Note: `has` is an EXISTS subquery, so this filter works without joining `Match`
+        search_chain = (
+            Video.highlights_type.ilike(search_query),
+            Video.match.has(Match.search(query)),
+        )
+
+        return or_(*search_chain)
+
+
+class RelatedVideos(ResourceMixin, db.Model):
+    '''
+    "Up next" candidates of a video, shown on its match page
+    
+    Computed offline for every video at once by `compute` (see `video/tasks.py`), 
+    and stored as arrays of video IDs so the match page only needs 1 lookup
+    '''
+    
+    __tablename__ = 'related_videos'
+    
+    video_id = db.Column(
+        db.Integer, 
+        db.ForeignKey(
+            'videos.id',
+            onupdate='CASCADE',
+            ondelete='CASCADE'
+        ),
+        primary_key=True
+    )
+    
+    # Same tournament & discipline, later rounds (the same teams' matches first)
+    next_round_ids = db.Column(db.ARRAY(db.Integer), nullable=False, default=list)
+    
+    # Other matches of either team, newest first 
+    same_teams_ids = db.Column(db.ARRAY(db.Integer), nullable=False, default=list)
+    
+    # Watched by the most users who also watched this video 
+    co_viewed_ids = db.Column(db.ARRAY(db.Integer), nullable=False, default=list)
+    
+    @classmethod
+    def find_by_video_id(cls, video_id):
+        return cls.query.get(video_id)
+    
+    @classmethod
+    def compute(cls, limit=RELATED_VIDEOS_LIMIT):
+        '''
+        Recompute the related videos of every video, and replace the stored ones
+        
+        Candidates only have the same `highlights_type` as the video (except co-viewed ones), 
+        and a video only appears in 1 list
+        
+        Params:
+            limit (int): Max number of videos per list
+        
+        Returns: Number of videos updated
+        '''
+        
+        from badmintontv.blueprints.video.catalog import Catalog
+        
+        catalog = Catalog.build(CatalogVersion.current()[0])
+        co_viewed = cls._co_viewed(limit)
+        
+        rows = []
+        for match in catalog.matches:
+            
+            # Candidates are matches, so they're only found once for all of the match's videos 
+            next_round = _next_round_candidates(catalog, match)
+            same_teams = _same_teams_candidates(catalog, match)
+            
+            for video in match.renditions:
+                
+                shown = {video.id}
+                
+                next_round_ids = _take(_rendition_ids(next_round, video.highlights_type), shown, limit)
+                same_teams_ids = _take(_rendition_ids(same_teams, video.highlights_type), shown, limit)
+                co_viewed_ids = _take(co_viewed.get(video.id, ()), shown, limit)
+                
+                rows.append({
+                    'video_id': video.id,
+                    'next_round_ids': next_round_ids,
+                    'same_teams_ids': same_teams_ids,
+                    'co_viewed_ids': co_viewed_ids
+                })
+        
+        # Replace everything in 1 transaction, so the match page never sees a partial update
+        cls.query.delete()
+        db.session.bulk_insert_mappings(cls, rows)
+        db.session.commit()
+        
+        return len(rows)
+    
+    @staticmethod
+    def _co_viewed(limit):
+        '''
+        Most co-viewed videos of each video: Videos watched by the same users, 
+        ranked by number of users
+        
+        Only the top `limit` of each video leave the DB (`row_number` over each video)
+        
+        Returns: dict of video ID --> list of video IDs
+        '''
+        
+        view, other_view = aliased(View), aliased(View)
+        
+        pairs = db.session.query(
+                view.video_id.label('video_id'),
+                other_view.video_id.label('other_id'),
+                func.row_number().over(
+                    partition_by=view.video_id,
+                    order_by=(func.count(distinct(view.user_id)).desc(), other_view.video_id.desc())
+                ).label('rank')
+            ).join(
+                other_view, 
+                and_(other_view.user_id == view.user_id, other_view.video_id != view.video_id)
+            ).group_by(
+                view.video_id, 
+                other_view.video_id
+            ).subquery()
+        
+        co_viewed = {}
+        
+        query = db.session.query(
+                pairs.c.video_id, 
+                pairs.c.other_id
+            ).filter(
+                pairs.c.rank <= limit
+            ).order_by(
+                pairs.c.video_id, 
+                pairs.c.rank
+            )
+        
+        for video_id, other_id in query:
+            co_viewed.setdefault(video_id, []).append(other_id)
+        
+        return co_viewed
+
+
+def _next_round_candidates(catalog, match):
+    '''
+    Later matches of `match`'s tournament, in the same discipline
+    
+    Order: Matches of the same teams first (ie. their next round), then by date
+    
+    Returns: List of `MatchRecord`s
+    '''
+    
+    teams = set(team.name for team in match.teams)
+    
+    candidates = [
+        other for other in catalog.find_matches(catalog.matches_by_tournament, match.tournament.id)
+        if other.discipline == match.discipline
+        and other.date > match.date
+        and other.round != match.round
+    ]
+    
+    candidates.sort(key=lambda other: (teams.isdisjoint(team.name for team in other.teams), other.date, other.id))
+    
+    return candidates
+
+
+def _same_teams_candidates(catalog, match):
+    '''
+    Other matches of either team of `match`, newest first 
+    
+    Returns: List of `MatchRecord`s
+    '''
+    
+    positions = set()
+    for team in match.teams:
+        positions.update(catalog.matches_by_team.get(team.name, ()))
+    
+    # Positions are in browse order (newest first)
+    return [catalog.matches[position] for position in sorted(positions)]
+
+
+def _rendition_ids(matches, highlights_type):
+    '''
+    IDs of the `highlights_type` video of each of `matches` (skipping matches without one)
+    
+    Returns: Generator of video IDs
+    '''
+    
+    for match in matches:
+        rendition = match.find_rendition(highlights_type)
+        
+        if rendition is not None:
+            yield rendition.id
+
+
+def _take(video_ids, shown, limit):
+    '''
+    Take the first `limit` video IDs that aren't in `shown`, and add them to `shown`
+    
+    Returns: List of video IDs
+    '''
+    
+    taken = []
+    for video_id in video_ids:
+        if len(taken) == limit:
+            break
+        
+        if video_id not in shown:
+            shown.add(video_id)
+            taken.append(video_id)
+    
+    return taken
+
+
+# Text search configuration; 'simple' doesn't stem, so names are matched as they're spelled 
+SEARCH_CONFIG = 'simple'
+
+
+def _weighted(text, weight):
+    '''SQL expression for the `tsvector` of `text`, with all its words given `weight` (A-D)'''
+    
+    # Doubles teams are stored as 'Player 1_Player 2'
+    text = func.replace(func.coalesce(text, ''), '_', ' ')
+    
+    return func.setweight(func.to_tsvector(SEARCH_CONFIG, text), weight)
+
+
+def _prefix_tsquery(query):
+    '''
+    Turn a search query into a `tsquery` where every word is a prefix 
+    
+    eg.
+        'momota Japan' --> 'momota:* & japan:*'
+    
+    Returns: str, or None if `query` has no words
+    '''
+    
+    words = re.findall(r'[^\W_]+', query.lower())
+    if not words:
+        return None
+    
+    return ' & '.join('{}:*'.format(word) for word in words)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _refresh_search_vectors(session, flush_context):
+    '''
+    Rebuild the `search_vector` of every match whose searchable text changed: 
+    - New/edited matches
+    - Matches of renamed tournaments/teams
+    '''
+    
+    connection = session.connection()
+    
+    # Full-text search is Postgres only 
+    if connection.dialect.name != 'postgresql':
+        return
+    
+    match_ids, tournament_ids, team_ids = set(), set(), set()
+    
+    # Note: `new` and `dirty` still hold their pre-flush state here
+    for obj in session.new:
+        if isinstance(obj, Match):
+            match_ids.add(obj.id)
+    
+    for obj in session.dirty:
+        if isinstance(obj, Match) and session.is_modified(obj):
+            match_ids.add(obj.id)
+        
+        elif isinstance(obj, Tournament) and inspect(obj).attrs.name.history.has_changes():
+            tournament_ids.add(obj.id)
+        
+        elif isinstance(obj, Team) and inspect(obj).attrs.name.history.has_changes():
+            team_ids.add(obj.id)
+    
+    criteria = []
+    if match_ids:
+        criteria.append(Match.id.in_(match_ids))
+    
+    if tournament_ids:
+        criteria.append(Match.tournament_id.in_(tournament_ids))
+    
+    if team_ids:
+        criteria.append(Match.id.in_(
+            select(matches_teams.c.match_id).where(matches_teams.c.team_id.in_(team_ids))
+        ))
+    
+    if criteria:
+        Match.refresh_search_vectors(connection, or_(*criteria))
+
+
+def _initial(field):
+    '''SQL expression for the upper-case first letter of `field`'''
+    return func.upper(func.substr(field, 1, 1))
+
+
+def _country_initial(name):
+    '''First letter of a country's shown name (eg. 'INA' --> 'I', from 'Indonesia')'''
+    return format_country(name)[:1].upper()
+
+
+def _initials(field):
+    '''
+    Get the distinct, sorted first letters of `field`
+    
+    Params:
+        field (SQLAlchemy field)
+    
+    Returns: List of str
+    '''
+    
+    initial = _initial(field)
+    
+    return [row[0] for row in db.session.query(initial).distinct().order_by(initial)]
+
+
+def _directory_aggregates():
+    '''
+    Aggregates used by `Team.directory` and `Country.directory`, grouped per discipline
+    
+    Note: `distinct`, since a country's 2 teams can play each other
+    '''
+    return (
+        Match.discipline,
+        func.count(distinct(Match.id)).label('num_matches'),
+        func.max(Match.date).label('latest_date')
+    )
+
+
+def _fold_directory(rows):
+    '''
+    Merge the per-discipline rows of a directory query into 1 entry per team/country
+    
+    eg.
+        {
+            'id': 1, 'name': 'Kento Momota', 'country': 'JPN',
+            'num_matches': 14, 'latest_date': datetime.date(2022, 9, 1),
+            'disciplines': {'MS': 14}
+        }
+    
+    Params:
+        rows (...): Rows of `(id, name, [country], discipline, num_matches, latest_date)`, sorted by name
+    
+    Returns: List of dicts
+    '''
+    
+    entries = {}
+    for row in rows:
+        
+        entry = entries.get(row.id)
+        if entry is None:
+            entry = entries[row.id] = {
+                'id': row.id,
+                'name': row.name,
+                'country': getattr(row, 'country', None),
+                'num_matches': 0,
+                'latest_date': None,
+                'disciplines': {}
+            }
+        
+        # Outer joins leave a single empty row for teams/countries without matches 
+        if row.discipline is None:
+            continue
+        
+        entry['num_matches'] += row.num_matches
+        entry['disciplines'][row.discipline] = row.num_matches
+        
+        if entry['latest_date'] is None or row.latest_date > entry['latest_date']:
+            entry['latest_date'] = row.latest_date
     
+    return list(entries.values())
@@ -0,0 +1,105 @@
+import hmac
+import time
+import hashlib
+import datetime
+
+from flask import current_app, url_for
+
+
+def signed_video_url(id, highlights_type, user_id, endpoint='video.stream', **values):
+    '''
+    Short-lived URL of a match's video file (or of a file made from it), for a given user
+
+    The URL carries its expiry and an HMAC (keyed by `SECRET_KEY`) of the video, the user and the
+    expiry, so the request for the file can be authorized without the session or the database
+    (see `verify_video_url`). The signature covers every file of the video, so it can be passed on
+    to relative URLs (eg. from an HLS playlist to its segments)
+
+    Expiries are aligned on `VIDEO_URL_DURATION` windows, so the URL stays the same during a window
+    (the match page, and proxies caching the file, can re-use it), and is valid for 1 to 2 windows
+
+    eg.
+        signed_video_url(1, 'Highlights', user_id)
+        signed_video_url(1, 'Highlights', user_id, 'video.hls', filename='index.m3u8')
+
+    Params:
+        id (int):                Video ID
+        highlights_type (str):   Type of highlights of the video
+        user_id (int):           Who the URL is issued to
+        endpoint (str):          View serving the file
+        **values:                Other arguments of `endpoint`
+
+    Returns: str
+    '''
+
+    window = _window_seconds()
+    expires = (int(time.time()) // window + 2) * window
+
+    return url_for(
+        endpoint,
+        id=id,
+        highlights_type=highlights_type,
+        user=user_id,
+        expires=expires,
+        signature=_signature(id, highlights_type, user_id, expires),
+        **values
+    )
+
+
+def verify_video_url(id, highlights_type, args):
+    '''
+    Is this a valid, unexpired signed URL of this video?
+
+    Params:
+        id (int):                Video ID, from the URL
+        highlights_type (str):   Type of highlights, from the URL
+        args (dict):             Query string of the URL
+
+    Returns: Seconds left before the URL expires, or None if it isn't valid
+    '''
+
+    try:
+        user_id = int(args['user'])
+        expires = int(args['expires'])
+        signature = args['signature']
+    except (KeyError, ValueError):
+        return None
+
+    seconds_left = expires - int(time.time())
+    if seconds_left <= 0:
+        return None
+
+    if not hmac.compare_digest(signature, _signature(id, highlights_type, user_id, expires)):
+        return None
+
+    return seconds_left
+
+
+def video_url_window_start():
+    '''
+    Start of the current `VIDEO_URL_DURATION` window, when signed URLs last changed
+
+    Used by the validators of pages with signed URLs, so a 304 never re-uses expired URLs
+
+    Returns: Unaware UTC `datetime`
+    '''
+
+    window = _window_seconds()
+    return datetime.datetime.utcfromtimestamp(int(time.time()) // window * window)
+
+
+def _window_seconds():
+    '''Length of a signed URL window, in seconds'''
+    return int(current_app.config['VIDEO_URL_DURATION'].total_seconds())
+
+
+def _signature(id, highlights_type, user_id, expires):
+    '''HMAC-SHA256 of a signed URL's fields, as hex'''
+
+    message = 'video-url\n{}\n{}\n{}\n{}'.format(id, highlights_type, user_id, expires)
+
+    return hmac.new(
+        current_app.config['SECRET_KEY'].encode('utf-8'),
+        message.encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
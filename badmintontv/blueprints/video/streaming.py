@@ -0,0 +1,352 @@
+import os
+import re
+import uuid
+import datetime
+
+from urllib.parse import quote
+from flask import request, current_app, abort
+from werkzeug.wsgi import ClosingIterator
+
+# Max number of ranges in 1 request (more are answered with the whole file, which RFC 7233 allows)
+STREAM_MAX_RANGES = 16
+
+
+# Values of `VIDEO_DELIVERY`
+VIDEO_DELIVERY_MODES = ('python', 'x-accel', 'x-sendfile')
+
+# `Content-Type` of HLS files, by extension
+HLS_MIMETYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+    '.ts': 'video/mp2t'
+}
+
+# URI attribute of an HLS tag (eg. `#EXT-X-MAP:URI="init.mp4"`)
+HLS_URI_ATTRIBUTE = re.compile(r'URI="([^"]*)"')
+
+# `Content-Type` of scrubbing preview files, by extension
+SPRITE_MIMETYPES = {
+    '.vtt': 'text/vtt',
+    '.jpg': 'image/jpeg'
+}
+
+# Cue payload of a thumbnail track (eg. `sprite_000.jpg#xywh=0,0,160,90`)
+THUMBNAIL_CUE = re.compile(r'^([^#\s]+)(#xywh=[\d,]+)$')
+
+
+def send_video(path, mimetype='video/mp4', max_age=None):
+    '''
+    Response sending the video file at `path` (in `VID_DIR`), the way set by `VIDEO_DELIVERY`
+
+    With 'x-accel' / 'x-sendfile', the response only has a header pointing to the file, and the 
+    front server streams it (with `Range` support), so a Gunicorn worker isn't tied up for the 
+    whole download. With 'python', Flask streams it (see `stream_file`)
+
+    Note: Only call this once the user is allowed to watch the video, since the front server 
+    doesn't check anything
+
+    Params:
+        path (str):       Video file
+        mimetype (str):   `Content-Type` of the file
+        max_age (int):    Seconds shared caches (proxies) may keep the file, if its URL is signed 
+                          (otherwise, only the signed-in user's browser may keep it)
+
+    Returns: Response
+    '''
+
+    delivery = current_app.config['VIDEO_DELIVERY']
+    if delivery not in VIDEO_DELIVERY_MODES:
+        raise ValueError('VIDEO_DELIVERY must be 1 of {}, not {!r}'.format(VIDEO_DELIVERY_MODES, delivery))
+
+    if delivery == 'python':
+        response = stream_file(path, mimetype)
+    else:
+        response = _offload_file(path, mimetype, delivery)
+
+    return _cache_for(response, max_age)
+
+
+def send_playlist(path, query_string='', max_age=None):
+    '''
+    Response with the HLS playlist at `path`, with `query_string` added to each of its URIs
+
+    Segments are listed by relative URIs, which would lose the query string of the playlist's URL,
+    so the signature of a signed playlist URL is passed on to its segments (and variant playlists)
+
+    Params:
+        path (str):           Playlist file
+        query_string (str):   eg. 'user=1&expires=...&signature=...'
+        max_age (int):        See `send_video`
+
+    Returns: Response
+    '''
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        abort(404)
+
+    suffix = '?' + query_string if query_string else ''
+
+    for i, line in enumerate(lines):
+        if not line:
+            continue
+
+        if line.startswith('#'):
+            lines[i] = HLS_URI_ATTRIBUTE.sub(lambda match: 'URI="{}{}"'.format(match.group(1), suffix), line)
+        else:
+            lines[i] = line + suffix
+
+    response = current_app.response_class('\n'.join(lines) + '\n', mimetype=HLS_MIMETYPES['.m3u8'])
+
+    return _cache_for(response, max_age)
+
+
+def send_thumbnail_track(path, query_string='', max_age=None):
+    '''
+    Response with the WebVTT thumbnail track at `path`, with `query_string` added to each sprite sheet's URI
+
+    Like `send_playlist`, so the sprite sheets of a signed track are signed too
+
+    Params:
+        path (str):           Track file
+        query_string (str):   eg. 'user=1&expires=...&signature=...'
+        max_age (int):        See `send_video`
+
+    Returns: Response
+    '''
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        abort(404)
+
+    if query_string:
+        lines = [THUMBNAIL_CUE.sub(r'\1?{}\2'.format(query_string), line) for line in lines]
+
+    response = current_app.response_class('\n'.join(lines) + '\n', mimetype=SPRITE_MIMETYPES['.vtt'])
+
+    return _cache_for(response, max_age)
+
+
+def _cache_for(response, max_age):
+    '''Lets shared caches keep `response` for `max_age` seconds, or only the user's browser if None'''
+
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.private = True
+
+    return response
+
+
+def _offload_file(path, mimetype, delivery):
+    '''
+    Response asking the front server to send the file at `path`
+
+    Returns: Response
+    '''
+
+    root = os.path.abspath(current_app.config['VID_DIR'])
+    path = os.path.abspath(path)
+
+    # Never point the front server outside of `VID_DIR`
+    if os.path.commonpath((root, path)) != root:
+        abort(404)
+
+    response = current_app.response_class(mimetype=mimetype)
+
+    if delivery == 'x-accel':
+        relative_path = os.path.relpath(path, root).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = current_app.config['VIDEO_ACCEL_PREFIX'] + quote(relative_path)
+    else:
+        response.headers['X-Sendfile'] = path
+
+    return response
+
+
+def stream_file(path, mimetype='video/mp4'):
+    '''
+    Response streaming the file at `path` from Python, honouring the request's `Range` header
+
+    - No `Range` (or one that can't be honoured): 200 with the whole file
+    - 1 range: 206 with that part of the file
+    - Several ranges: 206 with a `multipart/byteranges` body
+    - No satisfiable range: 416
+
+    The whole file is handed to the WSGI server's `wsgi.file_wrapper`, which Gunicorn sends with
+    `os.sendfile`, without copying it through Python. Ranges (or the whole file, without a file
+    wrapper) are read in chunks of `STREAM_CHUNK_SIZE` bytes: a file wrapper sends everything up to
+    the end of the file, whatever `Content-Length` says
+
+    Params:
+        path (str):       Video file
+        mimetype (str):   `Content-Type` of the file
+
+    Returns: Response
+    '''
+
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        abort(404)
+
+    try:
+        stat = os.fstat(f.fileno())
+        size = stat.st_size
+        etag = '{:x}-{:x}'.format(int(stat.st_mtime), size)
+        last_modified = datetime.datetime.utcfromtimestamp(int(stat.st_mtime))
+
+        ranges = _requested_ranges(size, etag, last_modified)
+
+        if ranges == []:
+            f.close()
+            response = current_app.response_class(status=416)
+            response.headers['Content-Range'] = 'bytes */{}'.format(size)
+
+        elif ranges is None or len(ranges) == 1:
+            start, stop = ranges[0] if ranges else (0, size)
+
+            response = current_app.response_class(
+                _file_body(f, start, stop - start, size),
+                status=206 if ranges else 200,
+                mimetype=mimetype,
+                direct_passthrough=True
+            )
+            response.content_length = stop - start
+            if ranges:
+                response.headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, stop - 1, size)
+
+        else:
+            boundary = uuid.uuid4().hex
+            parts = [(start, stop, _part_header(boundary, mimetype, start, stop, size)) for start, stop in ranges]
+            closing = '\r\n--{}--\r\n'.format(boundary).encode('ascii')
+
+            response = current_app.response_class(
+                _read_chunks(f, parts, closing),
+                status=206,
+                mimetype='multipart/byteranges; boundary={}'.format(boundary),
+                direct_passthrough=True
+            )
+            response.content_length = sum(len(header) + stop - start for start, stop, header in parts) + len(closing)
+
+    except Exception:
+        f.close()
+        raise
+
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.set_etag(etag)
+    response.last_modified = last_modified
+
+    return response
+
+
+def _requested_ranges(size, etag, last_modified):
+    '''
+    Byte ranges of the file requested by the `Range` header
+
+    Note: Ranges are ascending & non-overlapping (Werkzeug ignores other `Range` headers)
+
+    Params:
+        size (int):                         File size, in bytes
+        etag (str):                         Current validator of the file, for `If-Range`
+        last_modified (datetime.datetime):  Current modification time of the file, for `If-Range`
+
+    Returns: List of `(start, stop)` (stop excluded), [] if none is satisfiable, or None to send the whole file
+    '''
+
+    requested = request.range
+    if requested is None or requested.units != 'bytes' or len(requested.ranges) > STREAM_MAX_RANGES:
+        return None
+
+    # The client's copy is outdated, so its ranges would be mixed with parts of another file
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None and if_range.date != last_modified:
+        return None
+
+    ranges = []
+    for start, stop in requested.ranges:
+
+        # Suffix range (eg. `bytes=-500`, the last 500 bytes)
+        if start < 0:
+            start, stop = max(size + start, 0), size
+
+        else:
+            stop = size if stop is None else min(stop, size)
+
+        if start < stop:
+            ranges.append((start, stop))
+
+    return ranges
+
+
+def _file_body(f, start, length, size):
+    '''
+    Iterable of `length` bytes of `f`, from `start`, using the WSGI server's file wrapper if it's the whole file
+
+    Note: Only the whole file goes to the file wrapper, since the wrapper isn't bounded by `length` 
+    (eg. wsgiref's reads up to the end of the file)
+
+    Params:
+        f (file):        File of `size` bytes
+        start (int)
+        length (int)
+        size (int)
+
+    Returns: Iterable of bytes
+    '''
+
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None and start == 0 and length == size:
+        return file_wrapper(f, current_app.config['STREAM_CHUNK_SIZE'])
+
+    return _read_chunks(f, [(start, start + length, b'')], b'')
+
+
+def _read_chunks(f, parts, closing):
+    '''
+    Reads `(start, stop, header)` parts of `f`, each preceded by its header, then `closing`
+
+    Note: `f` is closed when the server closes the response (once sent, or when the client went away)
+
+    Returns: Iterable of bytes
+    '''
+
+    # Read now: the body is iterated after the request (and its app context) is gone
+    chunk_size = current_app.config['STREAM_CHUNK_SIZE']
+
+    def generate():
+        for start, stop, header in parts:
+            if header:
+                yield header
+
+            f.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+
+        if closing:
+            yield closing
+
+    return ClosingIterator(generate(), f.close)
+
+
+def _part_header(boundary, mimetype, start, stop, size):
+    '''Header of 1 part of a `multipart/byteranges` body'''
+
+    return (
+        '\r\n--{}\r\n'
+        'Content-Type: {}\r\n'
+        'Content-Range: bytes {}-{}/{}\r\n'
+        '\r\n'
+    ).format(boundary, mimetype, start, stop - 1, size).encode('ascii')
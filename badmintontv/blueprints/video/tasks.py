@@ -0,0 +1,221 @@
+import logging
+
+from flask import current_app
+
+from badmintontv.app import create_celery_app
+from badmintontv.extensions import db
+from badmintontv.blueprints.video.models import Video, RelatedVideos
+from badmintontv.blueprints.video.media import make_faststart, segment_hls, encode_ladder, make_poster_batch, make_sprites
+
+celery = create_celery_app()
+logger = logging.getLogger(__name__)
+
+# Number of videos made faststart (then recorded) at once
+FASTSTART_BATCH_SIZE = 50
+
+# Number of videos whose posters are made (then recorded) at once
+POSTER_BATCH_SIZE = 50
+
+
+@celery.task()
+def compute_related_videos():
+    '''
+    Recompute the "Up next" videos of every video
+
+    Returns: Number of videos updated
+    '''
+    return RelatedVideos.compute()
+
+
+@celery.task()
+def make_videos_faststart():
+    '''
+    Move the `moov` box of every video that isn't checked yet to the start of its file if needed 
+    (see `media.make_faststart`), and record it, so each file is only ever checked once
+
+    Videos are recorded every `FASTSTART_BATCH_SIZE` videos, so an interrupted run keeps its progress. 
+    A video that fails is left unchecked, and retried on the next run
+
+    Then, as the files won't move anymore, queues their HLS segmentation, posters & scrubbing previews
+
+    Returns: Number of videos checked
+    '''
+
+    root = current_app.config['VID_DIR']
+    ids = Video.find_ids_without(Video.faststart)
+
+    num_checked = 0
+    for start in range(0, len(ids), FASTSTART_BATCH_SIZE):
+        for video in Video.query.filter(Video.id.in_(ids[start:start + FASTSTART_BATCH_SIZE])):
+            try:
+                video.faststart = make_faststart(video.path(root))
+                num_checked += 1
+            except Exception:
+                logger.exception('Faststart of video %s failed', video.id)
+
+        db.session.commit()
+
+    if ids:
+        segment_videos.delay()
+        make_posters.delay()
+        make_sprite_sheets.delay()
+
+    return num_checked
+
+
+@celery.task()
+def segment_videos():
+    '''
+    Queue the HLS segmentation of every video that isn't segmented yet (1 task per video, so 
+    several workers can segment in parallel)
+
+    Returns: Number of videos queued
+    '''
+
+    ids = Video.find_ids_without(Video.hls_manifest)
+    for id in ids:
+        segment_video.delay(id)
+
+    return len(ids)
+
+
+@celery.task()
+def segment_video(video_id):
+    '''
+    Segment a video into HLS, next to its file, and record its playlist
+
+    Params:
+        video_id (int)
+
+    Returns: Path of the playlist (relative to the video's folder), or None if there's nothing to do
+    '''
+
+    video = Video.query.get(video_id)
+    if video is None or video.hls_manifest is not None:
+        return None
+
+    video.hls_manifest = segment_hls(video.path(current_app.config['VID_DIR']))
+    video.save()
+
+    # Its lower bitrates are encoded next (much slower)
+    encode_ladder_of_video.delay(video.id)
+
+    return video.hls_manifest
+
+
+@celery.task()
+def encode_ladders():
+    '''
+    Queue the encoding of the bitrate ladder of every segmented video that doesn't have it yet 
+    (eg. after a failed or interrupted encoding, which then resumes)
+
+    Returns: Number of videos queued
+    '''
+
+    ids = Video.find_ids_without(Video.hls_master, Video.hls_manifest.isnot(None))
+    for id in ids:
+        encode_ladder_of_video.delay(id)
+
+    return len(ids)
+
+
+@celery.task()
+def encode_ladder_of_video(video_id):
+    '''
+    Encode a video's bitrate ladder (see `media.LADDER`), and record its master playlist
+
+    Note: At most `LADDER_WORKERS` ffmpeg processes run at once, per task; This isn't a global limit, 
+    so with N Celery worker processes, up to N x `LADDER_WORKERS` encodes (of several cores each) can run at once
+
+    Params:
+        video_id (int)
+
+    Returns: Names of the encoded renditions, or None if there's nothing to do
+    '''
+
+    video = Video.query.get(video_id)
+    if video is None or video.hls_master is not None:
+        return None
+
+    video.hls_master, video.hls_ladder = encode_ladder(
+        video.path(current_app.config['VID_DIR']),
+        video.highlights_duration,
+        workers=current_app.config['LADDER_WORKERS']
+    )
+    video.save()
+
+    return video.hls_ladder
+
+
+@celery.task()
+def make_posters():
+    '''
+    Make the poster of every video that doesn't have one, in a pool of `POSTER_WORKERS` processes 
+    (so pages only ever link to poster files, and never decode videos)
+
+    Posters are recorded every `POSTER_BATCH_SIZE` videos, so an interrupted run keeps its progress
+
+    Returns: Number of posters made
+    '''
+
+    root = current_app.config['VID_DIR']
+    ids = Video.find_ids_without(Video.poster)
+
+    num_posters = 0
+    for start in range(0, len(ids), POSTER_BATCH_SIZE):
+        videos = {video.id: video for video in Video.query.filter(Video.id.in_(ids[start:start + POSTER_BATCH_SIZE]))}
+
+        posters = make_poster_batch(
+            [(video.id, video.path(root), video.highlights_duration) for video in videos.values()],
+            current_app.config['POSTER_DIR'],
+            workers=current_app.config['POSTER_WORKERS']
+        )
+
+        for id, key in posters.items():
+            videos[id].poster = key
+
+        db.session.commit()
+        num_posters += len(posters)
+
+    return num_posters
+
+
+@celery.task()
+def make_sprite_sheets():
+    '''
+    Queue the scrubbing previews of every video that doesn't have them yet (1 task per video)
+
+    Returns: Number of videos queued
+    '''
+
+    ids = Video.find_ids_without(Video.sprites)
+    for id in ids:
+        make_sprite_sheets_of_video.delay(id)
+
+    return len(ids)
+
+
+@celery.task()
+def make_sprite_sheets_of_video(video_id):
+    '''
+    Make a video's sprite sheets & WebVTT track (see `media.make_sprites`), and record the track
+
+    Params:
+        video_id (int)
+
+    Returns: Path of the track (relative to the video's folder), or None if there's nothing to do
+    '''
+
+    video = Video.query.get(video_id)
+    if video is None or video.sprites is not None:
+        return None
+
+    # None if its file has no frames
+    sprites = make_sprites(video.path(current_app.config['VID_DIR']))
+    if sprites is None:
+        return None
+
+    video.sprites = sprites
+    video.save()
+
+    return video.sprites
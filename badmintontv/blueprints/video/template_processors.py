@@ -1,3 +1,6 @@
+from flask import current_app
+
+
 country_mapping = {
     'JPN': 'Japan',
     'DEN': 'Denmark',
@@ -19,3 +22,13 @@ def format_country(country):
         return country_mapping[country]
     else:
         return country
+
+
+def poster_url(key, extension='jpg'):
+    '''
+    URL of a video's poster (see `media.make_poster`), in 1 of its formats
+
+    eg.
+        {{ match.poster | poster_url('webp') }} --> '/static/posters/3f/3fa4....webp'
+    '''
+    return '{}/{}.{}'.format(current_app.config['POSTER_URL'], key, extension)
@@ -1,14 +1,28 @@
 import os
 import json
+import base64
 import datetime
 
-from flask import Blueprint, request, current_app, render_template
-from flask_login import login_required
+from itertools import groupby
+from operator import attrgetter
+from flask import Blueprint, request, current_app, render_template, url_for, abort, g
+from werkzeug.security import safe_join
+from werkzeug.urls import url_encode
+from flask_login import login_required, current_user
 
+from libs.util_json import render_json
 from badmintontv.blueprints.billing.decorators import video_lock
 from badmintontv.blueprints.user.decorators import anonymous_required, role_required
-from badmintontv.blueprints.video.models import Video, Tournament, Team, Country, videos_teams
+from badmintontv.blueprints.video.models import Match, Tournament, Team, Country, Player, RelatedVideos
+from badmintontv.blueprints.video.catalog import catalog_cache, match_cache
+from badmintontv.blueprints.video.decorators import conditional_get, video_url_lock
+from badmintontv.blueprints.video.facets import FACETS, facet_index_cache
+from badmintontv.blueprints.video.autocomplete import autocomplete_index_cache
+from badmintontv.blueprints.video.streaming import send_video, send_playlist, send_thumbnail_track, HLS_MIMETYPES, SPRITE_MIMETYPES
+from badmintontv.blueprints.video.signing import signed_video_url, video_url_window_start
+from badmintontv.blueprints.video.media import hls_folder
 from badmintontv.blueprints.video.template_processors import format_country
+from badmintontv.extensions import page_cache
 
 video = Blueprint(
     'video', 
@@ -24,6 +38,7 @@ video = Blueprint(
 
 # [Matches] Latest tournament 
 @video.route('/latest_tournament', methods=['GET'])
+@conditional_get
 def latest_tournament():
     '''
     Retrieves all matches from the latest tournament
@@ -31,33 +46,42 @@ def latest_tournament():
     Order: Newest-to-Oldest
     '''
 
-    tournament = Tournament.find_latest()
+    catalog = catalog_cache.get()
     
-    # Safety check 
-    if tournament:
+    # Memoized per day, so this is usually free 
+    tournament = catalog.find_latest_tournament()
     
-        # Get all videos that include this team 
-        videos_queried = Video.query.join(Tournament).filter(
-            Tournament.name == tournament.name
-        )
+    def get_context():
         
-        tournaments_to_videos = _sort_videos_by_tournament(videos_queried)
-    
-    else:
-        tournaments_to_videos = []
+        # Safety check 
+        if not tournament:
+            return {'tournaments_to_matches': {}}
+        
+        # Get all matches from this tournament 
+        matches_queried = catalog.find_matches(catalog.matches_by_tournament, tournament.id)
+        
+        return {'tournaments_to_matches': _group_matches_by_tournament(matches_queried)}
         
     return render_template(
         'matches.html',
         title='Latest Tournament',
-        query='_',
-        tournaments_to_videos=tournaments_to_videos,
-        back_route='_',
-        from_route='video.latest_tournament'
+        body=_render_fragment(
+            '_matches.html',
+            get_context=get_context,
+            
+            # The latest tournament can change overnight, without the catalog changing
+            key_parts=(tournament.id if tournament else None,),
+            title='Latest Tournament',
+            query='_',
+            back_route='_',
+            from_route='video.latest_tournament'
+        )
     )
 
 
 # [Tournaments] All tournaments 
 @video.route('/tournaments', methods=['GET'])
+@conditional_get
 def tournaments():
     '''
     Retrieves all tournament years
@@ -65,30 +89,32 @@ def tournaments():
     Order: Newest-to-Oldest
     '''
     
-    query = Tournament.query.with_entities(Tournament.start_date).distinct()
-    start_dates = [row.start_date for row in query.all()]
-    years = sorted(list(set([start_date.year for start_date in start_dates])), reverse=True)
-    
     return render_template(
         'tournaments.html',
-        years=years
+        body=_render_fragment(
+            '_tournaments.html',
+            years=catalog_cache.get().years
+        )
     )    
     
 
 # [Teams] All teams
 @video.route('/teams', methods=['GET'])
+@conditional_get
 def teams():
     '''
-    Retrieves all teams
+    Retrieves all teams starting with `?letter=` (defaults to the first letter), 
+    with their match stats
     
     Order: Alphabetical
     '''
 
-    teams = Team.query.order_by(Team.name.asc())
-    
     return render_template(
         'teams.html',
-        teams=teams,
+        body=_render_fragment(
+            '_teams.html',
+            get_context=lambda: _directory_context(Team, request.args.get('letter'))
+        )
     )
     
 
@@ -96,19 +122,21 @@ def teams():
 
 # [Country] All countries
 @video.route('/countries', methods=['GET'])
+@conditional_get
 def countries():
     '''
-    Retrieves all countries
+    Retrieves all countries starting with `?letter=` (defaults to the first letter), 
+    with their match stats
     
     Order: Alphabetical
     '''
     
-    countries = Country.query.order_by(Country.name.asc())
-    # countries = ['home','india','pakistan']
-    print(countries)
     return render_template(
         'countries.html',
-        countries=countries,
+        body=_render_fragment(
+            '_countries.html',
+            get_context=lambda: _directory_context(Country, request.args.get('letter'))
+        )
     )
 
 
@@ -119,6 +147,7 @@ def countries():
 # [Matches] Any tournament 
 @video.route('/tournament_to_matches', defaults={'query': '2022'})
 @video.route('/tournament_to_matches/<string:query>', methods=['GET'])
+@conditional_get
 def tournament_to_matches(query):
     '''
     Retrieves all matches from a tournament year, grouped by tournament
@@ -126,31 +155,36 @@ def tournament_to_matches(query):
     Order: Newest-to-Oldest
     '''
     
-    lower_bound = '{}-12-31'.format(int(query)-1)
-    upper_bound = '{}-01-01'.format(int(query)+1)
+    try:
+        year = int(query)
+    except ValueError:
+        abort(404)
     
-    # Get all videos where the tournament is in year `query`
-    videos_queried = Video.query.join(Tournament).filter(
-        lower_bound <= Tournament.start_date
-    ).filter(
-        Tournament.start_date <= upper_bound
-    )
+    catalog = catalog_cache.get()
     
-    tournaments_to_videos = _sort_videos_by_tournament(videos_queried)
+    # Get all matches where the tournament is in year `query`
+    matches_queried = catalog.find_matches(catalog.matches_by_year, year)
+    
+    tournaments_to_matches = _group_matches_by_tournament(matches_queried)
         
     return render_template(
         'matches.html',
         title=query,
-        query=query,
-        tournaments_to_videos=tournaments_to_videos,
-        back_route='video.tournaments',
-        from_route='video.tournament_to_matches'
+        body=_render_fragment(
+            '_matches.html',
+            title=query,
+            query=query,
+            tournaments_to_matches=tournaments_to_matches,
+            back_route='video.tournaments',
+            from_route='video.tournament_to_matches'
+        )
     )
     
 
 # [Matches] Any team 
 @video.route('/team_to_matches', defaults={'query': 'Kento Momota'})
 @video.route('/team_to_matches/<string:query>', methods=['GET'])
+@conditional_get
 def team_to_matches(query):
     '''
     Retrieves all matches for a team, grouped by tournament
@@ -158,30 +192,67 @@ def team_to_matches(query):
     Order: Newest-to-Oldest
     '''
     
-    # Get all videos that include this team 
-    videos_queried = Video.query.join(videos_teams).join(Team).filter(
-        Team.name == query
-    )
+    catalog = catalog_cache.get()
+    
+    # Get all matches that include this team 
+    matches_queried = catalog.find_matches(catalog.matches_by_team, query)
     
-    tournaments_to_videos = _sort_videos_by_tournament(videos_queried)
+    tournaments_to_matches = _group_matches_by_tournament(matches_queried)
     
     # Edit tile to include country 
-    team = Team.find_by_name(query)
-    title = '{} ({})'.format(query, team.country.name)
+    team = catalog.teams_by_name.get(query)
+    title = '{} ({})'.format(query, team.country.name) if team and team.country else query
     
     return render_template(
         'matches.html',
         title=title,
-        query=query,
-        tournaments_to_videos=tournaments_to_videos,
-        back_route='video.teams',
-        from_route='video.team_to_matches'
+        body=_render_fragment(
+            '_matches.html',
+            title=title,
+            query=query,
+            tournaments_to_matches=tournaments_to_matches,
+            back_route='video.teams',
+            from_route='video.team_to_matches'
+        )
+    )
+    
+
+# [Matches] Any player 
+@video.route('/player_to_matches', defaults={'query': 'Kento Momota'})
+@video.route('/player_to_matches/<string:query>', methods=['GET'])
+@conditional_get
+def player_to_matches(query):
+    '''
+    Retrieves all matches of a player (singles, and doubles with every partner), grouped by tournament
+    
+    Order: Newest-to-Oldest
+    '''
+    
+    catalog = catalog_cache.get()
+    
+    # Get all matches of every team this player is in, in a single lookup 
+    matches_queried = catalog.find_matches(catalog.matches_by_player, query)
+    
+    tournaments_to_matches = _group_matches_by_tournament(matches_queried)
+    
+    return render_template(
+        'matches.html',
+        title=query,
+        body=_render_fragment(
+            '_matches.html',
+            title=query,
+            query=query,
+            tournaments_to_matches=tournaments_to_matches,
+            back_route='video.teams',
+            from_route='video.player_to_matches'
+        )
     )
     
 
 # [Matches] Any country 
 @video.route('/country_to_matches', defaults={'query': 'JPN'})
 @video.route('/country_to_matches/<string:query>', methods=['GET'])
+@conditional_get
 def country_to_matches(query):
     '''
     Retrieves all matches for a country, grouped by tournament
@@ -189,49 +260,166 @@ def country_to_matches(query):
     Order: Newest-to-Oldest
     '''
     
-    # Get all videos that include this team 
-    videos_queried = Video.query.join(videos_teams).join(Team).join(Country).filter(
-        Country.name == query
-    )
+    catalog = catalog_cache.get()
+    
+    # Get all matches that include a team from this country 
+    matches_queried = catalog.find_matches(catalog.matches_by_country, query)
     
-    tournaments_to_videos = _sort_videos_by_tournament(videos_queried)
+    tournaments_to_matches = _group_matches_by_tournament(matches_queried)
     
     return render_template(
         'matches.html',
         title=format_country(query),
-        query=query,
-        tournaments_to_videos=tournaments_to_videos,
-        back_route='video.countries',
-        from_route='video.country_to_matches'
+        body=_render_fragment(
+            '_matches.html',
+            title=format_country(query),
+            query=query,
+            tournaments_to_matches=tournaments_to_matches,
+            back_route='video.countries',
+            from_route='video.country_to_matches'
+        )
     )
     
 
-def _sort_videos_by_tournament(videos_queried):
+# Separates the 2 teams of a `head_to_head` query 
+HEAD_TO_HEAD_SEPARATOR = ' vs '
+
+
+# [Matches] Head-to-head 
+@video.route('/head_to_head/<string:query>', methods=['GET'])
+@conditional_get
+def head_to_head(query):
+    '''
+    Retrieves all matches between 2 teams (`query` is 'Team A vs Team B'), grouped by tournament
+    
+    Order: Newest-to-Oldest
+    '''
+    
+    try:
+        team_a, team_b = query.split(HEAD_TO_HEAD_SEPARATOR)
+    except ValueError:
+        abort(404)
+    
+    catalog = catalog_cache.get()
+    
+    # Get all matches with both teams, in a single lookup 
+    matches_queried = catalog.find_matches(catalog.matches_by_pair, catalog.pair_key(team_a, team_b))
+    
+    tournaments_to_matches = _group_matches_by_tournament(matches_queried)
+    
+    return render_template(
+        'matches.html',
+        title=query,
+        body=_render_fragment(
+            '_matches.html',
+            title=query,
+            query=query,
+            tournaments_to_matches=tournaments_to_matches,
+            back_route='video.teams',
+            from_route='video.head_to_head'
+        )
+    )
+
+
+def _group_matches_by_tournament(matches_queried):
     '''
-    Helper function to group videos (sorted by date from newest-to-oldest) by their corresponding tournament
+    Helper function to group matches by their corresponding tournament, in a single pass
+    
+    `matches_queried` must already be ordered by tournament, then by date (see `Match.find_for_browse`), 
+    so each tournament's matches are consecutive and can be streamed into their group
     
     Params:
-        videos_queried (...): Queried result from `Video` model
+        matches_queried (...): Queried result from `Match.find_for_browse`, or matches from the `Catalog`
         
     Returns:
-        tournaments_to_videos (dict): Mapping a `Tournament` to sorted lists of `Video`s, 
+        tournaments_to_matches (dict): Mapping a `Tournament` to sorted lists of `Match`es, 
+    '''
+    
+    tournaments_to_matches = {}
+    for tournament, matches_grouped in groupby(matches_queried, key=attrgetter('tournament')):
+        tournaments_to_matches[tournament] = list(matches_grouped)
+    
+    return tournaments_to_matches
+
+
+def _directory_context(model, letter=None):
+    '''
+    Template variables for 1 letter of the `Team` or `Country` directory
+    
+    Only the selected letter is loaded; The other letters are loaded when they're clicked
+    
+    Params:
+        model (SQLAlchemy model):   `Team` or `Country`
+        letter (str):               Selected letter; Defaults to the first letter
+    
+    Returns: dict
     '''
     
-    # Unique list of all tournaments from `videos`, sorted from newest-to-oldest
-    tournaments = [video.tournament for video in videos_queried]
-    tournaments = sorted(list(set(tournaments)), key=lambda x: x.start_date, reverse=True)
+    letters = model.initials()
+    
+    letter = letter.upper() if letter else None
+    if letter not in letters:
+        letter = letters[0] if letters else None
+    
+    return {
+        'letters': letters,
+        'letter': letter,
+        'entries': model.directory(letter) if letter else []
+    }
+
 
-    tournaments_to_videos = {}
-    for tournament in tournaments:
+def _render_fragment(template_name, get_context=None, key_parts=(), **context):
+    '''
+    Render the catalog part of a page, using `page_cache`
+    
+    Fragments only depend on the route, the locale and the catalog (never on the current user), 
+    so the same entry is shared by every user until the catalog changes
+    
+    Params:
+        template_name (str):       Fragment template
+        get_context (function):    Returns extra template variables; Only called on a cache miss
+        key_parts (tuple):         Anything else the fragment depends on
+        **context:                 Template variables
         
-        # Unique list of all videos from `videos`, if it belongs to this tournament, sorted from newest-to-oldest
-        videos_filtered = [video for video in videos_queried if video.tournament.name == tournament.name]
-        videos_sorted = sorted(videos_filtered, key=lambda x: x.date, reverse=True)
+    Returns: Markup
+    '''
+    
+    def render():
+        if get_context is not None:
+            context.update(get_context())
         
-        # Save it 
-        tournaments_to_videos[tournament] = videos_sorted
+        return render_template(template_name, **context)
+    
+    return page_cache.cached(render, catalog_cache.get().version, *key_parts)
+
+
+# Number of matches per search page 
+SEARCH_PAGE_SIZE = 25
+
+
+# [Matches] Full-text search 
+@video.route('/search', defaults={'page': 1})
+@video.route('/search/page/<int:page>', methods=['GET'])
+@conditional_get
+def search(page):
+    '''
+    Searches matches by tournament, team, round, discipline, folder or name (`?query=`)
+    
+    Order: Best match first, then newest-to-oldest
+    '''
+    
+    query = request.args.get('query', '').strip()
+    
+    matches_queried = Match.search_ranked(query)
+    
+    # `False`: Out-of-range pages are empty, rather than a 404
+    matches = matches_queried.paginate(page, SEARCH_PAGE_SIZE, False) if matches_queried is not None else None
     
-    return tournaments_to_videos
+    return render_template(
+        'search.html',
+        query=query,
+        matches=matches
+    )
 
 
 # -------------------------------------------
@@ -247,22 +435,442 @@ def _sort_videos_by_tournament(videos_queried):
 })
 @video.route('/match/<int:id>/<string:highlights_type>/<string:from_route>/<string:query>', methods=['GET'])
 @video_lock
+@conditional_get(since=video_url_window_start, match_page=True)
 def match(id, highlights_type, from_route, query):
     '''Retrieves a single match, given it's `id`, and `highlights_type`'''
     
-    video = Video.find_by_id_highlights_type(id, highlights_type)
-    
-    video_path = os.path.join(
-        current_app.config['VID_DIR'],
-        video.folder,
-        video.name,
-        '[{}] {}'.format(video.highlights_type, video.filename)
-    )
+    # Video, match, tournament, teams, countries & other highlights types are loaded in 1 query, then cached 
+    video = match_cache.get(id, highlights_type)
+    if video is None:
+        abort(404)
     
     return render_template(
         'match.html',
         video=video,
-        video_path=video_path,
+        video_url=signed_video_url(id, highlights_type, current_user.id),
+        hls_url=_hls_url(video),
+        sprites_url=_sprites_url(video),
+        up_next=_up_next(video.id),
         back_route=from_route,
         query=query
     )
+
+
+# Video file (played by the match page) 
+@video.route('/stream/<int:id>/<string:highlights_type>', methods=['GET'])
+@video_url_lock
+def stream(id, highlights_type):
+    '''
+    Streams the file of a match's video, with `Range` requests (so the player can seek)
+    
+    The match page links here with a signed URL, checked without the session or a query, and the 
+    video comes from `match_cache`, so the many range requests of 1 playback usually cost no query. 
+    The bytes are then sent by Flask or by the front server (see `VIDEO_DELIVERY`)
+    
+    Note: A signed file may be kept by shared caches until its URL expires
+    '''
+    
+    video = match_cache.get(id, highlights_type)
+    if video is None:
+        abort(404)
+    
+    return send_video(video.path(current_app.config['VID_DIR']), max_age=g.get('video_url_seconds_left'))
+
+
+# HLS playlist & segments of a video (played by the match page, once it's segmented) 
+@video.route('/hls/<int:id>/<string:highlights_type>/<path:filename>', methods=['GET'])
+@video_url_lock
+def hls(id, highlights_type, filename):
+    '''
+    Sends a file of a video's HLS folder (see `media.segment_hls`), locked like `stream`
+    
+    The playlist is re-written so its segments carry the same signature
+    '''
+    
+    video = match_cache.get(id, highlights_type)
+    if video is None or video.hls_manifest is None:
+        abort(404)
+    
+    path = video.path(current_app.config['VID_DIR'])
+    folder = os.path.join(os.path.dirname(path), hls_folder(os.path.basename(path)))
+    
+    path = safe_join(folder, filename)
+    mimetype = HLS_MIMETYPES.get(os.path.splitext(filename)[1])
+    if path is None or mimetype is None:
+        abort(404)
+    
+    max_age = g.get('video_url_seconds_left')
+    
+    if filename.endswith('.m3u8'):
+        return send_playlist(path, _url_signature(), max_age=max_age)
+    
+    return send_video(path, mimetype=mimetype, max_age=max_age)
+
+
+# Scrubbing previews of a video (played by the match page, once they're made) 
+@video.route('/sprites/<int:id>/<string:highlights_type>/<string:filename>', methods=['GET'])
+@video_url_lock
+def sprites(id, highlights_type, filename):
+    '''
+    Sends the WebVTT thumbnail track, or a sprite sheet, of a video (see `media.make_sprites`), locked like `stream`
+    
+    The track is re-written so its sprite sheets carry the same signature
+    '''
+    
+    video = match_cache.get(id, highlights_type)
+    if video is None or video.sprites is None:
+        abort(404)
+    
+    folder = os.path.dirname(video.derived_path(current_app.config['VID_DIR'], video.sprites))
+    
+    path = safe_join(folder, filename)
+    mimetype = SPRITE_MIMETYPES.get(os.path.splitext(filename)[1])
+    if path is None or mimetype is None:
+        abort(404)
+    
+    max_age = g.get('video_url_seconds_left')
+    
+    if filename.endswith('.vtt'):
+        return send_thumbnail_track(path, _url_signature(), max_age=max_age)
+    
+    return send_video(path, mimetype=mimetype, max_age=max_age)
+
+
+def _url_signature():
+    '''Query string of the request's URL signature (see `signing.py`), to pass it on to relative URLs'''
+    
+    return url_encode({key: request.args[key] for key in ('user', 'expires', 'signature') if key in request.args})
+
+
+def _hls_url(video):
+    '''
+    Signed URL of a video's HLS master playlist (or of its 1st playlist, until its ladder is encoded), 
+    or None if it isn't segmented yet
+    '''
+    
+    playlist = video.hls_master or video.hls_manifest
+    if playlist is None:
+        return None
+    
+    # Path within the HLS folder
+    _, filename = playlist.split('/', 1)
+    
+    return signed_video_url(
+        video.id, 
+        video.highlights_type, 
+        current_user.id, 
+        'video.hls', 
+        filename=filename
+    )
+
+
+def _sprites_url(video):
+    '''Signed URL of a video's thumbnail track, or None if its scrubbing previews aren't made yet'''
+    
+    if video.sprites is None:
+        return None
+    
+    return signed_video_url(
+        video.id, 
+        video.highlights_type, 
+        current_user.id, 
+        'video.sprites', 
+        filename=os.path.basename(video.sprites)
+    )
+
+
+def _up_next(video_id):
+    '''
+    "Up next" panel of a match page: 1 lookup of its precomputed `RelatedVideos`, 
+    whose IDs are then read from the catalog
+    
+    Params:
+        video_id (int)
+    
+    Returns: List of `(title, renditions)`, without empty lists
+    '''
+    
+    related = RelatedVideos.find_by_video_id(video_id)
+    if related is None:
+        return []
+    
+    catalog = catalog_cache.get()
+    
+    up_next = [
+        ('Next round', catalog.find_renditions_by_id(related.next_round_ids)),
+        ('Same players', catalog.find_renditions_by_id(related.same_teams_ids)),
+        ('Fans also watched', catalog.find_renditions_by_id(related.co_viewed_ids))
+    ]
+    
+    return [(title, renditions) for title, renditions in up_next if renditions]
+
+
+# -------------------------------------------
+# ------------------- API -------------------
+# -------------------------------------------
+
+# Number of matches per page
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+
+# [Matches] Paginated JSON 
+@video.route('/api/matches', methods=['GET'])
+@conditional_get
+def api_matches():
+    '''
+    Retrieves 1 page of matches as JSON, grouped by tournament
+    
+    Used to load the match pages progressively (eg. infinite scroll) instead of rendering all 
+    matches at once. Send back the `next` cursor as `?cursor=...` to get the following page
+    
+    Filters (all optional, combined with AND):
+        year (int):       Tournament year
+        country (str):    Country name
+        team (str):       Team name
+        player (str):     Player name
+    
+    Order: Newest-to-Oldest
+    
+    Note: A tournament can be split across 2 pages, so clients should merge tournaments by `id`
+    '''
+    
+    year = request.args.get('year', type=int)
+    country = request.args.get('country')
+    team = request.args.get('team')
+    player = request.args.get('player')
+    limit = max(1, min(request.args.get('limit', API_PAGE_SIZE, type=int), API_MAX_PAGE_SIZE))
+    
+    # Decode the cursor 
+    try:
+        after = _decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return render_json(400, {'error': 'Invalid cursor.'})
+    
+    # `Tournament.in_years` builds dates, which only go from year 1 to 9999 
+    if year is not None and not datetime.MINYEAR <= year < datetime.MAXYEAR:
+        return render_json(400, {'error': 'Invalid year.'})
+    
+    # Filters, and which page to link matches back to 
+    criteria = []
+    from_route, query = '_', '_'
+    
+    if team:
+        criteria.append(Match.teams.any(Team.name == team))
+        from_route, query = 'video.team_to_matches', team
+    
+    if player:
+        criteria.append(Match.teams.any(Team.players.any(Player.name == player)))
+        from_route, query = 'video.player_to_matches', player
+    
+    if country:
+        criteria.append(Match.teams.any(Team.country.has(Country.name == country)))
+        from_route, query = 'video.country_to_matches', country
+    
+    if year:
+        criteria.append(Tournament.in_years(year))
+        from_route, query = 'video.tournament_to_matches', year
+    
+    matches = Match.find_page_for_browse(criteria, after=after, limit=limit)
+    
+    # Only point to a next page if this one is full 
+    next_cursor = _encode_cursor(matches[-1]) if len(matches) == limit else None
+    
+    return render_json(200, {
+        'tournaments': _serialize_tournaments(matches, from_route, query),
+        'next': next_cursor
+    })
+
+
+# [Matches] Faceted search 
+@video.route('/api/facets', methods=['GET'])
+@conditional_get
+def api_facets():
+    '''
+    Retrieves 1 page of matches filtered on any facets, with the counts of every facet value
+    
+    Filters (all optional, combined with AND): 
+        year (int), tournament (int, ID), country, team, discipline, round, highlights_type
+    
+    Order: Newest-to-Oldest
+    '''
+    
+    # Selected facets 
+    filters = {}
+    for facet in FACETS:
+        value = request.args.get(facet)
+        
+        if value:
+            filters[facet] = value
+    
+    try:
+        for facet in ('year', 'tournament'):
+            if facet in filters:
+                filters[facet] = int(filters[facet])
+    except ValueError:
+        return render_json(400, {'error': 'Invalid {}.'.format(facet)})
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    limit = max(1, min(request.args.get('limit', API_PAGE_SIZE, type=int), API_MAX_PAGE_SIZE))
+    
+    facet_index = facet_index_cache.get()
+    matches, total, counts = facet_index.search(
+        filters, 
+        offset=(page - 1) * limit, 
+        limit=limit
+    )
+    
+    # Tournament facet values are IDs, so label them with their names 
+    tournament_names = {tournament.id: tournament.name for tournament in facet_index.catalog.tournaments}
+    
+    return render_json(200, {
+        'total': total,
+        'page': page,
+        'tournaments': _serialize_tournaments(matches),
+        'facets': {
+            facet: [{
+                'value': value,
+                'label': tournament_names.get(value) if facet == 'tournament' else value,
+                'count': count
+            } for value, count in counts[facet].most_common()]
+            for facet in FACETS
+        }
+    })
+
+
+# Page that each kind of suggestion links to 
+AUTOCOMPLETE_ROUTES = {
+    'team': 'video.team_to_matches',
+    'player': 'video.player_to_matches',
+    'tournament': 'video.tournament_to_matches'
+}
+
+
+# [Search] Type-ahead suggestions 
+@video.route('/api/autocomplete', methods=['GET'])
+@conditional_get
+def api_autocomplete():
+    '''
+    Suggests team, player and tournament names starting with `?q=` (after 2 characters)
+    
+    Served from the in-memory `AutocompleteIndex`, so typing never queries the DB
+    '''
+    
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    
+    suggestions = autocomplete_index_cache.get().suggest(request.args.get('q', ''), limit=limit)
+    
+    return render_json(200, {
+        'suggestions': [{
+            'kind': suggestion.kind,
+            'name': suggestion.name,
+            'country': suggestion.country,
+            'url': url_for(
+                AUTOCOMPLETE_ROUTES[suggestion.kind], 
+                query=suggestion.query
+            )
+        } for suggestion in suggestions]
+    })
+
+
+def _encode_cursor(match):
+    '''
+    Encode the browse-order key of `match` into an opaque, URL-safe cursor
+    
+    eg.
+        (2022-08-30, 2, 2022-09-01, 17) --> 'MjAyMjA4MzAuMi4yMDIyMDkwMS4xNw'
+    
+    Returns: str
+    '''
+    
+    key = '{:%Y%m%d}.{}.{:%Y%m%d}.{}'.format(
+        match.tournament.start_date, 
+        match.tournament.id, 
+        match.date, 
+        match.id
+    )
+    
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    '''
+    Decode a cursor made by `_encode_cursor`
+    
+    Raises: ValueError if the cursor was tampered with
+    
+    Returns: 
+        key (tuple): `(tournament start_date, tournament id, match date, match id)`, or None if there's no cursor
+    '''
+    
+    if not cursor:
+        return None
+    
+    try:
+        key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        start_date, tournament_id, date, match_id = key.split('.')
+        
+        return (
+            datetime.datetime.strptime(start_date, '%Y%m%d').date(),
+            int(tournament_id),
+            datetime.datetime.strptime(date, '%Y%m%d').date(),
+            int(match_id)
+        )
+    
+    except (TypeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError(e)
+
+
+def _serialize_tournaments(matches, from_route='_', query='_'):
+    '''
+    Compact JSON form of matches, grouped by tournament
+    
+    eg.
+        [{
+            'id': 2, 'name': 'Japan Open', 'start_date': '2022-08-30', 'end_date': '2022-09-04',
+            'matches': [{
+                'id': 9, 'round': 'QF', 'discipline': 'MS', 'date': '2022-09-01',
+                'teams': [['Kento Momota', 'JPN'], ['Viktor Axelsen', 'DEN']],
+                'videos': [{
+                    'id': 17, 'highlights_type': 'Highlights', 
+                    'url': '/match/17/Highlights/video.tournament_to_matches/2022'
+                }]
+            }]
+        }]
+    
+    Params:
+        matches (list):     Matches in browse order
+        from_route (str):   Route that the match page links back to
+        query (str):        Query of `from_route`
+    
+    Returns: list
+    '''
+    
+    tournaments = []
+    for tournament, matches_grouped in _group_matches_by_tournament(matches).items():
+        tournaments.append({
+            'id': tournament.id,
+            'name': tournament.name,
+            'start_date': tournament.start_date.isoformat(),
+            'end_date': tournament.end_date.isoformat(),
+            'matches': [{
+                'id': match.id,
+                'round': match.round,
+                'discipline': match.discipline,
+                'date': match.date.isoformat(),
+                'teams': [[team.name, team.country.name if team.country else None] for team in match.teams],
+                'videos': [{
+                    'id': rendition.id,
+                    'highlights_type': rendition.highlights_type,
+                    'url': url_for(
+                        'video.match', 
+                        id=rendition.id, 
+                        highlights_type=rendition.highlights_type, 
+                        from_route=from_route, 
+                        query=query
+                    )
+                } for rendition in match.renditions]
+            } for match in matches_grouped]
+        })
+    
+    return tournaments
@@ -1,8 +1,13 @@
-from sqlalchemy import or_
+from sqlalchemy import or_, func, select, cast, literal_column
+from sqlalchemy.ext.hybrid import hybrid_property
 
 from libs.util_sqlalchemy import ResourceMixin, AwareDateTime
+from libs.util_datetime import seconds_to_time
 from badmintontv.extensions import db
 
+# What `View.watch_time` can group views by
+WATCH_TIME_GROUPS = ('video', 'team', 'tournament', 'country')
+
 
 class View(ResourceMixin, db.Model):
     
@@ -12,7 +17,9 @@ class View(ResourceMixin, db.Model):
     
     ip = db.Column(db.String(50), nullable=False)
     country = db.Column(db.String(50))
-    duration = db.Column(db.Time, nullable=False)
+    
+    # Watch time, in seconds
+    duration = db.Column(db.Integer, nullable=False)
     
     # [View] One (View) to One (User)
     user_id = db.Column(
@@ -40,6 +47,15 @@ class View(ResourceMixin, db.Model):
     )
     video = db.relationship('Video')  # Bi-directional
 
+    @hybrid_property
+    def duration_hms(self):
+        '''Watch time as a `datetime.time` (eg. 00:05:03), for display'''
+        return seconds_to_time(self.duration)
+    
+    @duration_hms.expression
+    def duration_hms(cls):
+        return cls.duration * literal_column("interval '1 second'")
+
     @classmethod
     def find_by_id(cls, id):
         return cls.query.filter_by(id=id).first()
@@ -66,12 +82,97 @@ class View(ResourceMixin, db.Model):
         search_query = '%{}%'.format(query)
         
         from badmintontv.blueprints.user.models import User
-        from badmintontv.blueprints.video.models import Video
+        from badmintontv.blueprints.video.models import Video, Match
         
         search_chain = (
             User.username.ilike(search_query),
-            Video.name.ilike(search_query),
+            Video.match.has(Match.name.ilike(search_query)),
             View.country.ilike(search_query)
         )
 
         return or_(*search_chain)
+
+    @classmethod
+    def watch_time(cls, by, limit=None):
+        '''
+        Number of views, total and average watch time, per `by`, in a single grouped query
+        
+        eg.
+            View.watch_time('tournament', limit=10)
+        
+        Params:
+            by (str):      One of `WATCH_TIME_GROUPS`:
+                           - 'video':        Per video (ie. per highlights type of a match)
+                           - 'team':         Per team; A view counts for both teams of its match
+                           - 'tournament':   Per tournament
+                           - 'country':      Per country of the teams; A view counts once per country (eg. JPN vs JPN)
+            limit (int):   Max number of rows
+        
+        Order: Most watched first
+        
+        Returns: List of rows `(id, name, num_views, total_seconds, average_seconds)`
+        '''
+        
+        from badmintontv.blueprints.video.models import Video, Match, Tournament, Team, Country, matches_teams
+        
+        # Every group goes through the viewed video 
+        joins = [(Video, cls.video_id == Video.id)]
+        
+        if by == 'video':
+            name = Match.name + ' (' + Video.highlights_type + ')'
+            joins.append((Match, Video.match_id == Match.id))
+            group = (Video.id, Match.name, Video.highlights_type)
+        
+        elif by == 'tournament':
+            name = Tournament.name
+            joins.append((Match, Video.match_id == Match.id))
+            joins.append((Tournament, Match.tournament_id == Tournament.id))
+            group = (Tournament.id, Tournament.name)
+        
+        elif by == 'team':
+            name = Team.name
+            joins.append((matches_teams, matches_teams.c.match_id == Video.match_id))
+            joins.append((Team, matches_teams.c.team_id == Team.id))
+            group = (Team.id, Team.name)
+        
+        elif by == 'country':
+            
+            # Countries of each match, without duplicates 
+            match_countries = select(
+                    matches_teams.c.match_id, Team.country_id
+                ).join(
+                    Team, matches_teams.c.team_id == Team.id
+                ).distinct().subquery()
+            
+            name = Country.name
+            joins.append((match_countries, match_countries.c.match_id == Video.match_id))
+            joins.append((Country, match_countries.c.country_id == Country.id))
+            group = (Country.id, Country.name)
+        
+        else:
+            raise ValueError('Unknown watch time group: {}'.format(by))
+        
+        total = func.sum(cls.duration)
+        
+        query = db.session.query(
+                group[0].label('id'),
+                name.label('name'),
+                func.count(cls.id).label('num_views'),
+                total.label('total_seconds'),
+                cast(func.round(func.avg(cls.duration)), db.Integer).label('average_seconds')
+            )
+        
+        for target, onclause in joins:
+            query = query.join(target, onclause)
+        
+        query = query.group_by(
+                *group
+            ).order_by(
+                total.desc(), 
+                group[0]
+            )
+        
+        if limit:
+            query = query.limit(limit)
+        
+        return query.all()
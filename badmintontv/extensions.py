@@ -4,9 +4,12 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_babel import Babel
 
+from libs.util_cache import PageCache
+
 
 debug_toolbar = DebugToolbarExtension()
 csrf = CSRFProtect()
 db = SQLAlchemy()
 login_manager = LoginManager()
 babel = Babel()
+page_cache = PageCache()
@@ -0,0 +1,18 @@
+import datetime
+
+from badmintontv.blueprints.admin.template_processors import hms_to_s, s_to_hms
+
+
+class TestTemplateProcessors(object):
+    def test_hms_to_s(self):
+        ''' Times, 'H:MM:SS' strings and seconds all become seconds '''
+        assert hms_to_s(datetime.time(0, 5, 3)) == 303
+        assert hms_to_s('01:00:03') == 3603
+        assert hms_to_s(303) == 303
+        assert hms_to_s(303.6) == 303
+
+    def test_s_to_hms(self):
+        ''' Seconds are shown as 'HH:MM:SS', with hours going past 24 '''
+        assert s_to_hms(303) == '00:05:03'
+        assert s_to_hms(90000) == '25:00:00'
+        assert s_to_hms(None) is None
@@ -0,0 +1,130 @@
+import pytest
+
+from sqlalchemy import event
+
+from config import settings
+from badmintontv.app import create_app
+from badmintontv.extensions import db as _db
+from badmintontv.blueprints.user.models import User
+
+
+@pytest.fixture(scope='session')
+def app():
+    '''
+    Setup our flask test app; This only gets executed once (per test session)
+
+    Note: Uses the test database made by `badmintontv db init --with-testdb`
+
+    Returns: Flask app
+    '''
+    db_uri = '{}_test'.format(settings.SQLALCHEMY_DATABASE_URI)
+
+    params = {
+        'DEBUG': False,
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'SQLALCHEMY_DATABASE_URI': db_uri,
+        'CATALOG_VERSION_CHECK_INTERVAL': 0,
+        'PAGE_CACHE_TYPE': 'simple'
+    }
+
+    _app = create_app(settings_override=params)
+
+    # Establish an application context before running the tests
+    ctx = _app.app_context()
+    ctx.push()
+
+    yield _app
+
+    ctx.pop()
+
+
+@pytest.fixture(scope='function')
+def client(app):
+    '''
+    Setup an app client; This gets executed for each test function
+
+    Params:
+        app: Pytest fixture
+
+    Returns: Flask app client
+    '''
+    yield app.test_client()
+
+
+@pytest.fixture(scope='session')
+def db(app):
+    '''
+    Setup our database; This only gets executed once (per test session)
+
+    Params:
+        app: Pytest fixture
+
+    Returns: SQLAlchemy database session
+    '''
+    _db.drop_all()
+    _db.create_all()
+
+    # Create a single user, because a lot of tests do not mutate this user
+    params = {
+        'role': 'admin',
+        'username': 'admin',
+        'email': 'admin@local.host',
+        'password': 'password',
+        'confirmed': True
+    }
+
+    admin = User(**params)
+
+    _db.session.add(admin)
+    _db.session.commit()
+
+    return _db
+
+
+@pytest.fixture(scope='function')
+def session(db):
+    '''
+    Allow very fast tests by using rollbacks and nested sessions
+
+    This does require that your database supports SQL savepoints (Postgres does)
+
+    Note: Every commit (eg. logging in) only releases the savepoint, and a new one is started, 
+    so everything the test does is rolled back
+
+    Params:
+        db: Pytest fixture
+
+    Returns: None
+    '''
+    def restart_savepoint(session, transaction):
+        if transaction.nested and not transaction.parent.nested:
+            session.begin_nested()
+
+    db.session.begin_nested()
+    event.listen(db.session, 'after_transaction_end', restart_savepoint)
+
+    yield db.session
+
+    # Roll back the whole transaction, not just the last savepoint
+    event.remove(db.session, 'after_transaction_end', restart_savepoint)
+    db.session.remove()
+
+
+@pytest.fixture(scope='function')
+def queries(db):
+    '''
+    Record the SQL statements run during a test
+
+    Returns: List of statements, filled as they run
+    '''
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+
+    yield statements
+
+    event.remove(db.engine, 'before_cursor_execute', record)
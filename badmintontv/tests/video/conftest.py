@@ -0,0 +1,122 @@
+import datetime
+
+import pytest
+
+from libs.util_datetime import tzware_datetime
+from badmintontv.extensions import page_cache
+from badmintontv.blueprints.video.models import Match, Video, Tournament, Team, Country
+from badmintontv.blueprints.video.catalog import catalog_cache, match_cache
+from badmintontv.blueprints.video.media import run_ffmpeg
+
+# Rounds of each test tournament, in the order they're played
+ROUNDS = ('QF', 'SF', 'F')
+
+
+@pytest.fixture(scope='function', autouse=True)
+def clear_caches():
+    '''
+    Start every test with empty in-process caches
+
+    Note: Each test's changes are rolled back, so the next test re-uses the same catalog versions
+    '''
+    catalog_cache.clear()
+    match_cache.clear()
+    page_cache.clear()
+
+
+@pytest.fixture(scope='session')
+def sample_video(tmpdir_factory):
+    '''
+    Encode an 8s test video (160x90, with sound and a keyframe every second), once per test session
+
+    Returns: Its path
+    '''
+    path = str(tmpdir_factory.mktemp('media').join('sample.mp4'))
+
+    run_ffmpeg(
+        '-f', 'lavfi', '-i', 'testsrc=duration=8:size=160x90:rate=25',
+        '-f', 'lavfi', '-i', 'sine=duration=8',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '25', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-shortest',
+        path
+    )
+
+    return path
+
+
+@pytest.fixture(scope='function')
+def add_tournaments(session):
+    '''
+    Add tournaments of 3 matches each (Kento Momota vs Viktor Axelsen), 1 week apart, the 1st starting on 2022-01-03
+
+    eg.
+        add_tournaments(2)
+        add_tournaments(1, name='Japan Open', start_date=datetime.date(2022, 8, 30))
+
+    Returns: Function adding `number` more tournaments (with 1 video per match and highlights type), 
+    which returns their matches
+    '''
+
+    def add(number=1, name=None, start_date=None, teams=('Kento Momota', 'Viktor Axelsen'), highlights_types=('Highlights',), discipline='MS'):
+        teams = [add_team(session, team) for team in teams]
+        first = Tournament.query.count()
+
+        matches = []
+        for i in range(first, first + number):
+            start = start_date or datetime.date(2022, 1, 3) + datetime.timedelta(weeks=i)
+            tournament = Tournament(name or 'Open {}'.format(i), start, start + datetime.timedelta(days=4))
+
+            for day, round in enumerate(ROUNDS):
+                match = Match(
+                    folder=tournament.name.replace(' ', '_'),
+                    name='{} {}'.format(tournament.name, round),
+                    filename='{}.mp4'.format(round),
+                    date=start + datetime.timedelta(days=day),
+                    round=round,
+                    discipline=discipline,
+                    tournament=tournament,
+                    teams=teams
+                )
+
+                for highlights_type in highlights_types:
+                    match.renditions.append(Video(
+                        highlights_datetime=tzware_datetime(),
+                        highlights_type=highlights_type,
+                        highlights_filename='[{}] {}.mp4'.format(highlights_type, round),
+                        highlights_duration=300,
+                        model_name='badminton'
+                    ))
+
+                session.add(match)
+                matches.append(match)
+
+        session.flush()
+
+        return matches
+
+    return add
+
+
+# Country of each test team
+TEAM_COUNTRIES = {
+    'Kento Momota': 'JPN',
+    'Kodai Naraoka': 'JPN',
+    'Viktor Axelsen': 'DEN',
+    'Anthony Ginting': 'INA',
+    'Lakshya Sen': 'IND',
+    'Kamura_Sonoda': 'JPN',
+    'Astrup_Rasmussen': 'DEN'
+}
+
+
+def add_team(session, name):
+    '''Get the team `name`, adding it (and its country and players) the 1st time; Returns: Team'''
+
+    team = Team.find_by_name(name)
+    if team is None:
+        country = TEAM_COUNTRIES.get(name, 'JPN')
+        team = Team(name, Country.find_by_name(country) or Country(country))
+        team.link_players()
+        session.add(team)
+
+    return team
@@ -0,0 +1,107 @@
+import json
+
+from flask import url_for
+
+from libs.tests import ViewTestMixin
+from badmintontv.extensions import db
+from badmintontv.blueprints.admin.views.dashboard import _new_videos
+from badmintontv.blueprints.video.models import Match, Video
+
+
+def add_match_folder(vid_dir, tournament='Ingest_Open', match='QF_Momota_Axelsen'):
+    '''
+    Write the metadata files of a processed match, as found in `VID_DIR`
+
+    Returns: The match's folder
+    '''
+    match_dir = vid_dir.mkdir(tournament).mkdir(match)
+
+    match_dir.join('metadata_run.json').write(json.dumps({
+        'tournament_folder': tournament,
+        'match_folder': match,
+        'match_filename': '{}.mp4'.format(match),
+        'datetime': '2022-08-30 12:00:00',
+        'version_to_metadata': {'3': {'duration_highlights': '00:20:00', 'duration_filtered_highlights': '00:05:03'}},
+        'tasks': {'Action Spotting': {'model_name': 'badminton'}}
+    }))
+    match_dir.join('metadata_match.json').write(json.dumps({
+        'tournament': 'Ingest Open',
+        'date': '2022-08-30',
+        'round': 'QF',
+        'discipline': 'MS',
+        'team1': 'Kento Momota',
+        'team2': 'Viktor Axelsen',
+        'country1': 'JPN',
+        'country2': 'DEN'
+    }))
+
+    return match_dir
+
+
+class TestNewVideos(object):
+    def test_match_committed_once_with_its_videos(self, app, session, tmpdir, monkeypatch):
+        ''' Each new match is committed once, along with both of its highlights types '''
+        add_match_folder(tmpdir)
+        monkeypatch.setitem(app.config, 'VID_DIR', str(tmpdir))
+
+        commit = db.session.commit
+        commits = []
+
+        def count_commit():
+            commits.append(True)
+            commit()
+
+        monkeypatch.setattr(db.session, 'commit', count_commit)
+
+        new_videos_metadata, num_new_videos = _new_videos(add=True)
+
+        assert num_new_videos == 2
+        assert len(commits) == 1
+
+        match = Match.find_by_folder_name('Ingest_Open', 'QF_Momota_Axelsen')
+        assert match.tournament.name == 'Ingest Open'
+        assert sorted(video.highlights_type for video in match.renditions) == ['Extended Highlights', 'Highlights']
+        assert {video.highlights_duration for video in match.renditions} == {1200, 303}
+
+        # Nothing is new the next time
+        assert _new_videos(add=True) == ({}, 0)
+        assert len(commits) == 1
+
+    def test_preview(self, app, session, tmpdir, monkeypatch):
+        ''' Without `add`, the new videos are listed but not committed '''
+        add_match_folder(tmpdir)
+        monkeypatch.setitem(app.config, 'VID_DIR', str(tmpdir))
+
+        new_videos_metadata, num_new_videos = _new_videos()
+        session.rollback()
+
+        assert num_new_videos == 2
+        assert [video['highlights_type'] for video in new_videos_metadata['Ingest_Open']] == \
+            ['Highlights', 'Extended Highlights']
+        assert Match.find_by_folder_name('Ingest_Open', 'QF_Momota_Axelsen') is None
+
+
+class TestAdminVideos(ViewTestMixin):
+    def test_sort_by(self):
+        ''' The match's name and date are sorted on its table '''
+        assert Video.sort_by('name', 'desc') == ('matches.name', 'desc')
+        assert Video.sort_by('date', 'up') == ('matches.date', 'asc')
+        assert Video.sort_by('highlights_type', 'asc') == ('videos.highlights_type', 'asc')
+        assert Video.sort_by('unknown', 'asc') == ('videos.created_on', 'asc')
+
+    def test_sort_by_match(self, add_tournaments):
+        ''' The video list sorts by the match's name and date (rather than when they were added) '''
+        qf, sf, final = add_tournaments(1, name='Sorted Open')
+        qf.date, final.date = final.date, qf.date
+        self.session.commit()
+        self.login()
+
+        response = self.client.get(url_for('admin.videos', q='Sorted Open', sort='name', direction='asc'))
+        page = response.get_data(as_text=True)
+        names = ['Sorted Open F', 'Sorted Open QF', 'Sorted Open SF']
+        assert [page.index(name) for name in names] == sorted(page.index(name) for name in names)
+
+        response = self.client.get(url_for('admin.videos', q='Sorted Open', sort='date', direction='asc'))
+        page = response.get_data(as_text=True)
+        names = ['Sorted Open F', 'Sorted Open SF', 'Sorted Open QF']
+        assert [page.index(name) for name in names] == sorted(page.index(name) for name in names)
@@ -0,0 +1,96 @@
+import json
+
+from flask import url_for
+
+from libs.tests import ViewTestMixin
+
+
+def api_matches(client, **args):
+    '''
+    Get 1 page of `/api/matches`
+
+    Returns: `(ids of its matches, in order, next cursor)`
+    '''
+    response = client.get(url_for('video.api_matches', **args))
+    assert response.status_code == 200
+
+    data = json.loads(response.data)
+    ids = [match['id'] for tournament in data['tournaments'] for match in tournament['matches']]
+
+    return ids, data['next']
+
+
+class TestApiMatches(ViewTestMixin):
+    def test_cursor_round_trip(self, add_tournaments):
+        ''' Following `next` returns every match once, in browse order, then stops '''
+        matches = add_tournaments(3)
+        browse_order = [match.id for match in sorted(matches, key=lambda match: (match.tournament.start_date, match.date), reverse=True)]
+
+        pages = []
+        ids, cursor = api_matches(self.client, limit=4)
+        pages.append(ids)
+        while cursor:
+            ids, cursor = api_matches(self.client, limit=4, cursor=cursor)
+            pages.append(ids)
+
+        assert [len(ids) for ids in pages] == [4, 4, 1]
+        assert [id for ids in pages for id in ids] == browse_order
+
+    def test_last_full_page(self, add_tournaments):
+        ''' A full last page still links to a next page, which is empty '''
+        add_tournaments(2)
+
+        ids, cursor = api_matches(self.client, limit=6)
+        assert len(ids) == 6
+
+        ids, cursor = api_matches(self.client, limit=6, cursor=cursor)
+        assert ids == []
+        assert cursor is None
+
+    def test_page_size_clamped(self, add_tournaments):
+        ''' A page size below 1 returns 1 match per page '''
+        add_tournaments(1)
+
+        for limit in (0, -5):
+            ids, cursor = api_matches(self.client, limit=limit)
+            assert len(ids) == 1
+            assert cursor is not None
+
+        for endpoint in ('video.api_facets', 'video.api_autocomplete'):
+            response = self.client.get(url_for(endpoint, q='kento', limit=0))
+            assert response.status_code == 200
+
+    def test_invalid_cursor(self):
+        ''' A tampered cursor is a 400 '''
+        response = self.client.get(url_for('video.api_matches', cursor='not-a-cursor'))
+
+        assert response.status_code == 400
+        assert json.loads(response.data) == {'error': 'Invalid cursor.'}
+
+    def test_invalid_year(self):
+        ''' A year that can't be a date is a 400 '''
+        for year in (0, 9999, 100000):
+            response = self.client.get(url_for('video.api_matches', year=year))
+
+            assert response.status_code == 400
+            assert json.loads(response.data) == {'error': 'Invalid year.'}
+
+    def test_filters(self, add_tournaments):
+        ''' Filters are combined, and matches link back to the filtered page '''
+        add_tournaments(1)
+        ginting = add_tournaments(1, teams=('Anthony Ginting', 'Viktor Axelsen'))
+
+        ids, cursor = api_matches(self.client, team='Anthony Ginting')
+        assert ids == [match.id for match in reversed(ginting)]
+
+        ids, cursor = api_matches(self.client, country='DEN', year=2022)
+        assert len(ids) == 6
+
+        ids, cursor = api_matches(self.client, year=2021)
+        assert ids == []
+
+        response = self.client.get(url_for('video.api_matches', country='INA'))
+        match = json.loads(response.data)['tournaments'][0]['matches'][0]
+        assert match['videos'][0]['highlights_type'] == 'Highlights'
+        assert match['videos'][0]['url'].endswith('/video.country_to_matches/INA')
+        assert sorted(match['teams']) == [['Anthony Ginting', 'INA'], ['Viktor Axelsen', 'DEN']]
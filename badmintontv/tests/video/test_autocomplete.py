@@ -0,0 +1,109 @@
+import json
+import datetime
+
+from flask import url_for
+
+from libs.tests import ViewTestMixin
+from badmintontv.blueprints.video import autocomplete
+from badmintontv.blueprints.video.autocomplete import autocomplete_index_cache
+
+
+def suggest(prefix, limit=10):
+    '''Returns: `(kind, name)` of each suggestion for `prefix`'''
+    return [(suggestion.kind, suggestion.name) for suggestion in autocomplete_index_cache.get().suggest(prefix, limit)]
+
+
+class TestAutocompleteIndex(object):
+    def test_min_length(self, add_tournaments):
+        ''' Nothing is suggested before 2 characters '''
+        add_tournaments(1)
+
+        assert suggest('k') == []
+        assert suggest('ke') == [('team', 'Kento Momota')]
+
+    def test_later_words(self, add_tournaments):
+        ''' Later words match too, after the full-name matches '''
+        add_tournaments(1, teams=('Kento Momota', 'Viktor Axelsen'))
+        add_tournaments(1, teams=('Momota Fan', 'Viktor Axelsen'))
+
+        assert suggest('MOM') == [('team', 'Momota Fan'), ('team', 'Kento Momota')]
+
+    def test_players(self, add_tournaments):
+        ''' Doubles teams are suggested whole, and by each player '''
+        add_tournaments(1, teams=('Kamura_Sonoda', 'Astrup_Rasmussen'))
+
+        assert suggest('kamura') == [('player', 'Kamura'), ('team', 'Kamura / Sonoda')]
+        assert suggest('sono') == [('player', 'Sonoda'), ('team', 'Kamura / Sonoda')]
+
+    def test_player_once(self, add_tournaments):
+        ''' A player with several partners is suggested once '''
+        add_tournaments(1, teams=('Kamura_Sonoda', 'Kamura_Hoki'))
+
+        assert suggest('kamura') == [('player', 'Kamura'), ('team', 'Kamura / Hoki'), ('team', 'Kamura / Sonoda')]
+
+    def test_tournaments(self, add_tournaments):
+        ''' Tournaments are suggested by any word of their name '''
+        add_tournaments(1, name='Japan Open')
+        add_tournaments(1, name='Swiss Open')
+
+        assert suggest('open') == [('tournament', 'Swiss Open'), ('tournament', 'Japan Open')]
+
+    def test_tournament_once(self, add_tournaments):
+        ''' A tournament held every year is suggested once, linking to its latest year '''
+        for match in add_tournaments(1, name='Japan Open', start_date=datetime.date(2021, 8, 30)):
+            match.folder = 'Japan_Open_2021'
+        add_tournaments(1, name='Japan Open', start_date=datetime.date(2022, 8, 30))
+
+        suggestions = autocomplete_index_cache.get().suggest('japan')
+        assert [(suggestion.kind, suggestion.name, suggestion.query) for suggestion in suggestions] == \
+            [('tournament', 'Japan Open', 2022)]
+
+    def test_scan_is_bounded(self, add_tournaments, monkeypatch):
+        ''' Only `limit * AUTOCOMPLETE_SCAN_FACTOR` keys are looked at '''
+        add_tournaments(1, teams=('Zed Abc', 'Abc Zed'))
+
+        # 'abc' (a later word of 'Zed Abc') sorts before 'abc zed'
+        assert suggest('abc', limit=1) == [('team', 'Abc Zed')]
+
+        monkeypatch.setattr(autocomplete, 'AUTOCOMPLETE_SCAN_FACTOR', 1)
+        assert suggest('abc', limit=1) == [('team', 'Zed Abc')]
+
+    def test_limit(self, add_tournaments):
+        ''' At most `limit` names are suggested '''
+        for i in range(3):
+            add_tournaments(1, name='Open {}'.format(i))
+
+        assert len(suggest('op', limit=2)) == 2
+
+    def test_rebuilt_per_catalog(self, session, add_tournaments):
+        ''' New names are suggested once they're committed '''
+        add_tournaments(1)
+        assert suggest('ant') == []
+
+        add_tournaments(1, teams=('Anthony Ginting', 'Viktor Axelsen'))
+        session.commit()
+
+        assert suggest('ant') == [('team', 'Anthony Ginting')]
+
+
+class TestApiAutocomplete(ViewTestMixin):
+    def test_suggestions(self, add_tournaments):
+        ''' Suggestions link to their team's or tournament's matches '''
+        add_tournaments(1, name='Japan Open', teams=('Kamura_Sonoda', 'Viktor Axelsen'))
+
+        response = self.client.get(url_for('video.api_autocomplete', q='ja'))
+        assert response.status_code == 200
+        assert json.loads(response.data)['suggestions'] == [{
+            'kind': 'tournament',
+            'name': 'Japan Open',
+            'country': None,
+            'url': '/tournament_to_matches/2022'
+        }]
+
+        response = self.client.get(url_for('video.api_autocomplete', q='sonoda'))
+        assert json.loads(response.data)['suggestions'][0] == {
+            'kind': 'player',
+            'name': 'Sonoda',
+            'country': 'JPN',
+            'url': '/player_to_matches/Sonoda'
+        }
@@ -0,0 +1,183 @@
+import datetime
+
+from flask import url_for
+
+from badmintontv.extensions import db
+from badmintontv.blueprints.user.models import User
+from badmintontv.blueprints.view.models import View
+from badmintontv.blueprints.video.models import CatalogVersion, Match, Video, Tournament, Team
+from badmintontv.blueprints.video.catalog import Catalog, catalog_cache
+
+
+class TestCatalog(object):
+    def test_build_queries(self, add_tournaments, queries):
+        ''' Building the catalog runs the same plain SELECTs, however big it is '''
+        add_tournaments(1)
+        del queries[:]
+
+        Catalog.build(1)
+        assert len(queries) == 9
+
+        add_tournaments(5)
+        del queries[:]
+
+        Catalog.build(2)
+        assert len(queries) == 9
+        assert all(statement.lstrip().upper().startswith('SELECT') for statement in queries)
+
+    def test_indexes(self, add_tournaments):
+        ''' Every index lookup is in browse order '''
+        add_tournaments(2)
+        add_tournaments(1, teams=('Kento Momota', 'Kodai Naraoka'))
+
+        catalog = Catalog.build(1)
+
+        matches = list(catalog.find_matches(catalog.matches_by_team, 'Kento Momota'))
+        assert [match.name for match in matches] == [
+            'Open 2 F', 'Open 2 SF', 'Open 2 QF', 'Open 1 F', 'Open 1 SF', 'Open 1 QF', 'Open 0 F', 'Open 0 SF', 'Open 0 QF'
+        ]
+
+        # JPN vs JPN is only indexed once
+        assert len(list(catalog.find_matches(catalog.matches_by_country, 'JPN'))) == 9
+        assert len(list(catalog.find_matches(catalog.matches_by_country, 'DEN'))) == 6
+
+        assert len(list(catalog.find_matches(catalog.matches_by_year, 2022))) == 9
+        assert list(catalog.find_matches(catalog.matches_by_year, 2021)) == []
+        assert catalog.years == [2022]
+
+    def test_renditions(self, add_tournaments):
+        ''' Each match has its highlights types, and each video links back to its match '''
+        match = add_tournaments(1, highlights_types=('Highlights', 'Extended Highlights'))[0]
+
+        catalog = Catalog.build(1)
+        record = catalog.matches_by_id[match.id]
+
+        assert sorted(rendition.highlights_type for rendition in record.renditions) == ['Extended Highlights', 'Highlights']
+        assert record.find_rendition('Highlights').id == match.renditions[0].id
+        assert record.find_rendition('Other') is None
+
+        renditions = catalog.find_renditions_by_id([video.id for video in match.renditions] + [0])
+        assert [rendition.match for rendition in renditions] == [record, record]
+
+    def test_find_latest_tournament(self, add_tournaments):
+        ''' The tournament starting closest to today, the older one on ties '''
+        add_tournaments(1, name='All England', start_date=datetime.date(2022, 3, 16))
+        add_tournaments(1, name='Swiss Open', start_date=datetime.date(2022, 3, 22))
+
+        catalog = Catalog.build(1)
+
+        assert catalog.find_latest_tournament(datetime.date(2022, 1, 1)).name == 'All England'
+        assert catalog.find_latest_tournament(datetime.date(2022, 3, 19)).name == 'All England'
+        assert catalog.find_latest_tournament(datetime.date(2022, 3, 20)).name == 'Swiss Open'
+        assert catalog.find_latest_tournament(datetime.date(2023, 1, 1)).name == 'Swiss Open'
+
+    def test_find_latest_tournament_memo(self, add_tournaments, queries):
+        ''' The latest tournament is looked up once per day '''
+        add_tournaments(2)
+        catalog = Catalog.build(1)
+        today = datetime.date(2022, 1, 10)
+
+        latest = catalog.find_latest_tournament(today)
+        del queries[:]
+
+        assert catalog.find_latest_tournament(today) is latest
+        assert queries == []
+
+        assert catalog.find_latest_tournament(today + datetime.timedelta(days=1)).name == 'Open 1'
+        assert len(queries) == 1
+
+
+class TestCatalogVersion(object):
+    def test_catalog_changes_bump_the_version(self, add_tournaments):
+        ''' Adding, editing or deleting a catalog model bumps the version, in the same transaction '''
+        add_tournaments(1)
+        version = CatalogVersion.current()[0]
+        assert version > 0
+
+        team = Team.find_by_name('Kento Momota')
+        team.name = 'Momota'
+        db.session.flush()
+        assert CatalogVersion.current()[0] == version + 1
+
+        db.session.delete(Video.query.first())
+        db.session.flush()
+        assert CatalogVersion.current()[0] == version + 2
+
+    def test_bulk_changes_bump_the_version(self, add_tournaments):
+        ''' `query.update()` and `query.delete()` bump the version too '''
+        add_tournaments(1)
+        version = CatalogVersion.current()[0]
+
+        Match.query.filter(Match.round == 'F').update({'round': 'Final'})
+        assert CatalogVersion.current()[0] == version + 1
+
+        Video.query.filter(Video.highlights_type == 'Highlights').delete()
+        assert CatalogVersion.current()[0] == version + 2
+
+    def test_video_relationships(self, session, add_tournaments):
+        ''' A video's views don't bump the version; Moving it to another match does '''
+        qf, sf, final = add_tournaments(1)
+        video = qf.renditions[0]
+        sf.renditions[0].highlights_type = 'Full match'
+        session.flush()
+        version = CatalogVersion.current()[0]
+
+        video.views.append(View(ip='127.0.0.1', duration=60, user=User.find_by_identity('admin@local.host')))
+        session.flush()
+        assert CatalogVersion.current()[0] == version
+
+        video.match = sf
+        session.flush()
+        assert CatalogVersion.current()[0] == version + 1
+
+    def test_first_change_creates_the_row(self, session):
+        ''' Without a version row (eg. a new database), the 1st change creates it, and the next ones increment it '''
+        CatalogVersion.query.delete()
+        assert CatalogVersion.current()[0] == 0
+
+        CatalogVersion.bump(session.connection())
+        assert CatalogVersion.current()[0] == 1
+
+        CatalogVersion.bump(session.connection())
+        assert CatalogVersion.current()[0] == 2
+
+    def test_other_changes_keep_the_version(self, add_tournaments):
+        ''' Models outside the catalog don't bump the version '''
+        add_tournaments(1)
+        version = CatalogVersion.current()[0]
+
+        user = User.find_by_identity('admin@local.host')
+        user.name = 'Admin'
+        db.session.flush()
+
+        assert CatalogVersion.current()[0] == version
+
+
+class TestCatalogCache(object):
+    def test_rebuilt_when_the_version_changes(self, add_tournaments):
+        ''' A new version is seen by the next `get` '''
+        add_tournaments(1)
+        catalog = catalog_cache.get()
+
+        assert catalog_cache.get() is catalog
+
+        add_tournaments(1, name='Japan Open')
+        db.session.commit()
+
+        assert catalog_cache.get() is not catalog
+        assert 'Japan Open' in [tournament.name for tournament in catalog_cache.get().tournaments]
+
+    def test_version_check_interval(self, app, add_tournaments, queries, monkeypatch):
+        ''' Between 2 version checks, the browse pages run no SQL at all '''
+        add_tournaments(2)
+        monkeypatch.setitem(app.config, 'CATALOG_VERSION_CHECK_INTERVAL', 60)
+
+        client = app.test_client()
+        client.get(url_for('video.tournament_to_matches', query='2022'))
+        del queries[:]
+
+        response = client.get(url_for('video.tournament_to_matches', query='2022'))
+
+        assert response.status_code == 200
+        assert b'Open 1' in response.data
+        assert queries == []
@@ -0,0 +1,117 @@
+import datetime
+
+from flask import url_for
+from werkzeug.http import http_date
+
+from libs.tests import ViewTestMixin
+from badmintontv.extensions import page_cache
+from badmintontv.blueprints.video.catalog import catalog_cache
+from badmintontv.blueprints.video.decorators import _catalog_etag, _last_modified
+
+
+class TestConditionalGet(ViewTestMixin):
+    def test_validators(self, add_tournaments):
+        ''' Pages carry an ETag and a Last-Modified, and must be revalidated '''
+        add_tournaments(1)
+
+        response = self.client.get(url_for('video.teams'))
+
+        assert response.status_code == 200
+        assert response.headers['ETag']
+        assert response.last_modified is not None
+        assert response.cache_control.no_cache
+        assert set(response.vary) >= {'Cookie', 'Accept-Language'}
+
+    def test_if_none_match(self, add_tournaments):
+        ''' The same ETag is a 304, without rendering the page '''
+        add_tournaments(1)
+        etag = self.client.get(url_for('video.teams')).headers['ETag']
+        misses, hits = page_cache.misses, page_cache.hits
+
+        response = self.client.get(url_for('video.teams'), headers={'If-None-Match': etag})
+
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['ETag'] == etag
+        assert (page_cache.misses, page_cache.hits) == (misses, hits)
+
+    def test_if_modified_since(self, add_tournaments):
+        ''' Not modified since Last-Modified is a 304; An older date is a 200 '''
+        add_tournaments(1)
+        last_modified = self.client.get(url_for('video.teams')).last_modified
+
+        response = self.client.get(url_for('video.teams'), headers={'If-Modified-Since': http_date(last_modified)})
+        assert response.status_code == 304
+
+        earlier = last_modified - datetime.timedelta(seconds=1)
+        response = self.client.get(url_for('video.teams'), headers={'If-Modified-Since': http_date(earlier)})
+        assert response.status_code == 200
+
+    def test_if_none_match_wins(self, add_tournaments):
+        ''' If-Modified-Since is ignored when an If-None-Match is sent '''
+        add_tournaments(1)
+        last_modified = self.client.get(url_for('video.teams')).last_modified
+
+        response = self.client.get(url_for('video.teams'), headers={
+            'If-None-Match': '"other"',
+            'If-Modified-Since': http_date(last_modified)
+        })
+
+        assert response.status_code == 200
+
+    def test_catalog_change(self, session, add_tournaments):
+        ''' A catalog change gives a new ETag '''
+        add_tournaments(1)
+        etag = self.client.get(url_for('video.teams')).headers['ETag']
+
+        add_tournaments(1, teams=('Anthony Ginting', 'Viktor Axelsen'))
+        session.commit()
+
+        response = self.client.get(url_for('video.teams'), headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert b'Anthony Ginting' in response.data
+
+    def test_user_change(self, session, add_tournaments):
+        ''' Each user has their own ETag (the layout shows who's logged in) '''
+        add_tournaments(1)
+        session.commit()
+        etag = self.client.get(url_for('video.teams')).headers['ETag']
+
+        self.login()
+
+        response = self.client.get(url_for('video.teams'), headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_pending_flash(self, add_tournaments):
+        ''' A page with a flash message to show is always rendered '''
+        add_tournaments(1)
+        etag = self.client.get(url_for('video.teams')).headers['ETag']
+
+        with self.client.session_transaction() as flask_session:
+            flask_session['_flashes'] = [('success', 'Welcome')]
+
+        response = self.client.get(url_for('video.teams'), headers={'If-None-Match': etag})
+        assert response.status_code == 200
+
+    def test_errors(self):
+        ''' Error pages carry no validators '''
+        response = self.client.get(url_for('video.head_to_head', query='Kento Momota'))
+
+        assert response.status_code == 404
+        assert 'ETag' not in response.headers
+
+
+class TestValidators(object):
+    def test_new_day(self, app, add_tournaments):
+        ''' The validators change at midnight, since the latest tournament may change '''
+        add_tournaments(1)
+        catalog = catalog_cache.get()
+        today = datetime.date.today()
+        tomorrow = today + datetime.timedelta(days=1)
+
+        with app.test_request_context():
+            assert _catalog_etag(catalog, today) != _catalog_etag(catalog, tomorrow)
+
+        assert _last_modified(catalog, tomorrow) > _last_modified(catalog, today)
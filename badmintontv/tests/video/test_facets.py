@@ -0,0 +1,107 @@
+import datetime
+import json
+
+from flask import url_for
+
+from libs.tests import ViewTestMixin
+from badmintontv.blueprints.video.facets import facet_index_cache
+
+
+def api_facets(client, **args):
+    '''
+    Get `/api/facets`
+
+    Returns: `(its JSON, facet --> value --> count)`
+    '''
+    response = client.get(url_for('video.api_facets', **args))
+    assert response.status_code == 200
+
+    data = json.loads(response.data)
+    counts = {
+        facet: {value['value']: value['count'] for value in values}
+        for facet, values in data['facets'].items()
+    }
+
+    return data, counts
+
+
+class TestFacetIndex(object):
+    def test_rebuilt_per_catalog(self, session, add_tournaments):
+        ''' The index is kept until the catalog changes '''
+        add_tournaments(1)
+        index = facet_index_cache.get()
+
+        assert facet_index_cache.get() is index
+
+        add_tournaments(1)
+        session.commit()
+
+        assert facet_index_cache.get() is not index
+
+    def test_search(self, add_tournaments):
+        ''' Filters are combined, and the page is in browse order '''
+        add_tournaments(2)
+        add_tournaments(1, teams=('Anthony Ginting', 'Viktor Axelsen'), discipline='XD')
+
+        matches, total, counts = facet_index_cache.get().search({'country': 'DEN', 'round': 'F'}, limit=2)
+
+        assert total == 3
+        assert [match.tournament.name for match in matches] == ['Open 2', 'Open 1']
+
+
+class TestApiFacets(ViewTestMixin):
+    def test_unfiltered_counts(self, add_tournaments):
+        ''' With no filters, every facet value is counted '''
+        add_tournaments(2)
+        add_tournaments(1, start_date=datetime.date(2023, 1, 2), teams=('Anthony Ginting', 'Viktor Axelsen'))
+
+        data, counts = api_facets(self.client)
+
+        assert data['total'] == 9
+        assert counts['year'] == {2022: 6, 2023: 3}
+        assert counts['team'] == {'Viktor Axelsen': 9, 'Kento Momota': 6, 'Anthony Ginting': 3}
+        assert counts['country'] == {'DEN': 9, 'JPN': 6, 'INA': 3}
+        assert counts['round'] == {'QF': 3, 'SF': 3, 'F': 3}
+
+    def test_disjunctive_counts(self, add_tournaments):
+        ''' A facet's counts ignore its own filter, but apply the others '''
+        add_tournaments(2)
+        add_tournaments(1, start_date=datetime.date(2023, 1, 2), teams=('Anthony Ginting', 'Viktor Axelsen'))
+
+        data, counts = api_facets(self.client, year=2023)
+
+        assert data['total'] == 3
+        assert counts['year'] == {2022: 6, 2023: 3}
+        assert counts['team'] == {'Viktor Axelsen': 3, 'Anthony Ginting': 3}
+
+        data, counts = api_facets(self.client, year=2022, team='Anthony Ginting')
+
+        assert data['total'] == 0
+        assert counts['year'] == {2023: 3}
+        assert counts['team'] == {'Viktor Axelsen': 6, 'Kento Momota': 6}
+
+    def test_highlights_types(self, add_tournaments):
+        ''' Matches are counted once per highlights type they have '''
+        add_tournaments(1, highlights_types=('Highlights', 'Extended Highlights'))
+        add_tournaments(1)
+
+        data, counts = api_facets(self.client, highlights_type='Extended Highlights')
+
+        assert data['total'] == 3
+        assert counts['highlights_type'] == {'Highlights': 6, 'Extended Highlights': 3}
+
+    def test_tournament_labels(self, add_tournaments):
+        ''' Tournaments are filtered on by ID, and labelled with their names '''
+        matches = add_tournaments(1, name='Japan Open')
+
+        data, counts = api_facets(self.client, tournament=matches[0].tournament_id)
+
+        assert data['total'] == 3
+        assert data['facets']['tournament'] == [{'value': matches[0].tournament_id, 'label': 'Japan Open', 'count': 3}]
+
+    def test_invalid_year(self):
+        ''' Non-numeric years are a 400 '''
+        response = self.client.get(url_for('video.api_facets', year='latest'))
+
+        assert response.status_code == 400
+        assert json.loads(response.data) == {'error': 'Invalid year.'}
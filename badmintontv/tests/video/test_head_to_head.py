@@ -0,0 +1,59 @@
+from flask import url_for
+
+from libs.tests import ViewTestMixin
+from badmintontv.blueprints.video.catalog import Catalog, catalog_cache
+
+
+class TestPairIndex(object):
+    def test_pair_key(self):
+        ''' The same key whichever side each team played on '''
+        assert Catalog.pair_key('Viktor Axelsen', 'Kento Momota') == ('Kento Momota', 'Viktor Axelsen')
+        assert Catalog.pair_key('Kento Momota', 'Viktor Axelsen') == ('Kento Momota', 'Viktor Axelsen')
+
+    def test_matches_by_pair(self, add_tournaments):
+        ''' Only matches between both teams are stored under their pair '''
+        momota_axelsen = add_tournaments(1)
+        add_tournaments(1, teams=('Anthony Ginting', 'Viktor Axelsen'))
+
+        catalog = catalog_cache.get()
+        matches = catalog.find_matches(catalog.matches_by_pair, Catalog.pair_key('Viktor Axelsen', 'Kento Momota'))
+
+        assert sorted(match.id for match in matches) == sorted(match.id for match in momota_axelsen)
+
+
+class TestHeadToHead(ViewTestMixin):
+    def test_both_orders(self, add_tournaments):
+        ''' Either order of the teams lists their matches '''
+        add_tournaments(1, name='Japan Open')
+        add_tournaments(1, name='Swiss Open', teams=('Anthony Ginting', 'Viktor Axelsen'))
+
+        for query in ('Kento Momota vs Viktor Axelsen', 'Viktor Axelsen vs Kento Momota'):
+            response = self.client.get(url_for('video.head_to_head', query=query))
+
+            assert response.status_code == 200
+            assert b'Japan Open' in response.data
+            assert b'Swiss Open' not in response.data
+
+    def test_no_matches(self, add_tournaments):
+        ''' Teams that never played each other get an empty page '''
+        add_tournaments(1)
+
+        response = self.client.get(url_for('video.head_to_head', query='Kento Momota vs Anthony Ginting'))
+
+        assert response.status_code == 200
+        assert b'Kento Momota vs Anthony Ginting' in response.data
+
+    def test_not_a_pair(self):
+        ''' A query without 2 teams is a 404 '''
+        response = self.client.get(url_for('video.head_to_head', query='Kento Momota'))
+
+        assert response.status_code == 404
+
+    def test_links(self, add_tournaments):
+        ''' Browse pages link each match to its head-to-head '''
+        add_tournaments(1)
+
+        response = self.client.get(url_for('video.team_to_matches', query='Kento Momota'))
+
+        assert b'/head_to_head/Kento%20Momota%20vs%20Viktor%20Axelsen' in response.data \
+            or b'/head_to_head/Viktor%20Axelsen%20vs%20Kento%20Momota' in response.data
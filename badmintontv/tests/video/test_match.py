@@ -0,0 +1,79 @@
+from flask import url_for
+
+from libs.tests import ViewTestMixin
+from badmintontv.extensions import db
+from badmintontv.blueprints.video.models import Video
+from badmintontv.blueprints.video.catalog import match_cache
+
+
+def match_url(video):
+    return url_for('video.match', id=video.id, highlights_type=video.highlights_type, from_route='_', query='_')
+
+
+class TestFindForMatch(object):
+    def test_is_1_query(self, add_tournaments, queries):
+        ''' The video, its match, tournament, teams and countries, and the other highlights types are 1 SELECT '''
+        match = add_tournaments(1, highlights_types=('Highlights', 'Extended Highlights'))[0]
+        id = match.renditions[0].id
+        db.session.expire_all()
+        del queries[:]
+
+        video = Video.find_for_match(id, 'Highlights')
+        assert [team.country.name for team in video.match.teams] and video.match.tournament.name
+
+        assert [rendition.highlights_type for rendition in video.match.renditions] == ['Extended Highlights', 'Highlights']
+        assert len(queries) == 1
+
+    def test_unknown(self, add_tournaments):
+        ''' The wrong highlights type is no video '''
+        video = add_tournaments(1)[0].renditions[0]
+
+        assert Video.find_for_match(video.id, 'Highlights') is video
+        assert Video.find_for_match(video.id, 'Extended Highlights') is None
+
+
+class TestMatchCache(object):
+    def test_hit(self, add_tournaments, queries):
+        ''' A hit is merged into the session without any SQL '''
+        id = add_tournaments(1)[0].renditions[0].id
+        match_cache.get(id, 'Highlights')
+        del queries[:]
+
+        video = match_cache.get(id, 'Highlights')
+
+        assert video.id == id
+        assert [team.name for team in video.match.teams] == ['Kento Momota', 'Viktor Axelsen']
+
+        # Only the catalog version is checked
+        assert all('catalog_versions' in statement for statement in queries)
+
+    def test_catalog_change(self, session, add_tournaments):
+        ''' A catalog change drops the cached videos '''
+        id = add_tournaments(1)[0].renditions[0].id
+        video = match_cache.get(id, 'Highlights')
+
+        video.match.round = 'R16'
+        session.commit()
+
+        assert match_cache.get(id, 'Highlights').match.round == 'R16'
+
+
+class TestMatchPage(ViewTestMixin):
+    def test_other_highlights_types(self, session, add_tournaments):
+        ''' The match page links to the other highlights types '''
+        highlights, extended = add_tournaments(1, highlights_types=('Highlights', 'Extended Highlights'))[0].renditions
+        session.commit()
+        self.login()
+
+        response = self.client.get(match_url(highlights))
+
+        assert response.status_code == 200
+        assert match_url(extended).replace('http://localhost:5000', '').replace(' ', '%20').encode() in response.data
+
+    def test_unknown(self, session):
+        ''' An unknown video is a 404 '''
+        self.login()
+
+        response = self.client.get(url_for('video.match', id=0, highlights_type='Highlights', from_route='_', query='_'))
+
+        assert response.status_code == 404
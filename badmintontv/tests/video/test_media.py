@@ -0,0 +1,408 @@
+import os
+import shutil
+import struct
+
+import numpy as np
+import pytest
+from flask import url_for
+from PIL import Image
+
+from libs.tests import ViewTestMixin
+
+from badmintontv.blueprints.video import media
+from badmintontv.blueprints.video.models import CatalogVersion, Video
+from badmintontv.blueprints.video.media import (
+    hls_folder, segment_hls, encode_ladder, video_size, make_poster, make_poster_batch, read_frame, sharpness,
+    sprites_folder, make_sprites, _vtt_timestamp, is_faststart, make_faststart, Rung, HLS_PLAYLIST
+)
+from badmintontv.blueprints.video.tasks import make_videos_faststart, segment_videos, make_posters, make_sprite_sheets
+from badmintontv.blueprints.video.template_processors import poster_url
+
+
+@pytest.fixture(scope='function')
+def video_file(tmpdir, sample_video):
+    '''
+    Copy the sample video into a match folder
+
+    Returns: Its path
+    '''
+    path = str(tmpdir.join('[Highlights] m0.mp4'))
+    shutil.copy(sample_video, path)
+
+    return path
+
+
+def box(box_type, content=b'', largesize=False, to_end=False):
+    '''
+    Bytes of an MP4 box
+
+    Params:
+        box_type (bytes):   eg. b'moov'
+        content (bytes):    What the box holds
+        largesize (bool):   Write its size as a 64-bit size, after the type
+        to_end (bool):      Write a size of 0 (the box goes up to the end of the file)
+
+    Returns: bytes
+    '''
+    if largesize:
+        return struct.pack('>I4sQ', 1, box_type, 16 + len(content)) + content
+
+    return struct.pack('>I4s', 0 if to_end else 8 + len(content), box_type) + content
+
+
+def write(tmpdir, data):
+    '''Write `data` to a file; Returns: Its path'''
+    path = tmpdir.join('video.mp4')
+    path.write_binary(data)
+
+    return str(path)
+
+
+class TestSegmentHls(object):
+    def test_hls_folder(self):
+        ''' The HLS folder is named after the video file '''
+        assert hls_folder('[Highlights] m0.mp4') == '[Highlights] m0.hls'
+
+    def test_segment_hls(self, tmpdir, video_file):
+        ''' The playlist lists fMP4 segments, next to the video, with no temporary folder left '''
+        manifest = segment_hls(video_file)
+
+        assert manifest == '[Highlights] m0.hls/source/{}'.format(HLS_PLAYLIST)
+
+        playlist = tmpdir.join(manifest).read()
+        segments = [line for line in playlist.splitlines() if line and not line.startswith('#')]
+
+        assert '#EXT-X-PLAYLIST-TYPE:VOD' in playlist
+        assert '#EXT-X-MAP:URI="init.mp4"' in playlist
+        assert len(segments) >= 2
+        assert all(tmpdir.join('[Highlights] m0.hls', 'source', segment).check() for segment in segments)
+        assert sorted(os.listdir(str(tmpdir))) == ['[Highlights] m0.hls', '[Highlights] m0.mp4']
+        assert os.listdir(str(tmpdir.join('[Highlights] m0.hls'))) == ['source']
+
+    def test_resegment(self, tmpdir, video_file):
+        ''' Segmenting again replaces the old segments '''
+        segment_hls(video_file)
+        tmpdir.join('[Highlights] m0.hls', 'source', 'stale.m4s').write('x')
+
+        segment_hls(video_file)
+
+        assert not tmpdir.join('[Highlights] m0.hls', 'source', 'stale.m4s').check()
+        assert tmpdir.join('[Highlights] m0.hls', 'source', HLS_PLAYLIST).check()
+
+    def test_resegment_in_place(self, tmpdir, video_file, monkeypatch):
+        ''' The new segments are moved into place before the old ones are deleted '''
+        segment_hls(video_file)
+        playlist = tmpdir.join('[Highlights] m0.hls', 'source', HLS_PLAYLIST)
+
+        rmtree = shutil.rmtree
+        playlist_after_rmtree = []
+
+        def recording_rmtree(path, *args, **kwargs):
+            rmtree(path, *args, **kwargs)
+            playlist_after_rmtree.append(playlist.check())
+
+        monkeypatch.setattr(media.shutil, 'rmtree', recording_rmtree)
+        segment_hls(video_file)
+
+        assert playlist_after_rmtree and all(playlist_after_rmtree)
+        assert os.listdir(str(tmpdir.join('[Highlights] m0.hls'))) == ['source']
+
+    def test_failure(self, tmpdir):
+        ''' A file ffmpeg can't read raises, and leaves no partial playlist behind '''
+        path = tmpdir.join('[Highlights] m0.mp4')
+        path.write_binary(b'not a video')
+
+        with pytest.raises(Exception):
+            segment_hls(str(path))
+
+        assert os.listdir(str(tmpdir.join('[Highlights] m0.hls'))) == []
+
+
+class TestEncodeLadder(object):
+    @pytest.fixture(autouse=True)
+    def ladder(self, monkeypatch):
+        ''' A ladder small enough for the 90p sample video (a rung taller than it is skipped) '''
+        monkeypatch.setattr(media, 'LADDER', (Rung('36p', 36, 50, 32), Rung('60p', 60, 100, 32), Rung('720p', 720, 2800, 128)))
+
+    def test_video_size(self, video_file):
+        assert video_size(video_file) == (160, 90)
+
+    def test_encode_ladder(self, tmpdir, video_file):
+        ''' Each rung not taller than the video is encoded, and listed by the master playlist, lowest bandwidth first '''
+        segment_hls(video_file)
+
+        assert encode_ladder(video_file, 8) == ('[Highlights] m0.hls/master.m3u8', ['36p', '60p'])
+
+        folder = tmpdir.join('[Highlights] m0.hls')
+        assert sorted(os.listdir(str(folder))) == ['36p', '60p', 'master.m3u8', 'source']
+
+        lines = folder.join('master.m3u8').read().splitlines()
+        variants = dict(zip(lines[4::2], lines[3::2]))
+        bandwidths = [int(line.split('BANDWIDTH=')[1].split(',')[0]) for line in lines[3::2]]
+
+        assert variants == {
+            '36p/index.m3u8': '#EXT-X-STREAM-INF:BANDWIDTH=82000,RESOLUTION=64x36',
+            '60p/index.m3u8': '#EXT-X-STREAM-INF:BANDWIDTH=132000,RESOLUTION=106x60',
+            'source/index.m3u8': '#EXT-X-STREAM-INF:BANDWIDTH={},RESOLUTION=160x90'.format(os.path.getsize(video_file))
+        }
+        assert bandwidths == sorted(bandwidths)
+
+    def test_keyframes_on_segments(self, tmpdir, video_file):
+        ''' Every rung is cut into the same segments, so the player can switch at any of them '''
+        encode_ladder(video_file, 8)
+
+        def durations(rung):
+            playlist = tmpdir.join('[Highlights] m0.hls', rung, HLS_PLAYLIST).read()
+            return [line for line in playlist.splitlines() if line.startswith('#EXTINF')]
+
+        assert durations('36p') == durations('60p')
+        assert len(durations('36p')) == 2
+
+    def test_resume(self, tmpdir, video_file):
+        ''' Rungs already encoded are kept; Without a segmented source, the master lists only the rungs '''
+        rung = tmpdir.join('[Highlights] m0.hls', '36p').ensure(dir=True)
+        rung.join(HLS_PLAYLIST).write('kept')
+
+        encode_ladder(video_file, 8)
+
+        assert rung.join(HLS_PLAYLIST).read() == 'kept'
+        assert 'source' not in tmpdir.join('[Highlights] m0.hls', 'master.m3u8').read()
+
+
+class TestPoster(object):
+    def test_sharpness(self):
+        ''' Flat frames have no sharpness, and blurring a frame lowers it '''
+        checkerboard = np.indices((40, 40)).sum(axis=0) % 2 * 255
+        sharp = np.repeat(checkerboard[:, :, None], 3, axis=2).astype(np.uint8)
+        blurred = np.array(Image.fromarray(sharp).resize((10, 10)).resize((40, 40), Image.BILINEAR))
+
+        assert sharpness(np.zeros((40, 40, 3), dtype=np.uint8)) == 0
+        assert sharpness(sharp) > sharpness(blurred) > 0
+
+    def test_read_frame(self, sample_video):
+        ''' A frame is an RGB array; There's none after the end '''
+        frame = read_frame(sample_video, 2)
+
+        assert frame.shape == (90, 160, 3)
+        assert frame.dtype == np.uint8
+        assert read_frame(sample_video, 60) is None
+
+    def test_make_poster(self, tmpdir, sample_video, monkeypatch):
+        ''' The poster is resized, in every format, and named after its pixels '''
+        monkeypatch.setattr(media, 'POSTER_WIDTH', 80)
+
+        key = make_poster(sample_video, 8, str(tmpdir))
+
+        folder, name = key.split('/')
+        assert folder == name[:2] and len(name) == 64
+        assert sorted(os.listdir(str(tmpdir.join(folder)))) == [name + '.jpg', name + '.webp']
+
+        with Image.open(str(tmpdir.join(key + '.webp'))) as image:
+            assert image.size == (80, 45)
+
+    def test_content_addressed(self, tmpdir, sample_video):
+        ''' The same poster is stored once, and never re-encoded '''
+        key = make_poster(sample_video, 8, str(tmpdir))
+        poster = tmpdir.join(key + '.jpg')
+        poster.write('kept')
+
+        copy = str(tmpdir.join('copy.mp4'))
+        shutil.copy(sample_video, copy)
+
+        assert make_poster(copy, 8, str(tmpdir)) == key
+        assert poster.read() == 'kept'
+
+    def test_no_frame(self, tmpdir, sample_video):
+        with pytest.raises(ValueError):
+            make_poster(sample_video, 600, str(tmpdir))
+
+    def test_make_poster_batch(self, tmpdir, sample_video):
+        ''' Posters are made by a pool of processes; Videos whose poster fails are left out '''
+        posters = make_poster_batch([(1, sample_video, 8), (2, str(tmpdir.join('missing.mp4')), 8)], str(tmpdir), workers=2)
+
+        assert list(posters) == [1]
+        assert tmpdir.join(posters[1] + '.jpg').check()
+
+
+class TestMakePosters(ViewTestMixin):
+    def test_make_posters(self, app, session, add_tournaments, tmpdir, sample_video, monkeypatch):
+        ''' The task records the posters of the videos without one, which their match tiles then show '''
+        monkeypatch.setitem(app.config, 'VID_DIR', str(tmpdir.join('videos')))
+        monkeypatch.setitem(app.config, 'POSTER_DIR', str(tmpdir.join('posters')))
+
+        video = add_tournaments(1)[0].renditions[0]
+        video.highlights_duration = 8
+        tmpdir.join('videos', video.match.folder, video.match.name).ensure(dir=True)
+        shutil.copy(sample_video, video.path(str(tmpdir.join('videos'))))
+        session.commit()
+
+        assert make_posters.run() == 1
+        assert video.id not in Video.find_ids_without(Video.poster)
+
+        response = self.client.get(url_for('video.tournament_to_matches', query=str(video.match.date.year)))
+
+        assert poster_url(video.poster, 'webp').encode() in response.data
+        assert poster_url(video.poster, 'jpg').encode() in response.data
+
+    def test_poster_url(self, app):
+        assert poster_url('3f/3fa4') == '/static/posters/3f/3fa4.jpg'
+        assert poster_url('3f/3fa4', 'webp') == '/static/posters/3f/3fa4.webp'
+
+
+class TestSprites(object):
+    @pytest.fixture(autouse=True)
+    def sheets(self, monkeypatch):
+        ''' Sheets of 3 x 2 tiles 32px wide, 1 every second, so the sample video fills more than 1 '''
+        monkeypatch.setattr(media, 'SPRITE_SECONDS', 1)
+        monkeypatch.setattr(media, 'SPRITE_TILE_WIDTH', 32)
+        monkeypatch.setattr(media, 'SPRITE_COLUMNS', 3)
+        monkeypatch.setattr(media, 'SPRITE_ROWS', 2)
+
+    def cues(self, track):
+        '''Returns: `(timing, payload)` of each cue of a WebVTT track'''
+        lines = track.read().splitlines()
+        assert lines[0] == 'WEBVTT'
+
+        return [(lines[i], lines[i + 1]) for i in range(2, len(lines), 3)]
+
+    def test_sprites_folder(self):
+        assert sprites_folder('[Highlights] m0.mp4') == '[Highlights] m0.sprites'
+
+    def test_vtt_timestamp(self):
+        assert _vtt_timestamp(0) == '00:00:00.000'
+        assert _vtt_timestamp(3725.5) == '01:02:05.500'
+
+    def test_make_sprites(self, tmpdir, video_file):
+        ''' Tiles fill sheets row by row, and the track maps each second to its tile '''
+        assert make_sprites(video_file) == '[Highlights] m0.sprites/thumbnails.vtt'
+
+        folder = tmpdir.join('[Highlights] m0.sprites')
+        cues = self.cues(folder.join('thumbnails.vtt'))
+
+        assert len(cues) >= 7
+        assert cues[0] == ('00:00:00.000 --> 00:00:01.000', 'sprite_000.jpg#xywh=0,0,32,18')
+        assert cues[4] == ('00:00:04.000 --> 00:00:05.000', 'sprite_000.jpg#xywh=32,18,32,18')
+        assert cues[6] == ('00:00:06.000 --> 00:00:07.000', 'sprite_001.jpg#xywh=0,0,32,18')
+        assert ' --> 00:00:08.' in cues[-1][0]  # The last tile is shown until the end
+
+        with Image.open(str(folder.join('sprite_000.jpg'))) as sheet:
+            assert sheet.size == (96, 36)
+
+        # A partial sheet only keeps the rows it uses
+        with Image.open(str(folder.join('sprite_001.jpg'))) as sheet:
+            assert sheet.size == (96, 18 * -(-(len(cues) - 6) // 3))
+
+        assert sorted(os.listdir(str(tmpdir))) == ['[Highlights] m0.mp4', '[Highlights] m0.sprites']
+
+    def test_remake(self, tmpdir, video_file):
+        ''' Making the previews again replaces the old ones '''
+        make_sprites(video_file)
+        tmpdir.join('[Highlights] m0.sprites', 'sprite_999.jpg').write('x')
+
+        make_sprites(video_file)
+
+        assert not tmpdir.join('[Highlights] m0.sprites', 'sprite_999.jpg').check()
+
+    def test_no_frames(self, tmpdir, video_file, monkeypatch):
+        ''' A video without frames has no previews, rather than an empty track '''
+        def read_frames(path, **kwargs):
+            yield {'size': (32, 18), 'duration': 8.0}
+
+        monkeypatch.setattr(media, 'read_frames', read_frames)
+
+        assert make_sprites(video_file) is None
+        assert sorted(os.listdir(str(tmpdir))) == ['[Highlights] m0.mp4']
+
+
+class TestIsFaststart(object):
+    def test_moov_first(self, tmpdir):
+        ''' Moov before mdat is faststart '''
+        path = write(tmpdir, box(b'ftyp', b'isom') + box(b'moov', b'x' * 100) + box(b'mdat', b'y' * 1000))
+
+        assert is_faststart(path) is True
+
+    def test_mdat_first(self, tmpdir):
+        ''' Mdat before moov isn't faststart '''
+        path = write(tmpdir, box(b'ftyp', b'isom') + box(b'free') + box(b'mdat', b'y' * 1000) + box(b'moov', b'x' * 100))
+
+        assert is_faststart(path) is False
+
+    def test_largesize_box_is_skipped(self, tmpdir):
+        ''' A box with a 64-bit size is skipped by that size '''
+        path = write(tmpdir, box(b'ftyp', b'isom') + box(b'free', b'z' * 300, largesize=True) + box(b'moov'))
+
+        assert is_faststart(path) is True
+
+    def test_largesize_mdat_first(self, tmpdir):
+        ''' A 64-bit mdat (as in files over 4GB) before moov isn't faststart '''
+        path = write(tmpdir, box(b'ftyp', b'isom') + box(b'mdat', b'y' * 1000, largesize=True) + box(b'moov'))
+
+        assert is_faststart(path) is False
+
+    def test_box_up_to_end_of_file(self, tmpdir):
+        ''' A box with a size of 0 is the last box '''
+        path = write(tmpdir, box(b'ftyp', b'isom') + box(b'mdat', b'y' * 1000, to_end=True))
+        assert is_faststart(path) is False
+
+        # So a moov after it is part of it
+        path = write(tmpdir, box(b'ftyp', b'isom') + box(b'free', b'z' * 300, to_end=True) + box(b'moov'))
+        assert is_faststart(path) is None
+
+    def test_truncated_largesize(self, tmpdir):
+        ''' A file cut in the middle of a 64-bit size isn't an MP4 file '''
+        path = write(tmpdir, box(b'ftyp', b'isom') + struct.pack('>I4s', 1, b'free') + b'\x00\x00')
+
+        assert is_faststart(path) is None
+
+    def test_not_an_mp4_file(self, tmpdir):
+        ''' Junk, an empty file, or a file without moov/mdat, isn't an MP4 file '''
+        assert is_faststart(write(tmpdir, b'\x00\x00\x00\x02junk' * 10)) is None
+        assert is_faststart(write(tmpdir, b'')) is None
+        assert is_faststart(write(tmpdir, box(b'ftyp', b'isom') + box(b'free', b'z' * 10))) is None
+
+
+class TestMakeFaststart(ViewTestMixin):
+    def test_make_faststart(self, tmpdir, video_file):
+        ''' The moov box is moved first, without re-encoding, and without a temporary file left '''
+        assert is_faststart(video_file) is False
+        frame = read_frame(video_file, 2)
+
+        assert make_faststart(video_file) is True
+
+        assert is_faststart(video_file) is True
+        assert (read_frame(video_file, 2) == frame).all()
+        assert os.listdir(str(tmpdir)) == ['[Highlights] m0.mp4']
+
+        # Already faststart: nothing to do
+        mtime = os.stat(video_file).st_mtime_ns
+        assert make_faststart(video_file) is True
+        assert os.stat(video_file).st_mtime_ns == mtime
+
+    def test_not_an_mp4_file(self, tmpdir):
+        assert make_faststart(write(tmpdir, b'junk' * 10)) is False
+
+    def test_task(self, app, session, add_tournaments, tmpdir, sample_video, monkeypatch):
+        ''' The sweep records the videos it checked, without a catalog change, then queues the other media tasks '''
+        monkeypatch.setitem(app.config, 'VID_DIR', str(tmpdir))
+
+        queued = []
+        for task in (segment_videos, make_posters, make_sprite_sheets):
+            monkeypatch.setattr(task, 'delay', lambda task=task: queued.append(task.name))
+
+        # Only the 1st match has a file: the others fail, and are retried on the next run
+        qf, sf, final = [match.renditions[0] for match in add_tournaments(1)]
+        tmpdir.join(qf.match.folder, qf.match.name).ensure(dir=True)
+        shutil.copy(sample_video, qf.path(str(tmpdir)))
+        session.commit()
+        version = CatalogVersion.current()
+
+        assert make_videos_faststart.run() >= 1
+
+        assert is_faststart(qf.path(str(tmpdir))) is True
+        assert CatalogVersion.current() == version
+
+        unchecked = Video.find_ids_without(Video.faststart)
+        assert qf.id not in unchecked
+        assert sf.id in unchecked and final.id in unchecked
+
+        assert sorted(name.rsplit('.', 1)[1] for name in queued) == ['make_posters', 'make_sprite_sheets', 'segment_videos']
@@ -0,0 +1,211 @@
+import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from badmintontv.extensions import db
+from badmintontv.blueprints.video.models import Match, Video, Tournament, Team, Country
+
+
+def browse(*criteria):
+    '''
+    Load the matches of a browse page, touching everything it renders
+
+    Returns: List of matches
+    '''
+    matches = Match.find_for_browse(*criteria).all()
+
+    for match in matches:
+        match.tournament.name
+        [video.highlights_type for video in match.renditions]
+        for team in match.teams:
+            team.country.name
+
+    return matches
+
+
+class TestFindForBrowse(object):
+    def test_browse_is_1_query(self, add_tournaments, queries):
+        ''' A browse page costs 1 query, however many tournaments it shows '''
+        add_tournaments(2)
+        db.session.expire_all()
+        del queries[:]
+
+        assert len(browse()) == 6
+        assert len(queries) == 1
+
+        add_tournaments(5)
+        db.session.expire_all()
+        del queries[:]
+
+        assert len(browse()) == 21
+        assert len(queries) == 1
+
+    def test_one_tile_per_match(self, add_tournaments):
+        ''' Each match is loaded once, with all its highlights types '''
+        add_tournaments(1, highlights_types=('Highlights', 'Extended Highlights'))
+        db.session.expire_all()
+
+        matches = browse()
+
+        assert len(matches) == 3
+        assert [video.highlights_type for video in matches[0].renditions] == ['Extended Highlights', 'Highlights']
+
+    def test_browse_order(self, add_tournaments):
+        ''' Tournaments newest-to-oldest, then their matches newest-to-oldest '''
+        add_tournaments(2)
+
+        matches = browse()
+
+        assert [match.tournament.name for match in matches] == ['Open 1'] * 3 + ['Open 0'] * 3
+        assert [match.round for match in matches] == ['F', 'SF', 'QF'] * 2
+
+    def test_criteria(self, add_tournaments):
+        ''' Only matches matching every criteria are loaded '''
+        add_tournaments(1)
+        add_tournaments(1, teams=('Anthony Ginting', 'Viktor Axelsen'))
+
+        matches = browse(Match.teams.any(Team.name == 'Anthony Ginting'))
+        assert {match.tournament.name for match in matches} == {'Open 1'}
+
+        matches = browse(Tournament.start_date >= datetime.date(2022, 1, 10), Match.round == 'F')
+        assert [match.name for match in matches] == ['Open 1 F']
+
+
+class TestDirectory(object):
+    def test_team_stats(self, add_tournaments):
+        ''' Each match is counted once (not once per highlights type), per discipline '''
+        add_tournaments(2, highlights_types=('Highlights', 'Extended Highlights'))
+        add_tournaments(1, start_date=datetime.date(2022, 6, 1), teams=('Kamura_Sonoda', 'Kento Momota'), discipline='XD')
+
+        entries = {entry['name']: entry for entry in Team.directory()}
+
+        assert entries['Kento Momota']['num_matches'] == 9
+        assert entries['Kento Momota']['disciplines'] == {'MS': 6, 'XD': 3}
+        assert entries['Kento Momota']['latest_date'] == datetime.date(2022, 6, 3)
+        assert entries['Kento Momota']['country'] == 'JPN'
+        assert entries['Viktor Axelsen']['num_matches'] == 6
+
+    def test_team_without_matches(self, session, add_tournaments):
+        ''' Teams without matches are listed, with no stats '''
+        add_tournaments(1)
+        session.add(Team('Lee Zii Jia', None))
+        session.flush()
+
+        entry = Team.directory('L')[0]
+
+        assert entry['name'] == 'Lee Zii Jia'
+        assert entry['num_matches'] == 0
+        assert entry['latest_date'] is None
+        assert entry['disciplines'] == {}
+
+    def test_initials(self, add_tournaments):
+        ''' The directory is split by first letter '''
+        add_tournaments(1)
+        add_tournaments(1, teams=('Anthony Ginting', 'Viktor Axelsen'))
+
+        assert Team.initials() == ['A', 'K', 'V']
+        assert [entry['name'] for entry in Team.directory('V')] == ['Viktor Axelsen']
+
+    def test_country_stats(self, add_tournaments):
+        ''' A country counts the matches of all its teams, once each (eg. JPN vs JPN) '''
+        add_tournaments(1)
+        add_tournaments(1, teams=('Kento Momota', 'Kodai Naraoka'))
+
+        entries = {entry['name']: entry for entry in Country.directory()}
+
+        assert entries['JPN']['num_matches'] == 6
+        assert entries['DEN']['num_matches'] == 3
+
+    def test_countries_by_shown_name(self, add_tournaments):
+        ''' Countries are sorted by the name they're shown with (India before Indonesia, unlike IND & INA) '''
+        add_tournaments(1, teams=('Anthony Ginting', 'Lakshya Sen'))
+
+        assert [entry['name'] for entry in Country.directory()] == ['IND', 'INA']
+        assert [entry['name'] for entry in Country.directory('I')] == ['IND', 'INA']
+        assert 'I' in Country.initials()
+
+
+class TestFindLatest(object):
+    def test_closest_start(self, add_tournaments, queries):
+        ''' The tournament starting closest to `today` (the older one on ties), in 1 statement '''
+        add_tournaments(1, name='All England', start_date=datetime.date(2022, 3, 16))
+        add_tournaments(1, name='Swiss Open', start_date=datetime.date(2022, 3, 22))
+        del queries[:]
+
+        assert Tournament.find_latest(datetime.date(2022, 3, 19)).name == 'All England'
+        assert len(queries) == 1
+
+        assert Tournament.find_latest(datetime.date(2022, 3, 20)).name == 'Swiss Open'
+        assert Tournament.find_latest(datetime.date(2021, 1, 1)).name == 'All England'
+        assert Tournament.find_latest(datetime.date(2023, 1, 1)).name == 'Swiss Open'
+
+    def test_no_tournaments(self, session):
+        ''' Nothing to find without tournaments '''
+        assert Tournament.find_latest() is None
+
+
+class TestYears(object):
+    def test_in_years(self, add_tournaments):
+        ''' Years include their 1st and last day '''
+        add_tournaments(1, name='Last', start_date=datetime.date(2021, 12, 31))
+        add_tournaments(1, name='First', start_date=datetime.date(2022, 1, 1))
+        add_tournaments(1, name='Later', start_date=datetime.date(2024, 6, 1))
+
+        def names(*years):
+            return [tournament.name for tournament in Tournament.query.filter(Tournament.in_years(*years)).order_by(Tournament.start_date)]
+
+        assert names(2021) == ['Last']
+        assert names(2022) == ['First']
+        assert names(2021, 2023) == ['Last', 'First']
+        assert names(2023) == []
+
+    def test_in_years_is_a_range(self):
+        ''' The filter compares `start_date` itself, so it can use its index '''
+        sql = str(Tournament.in_years(2022))
+
+        assert 'extract' not in sql.lower()
+        assert 'tournaments.start_date >=' in sql
+        assert 'tournaments.start_date <' in sql
+
+    def test_find_years(self, add_tournaments):
+        ''' Each year once, newest first '''
+        add_tournaments(2, start_date=datetime.date(2021, 3, 1))
+        add_tournaments(1, start_date=datetime.date(2023, 3, 1))
+
+        assert Tournament.find_years() == [2023, 2021]
+
+
+class TestMatch(object):
+    def test_shared_details(self, add_tournaments):
+        ''' Each highlights type is 1 video of the same match '''
+        match = add_tournaments(1, name='Japan Open', highlights_types=('Highlights', 'Extended Highlights'))[0]
+
+        assert Match.find_by_folder_name('Japan_Open', 'Japan Open QF') is match
+        assert {video.match for video in match.renditions} == {match}
+        assert match.renditions[0].path('/videos') == '/videos/Japan_Open/Japan Open QF/[Highlights] QF.mp4'
+
+    def test_1_video_per_highlights_type(self, session, add_tournaments):
+        ''' A match can't have the same highlights type twice '''
+        match = add_tournaments(1)[0]
+
+        match.renditions.append(Video(
+            highlights_datetime=match.renditions[0].highlights_datetime,
+            highlights_type='Highlights',
+            highlights_filename='[Highlights] QF.mp4',
+            highlights_duration=300,
+            model_name='badminton'
+        ))
+
+        with pytest.raises(IntegrityError):
+            session.flush()
+
+    def test_delete_cascades(self, session, add_tournaments):
+        ''' Deleting a match deletes its videos '''
+        match = add_tournaments(1, highlights_types=('Highlights', 'Extended Highlights'))[0]
+        ids = [video.id for video in match.renditions]
+
+        Match.bulk_delete([match.id])
+        session.expire_all()
+
+        assert Video.query.filter(Video.id.in_(ids)).count() == 0
@@ -0,0 +1,85 @@
+from flask import url_for
+
+from libs.tests import ViewTestMixin
+from libs.util_cache import LRUBackend
+from badmintontv.extensions import page_cache
+
+
+class TestPageCache(ViewTestMixin):
+    def test_fragment_is_cached(self, add_tournaments):
+        ''' The catalog part of a page is rendered once, then served from the cache '''
+        add_tournaments(1)
+        misses, hits = page_cache.misses, page_cache.hits
+
+        first = self.client.get(url_for('video.tournament_to_matches', query='2022'))
+        second = self.client.get(url_for('video.tournament_to_matches', query='2022'))
+
+        assert page_cache.misses == misses + 1
+        assert page_cache.hits == hits + 1
+        assert first.data == second.data
+        assert b'Open 0' in second.data
+
+    def test_key_includes_path_and_query_string(self, add_tournaments):
+        ''' Each page, and each query string, has its own entry '''
+        add_tournaments(1)
+        misses = page_cache.misses
+
+        self.client.get(url_for('video.tournament_to_matches', query='2022'))
+        self.client.get(url_for('video.tournament_to_matches', query='2021'))
+        self.client.get(url_for('video.tournament_to_matches', query='2022', sort='asc'))
+
+        assert page_cache.misses == misses + 3
+        assert len(page_cache.backend) == 3
+
+    def test_shared_between_users(self, session, add_tournaments):
+        ''' The fragment doesn't depend on the user, but the page around it does '''
+        add_tournaments(1)
+        session.commit()
+        anonymous = self.client.get(url_for('video.teams'))
+        hits = page_cache.hits
+
+        self.login()
+        response = self.client.get(url_for('video.teams'))
+
+        assert page_cache.hits == hits + 1
+        assert response.data != anonymous.data
+        assert b'Kento Momota' in response.data
+
+    def test_commit_clears_the_cache(self, session, add_tournaments):
+        ''' Committing a catalog change drops every entry, so the next page shows it '''
+        add_tournaments(1)
+        self.client.get(url_for('video.tournament_to_matches', query='2022'))
+        assert len(page_cache.backend) == 1
+
+        add_tournaments(1, name='Japan Open')
+        session.commit()
+        assert len(page_cache.backend) == 0
+
+        response = self.client.get(url_for('video.tournament_to_matches', query='2022'))
+        assert b'Japan Open' in response.data
+
+    def test_other_commits_keep_the_cache(self, session, add_tournaments):
+        ''' Commits that don't change the catalog keep every entry '''
+        add_tournaments(1)
+        session.commit()
+        self.client.get(url_for('video.teams'))
+
+        self.login()
+
+        assert len(page_cache.backend) == 1
+
+
+class TestLRUBackend(object):
+    def test_evicts_least_recently_used(self):
+        ''' Once full, the entry that wasn't used for the longest is evicted '''
+        backend = LRUBackend(max_size=2)
+
+        backend.set('a', '1')
+        backend.set('b', '2')
+        backend.get('a')
+        backend.set('c', '3')
+
+        assert backend.get('a') == '1'
+        assert backend.get('b') is None
+        assert backend.get('c') == '3'
+        assert len(backend) == 2
@@ -0,0 +1,82 @@
+import json
+
+from flask import url_for
+
+from libs.tests import ViewTestMixin
+from badmintontv.blueprints.video.models import Team, Player
+from badmintontv.blueprints.video.catalog import catalog_cache
+
+
+class TestPlayer(object):
+    def test_names_in(self):
+        ''' Singles teams are 1 player, doubles teams are 2 '''
+        assert Player.names_in('Kento Momota') == ['Kento Momota']
+        assert Player.names_in('Kamura_Sonoda') == ['Kamura', 'Sonoda']
+        assert Player.names_in('Kamura_ ') == ['Kamura']
+
+    def test_link_players(self, session, add_tournaments):
+        ''' Teams share their players, and are re-linked when renamed '''
+        add_tournaments(1, teams=('Kamura_Sonoda', 'Kamura_Hoki'))
+
+        kamura = Player.find_by_name('Kamura')
+        assert sorted(team.name for team in kamura.teams) == ['Kamura_Hoki', 'Kamura_Sonoda']
+
+        team = Team.find_by_name('Kamura_Hoki')
+        team.name = 'Hoki_Kobayashi'
+        team.link_players()
+        session.flush()
+
+        assert [team.name for team in kamura.teams] == ['Kamura_Sonoda']
+        assert [player.name for player in team.players] == ['Hoki', 'Kobayashi']
+
+    def test_backfill(self, session, add_tournaments):
+        ''' Unlinked teams are linked; Re-running changes nothing '''
+        add_tournaments(1, teams=('Kamura_Sonoda', 'Kento Momota'))
+        Team.find_by_name('Kamura_Sonoda').players = []
+        session.flush()
+
+        assert Player.backfill() == 1
+        assert [player.name for player in Team.find_by_name('Kamura_Sonoda').players] == ['Kamura', 'Sonoda']
+
+        assert Player.backfill() == 0
+
+    def test_matches_by_player(self, add_tournaments):
+        ''' A player's matches are found across all of their teams, once each '''
+        add_tournaments(1, teams=('Kamura_Sonoda', 'Kamura_Hoki'))
+        add_tournaments(1, teams=('Kamura_Sonoda', 'Astrup_Rasmussen'))
+        add_tournaments(1, teams=('Hoki_Kobayashi', 'Astrup_Rasmussen'))
+
+        catalog = catalog_cache.get()
+
+        def tournaments(player):
+            return sorted(set(match.tournament.name for match in catalog.find_matches(catalog.matches_by_player, player)))
+
+        assert len(list(catalog.find_matches(catalog.matches_by_player, 'Kamura'))) == 6
+        assert tournaments('Kamura') == ['Open 0', 'Open 1']
+        assert tournaments('Hoki') == ['Open 0', 'Open 2']
+
+
+class TestPlayerToMatches(ViewTestMixin):
+    def test_player_to_matches(self, add_tournaments):
+        ''' Matches with every partner are listed '''
+        add_tournaments(1, name='Japan Open', teams=('Kamura_Sonoda', 'Astrup_Rasmussen'))
+        add_tournaments(1, name='Swiss Open', teams=('Kamura_Hoki', 'Astrup_Rasmussen'))
+        add_tournaments(1, name='All England', teams=('Hoki_Kobayashi', 'Astrup_Rasmussen'))
+
+        response = self.client.get(url_for('video.player_to_matches', query='Kamura'))
+
+        assert response.status_code == 200
+        assert b'Japan Open' in response.data
+        assert b'Swiss Open' in response.data
+        assert b'All England' not in response.data
+
+    def test_api_matches(self, add_tournaments):
+        ''' The matches API filters on a player '''
+        add_tournaments(1, teams=('Kamura_Sonoda', 'Astrup_Rasmussen'))
+        add_tournaments(1, teams=('Hoki_Kobayashi', 'Astrup_Rasmussen'))
+
+        response = self.client.get(url_for('video.api_matches', player='Sonoda'))
+        tournaments = json.loads(response.data)['tournaments']
+
+        assert [tournament['name'] for tournament in tournaments] == ['Open 0']
+        assert tournaments[0]['matches'][0]['videos'][0]['url'].endswith('/video.player_to_matches/Sonoda')
@@ -0,0 +1,123 @@
+from flask import url_for
+
+from libs.tests import ViewTestMixin
+from badmintontv.blueprints.user.models import User
+from badmintontv.blueprints.view.models import View
+from badmintontv.blueprints.video.models import CatalogVersion, RelatedVideos
+from badmintontv.blueprints.video.catalog import catalog_cache
+
+
+def videos(matches, highlights_type='Highlights'):
+    '''Returns: The video of `highlights_type` of each match'''
+    return [video for match in matches for video in match.renditions if video.highlights_type == highlights_type]
+
+
+def add_view(session, user, video):
+    session.add(View(ip='127.0.0.1', duration=60, user=user, video=video))
+
+
+class TestRelatedVideos(object):
+    def test_compute(self, session, add_tournaments):
+        ''' Later rounds first, then the same teams' other matches (newest first), each video only once '''
+        open_0 = videos(add_tournaments(1))
+        open_1 = videos(add_tournaments(1))
+        add_tournaments(1, teams=('Anthony Ginting', 'Kodai Naraoka'))
+
+        assert RelatedVideos.compute() == 9
+
+        qf, sf, final = open_0
+        related = RelatedVideos.find_by_video_id(qf.id)
+
+        assert related.next_round_ids == [sf.id, final.id]
+        assert related.same_teams_ids == [video.id for video in reversed(open_1)]
+        assert related.co_viewed_ids == []
+
+        # The final has no later round
+        assert RelatedVideos.find_by_video_id(final.id).next_round_ids == []
+
+    def test_highlights_type(self, add_tournaments):
+        ''' Only videos of the same highlights type are candidates '''
+        matches = add_tournaments(1, highlights_types=('Highlights', 'Extended Highlights'))
+
+        assert RelatedVideos.compute() == 6
+
+        qf = matches[0].renditions[0]
+        related = RelatedVideos.find_by_video_id(qf.id)
+        candidates = [video for match in matches for video in match.renditions if video.id in related.next_round_ids + related.same_teams_ids]
+
+        assert len(candidates) == 2
+        assert all(video.highlights_type == qf.highlights_type for video in candidates)
+
+    def test_co_viewed(self, session, add_tournaments):
+        ''' Videos watched by the same users, by number of users '''
+        video = videos(add_tournaments(1))[0]
+        other_qf, other_sf, other_final = videos(add_tournaments(1, teams=('Anthony Ginting', 'Kodai Naraoka')))
+
+        admin = User.find_by_identity('admin@local.host')
+        fan = User(email='fan@local.host', username='fan', password='password')
+        session.add(fan)
+
+        for user in (admin, fan):
+            add_view(session, user, video)
+            add_view(session, user, other_sf)
+        add_view(session, admin, other_final)
+        session.flush()
+
+        RelatedVideos.compute(limit=1)
+
+        assert RelatedVideos.find_by_video_id(video.id).co_viewed_ids == [other_sf.id]
+
+    def test_limit(self, add_tournaments):
+        ''' Lists are cut at `limit` '''
+        qf = videos(add_tournaments(3))[0]
+
+        RelatedVideos.compute(limit=2)
+
+        assert len(RelatedVideos.find_by_video_id(qf.id).same_teams_ids) == 2
+
+
+class TestUpNext(ViewTestMixin):
+    def test_match_page(self, session, add_tournaments):
+        ''' The match page lists the precomputed videos '''
+        qf, sf, final = videos(add_tournaments(1, name='Japan Open'))
+        RelatedVideos.compute()
+        self.login()
+
+        response = self.client.get(url_for('video.match', id=qf.id, highlights_type=qf.highlights_type, from_route='_', query='_'))
+
+        assert response.status_code == 200
+        assert b'<h3>Up next</h3>' in response.data
+        assert b'Next round' in response.data
+        assert b'Fans also watched' not in response.data
+
+    def test_not_computed(self, session, add_tournaments):
+        ''' Before the 1st compute, the match page has no "Up next" '''
+        qf = videos(add_tournaments(1))[0]
+        session.commit()
+        self.login()
+
+        response = self.client.get(url_for('video.match', id=qf.id, highlights_type=qf.highlights_type, from_route='_', query='_'))
+
+        assert response.status_code == 200
+        assert b'<h3>Up next</h3>' not in response.data
+
+    def test_recompute(self, session, add_tournaments):
+        ''' Recomputing bumps the match version only: the catalog is kept, and only the match page's ETag changes '''
+        qf = videos(add_tournaments(1))[0]
+        RelatedVideos.compute()
+        self.login()
+
+        match_url = url_for('video.match', id=qf.id, highlights_type=qf.highlights_type, from_route='_', query='_')
+        browse_url = url_for('video.tournament_to_matches', query='2022')
+
+        catalog = catalog_cache.get()
+        version, match_version = CatalogVersion.current()
+        match_page, browse_page = self.client.get(match_url), self.client.get(browse_url)
+
+        RelatedVideos.compute()
+
+        assert CatalogVersion.current() == (version, match_version + 1)
+        assert catalog_cache.get() is catalog
+        assert self.client.get(match_url).headers['ETag'] != match_page.headers['ETag']
+        assert self.client.get(browse_url).headers['ETag'] == browse_page.headers['ETag']
+        assert 'Last-Modified' not in match_page.headers
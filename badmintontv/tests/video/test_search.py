@@ -0,0 +1,65 @@
+from flask import url_for
+
+from libs.tests import ViewTestMixin
+from badmintontv.blueprints.video.models import Match, Team, _prefix_tsquery
+
+
+def search(*args):
+    '''Returns: Names of the matches found by `Match.search_ranked`, best match first'''
+    return [match.name for match in Match.search_ranked(*args).all()]
+
+
+class TestSearchRanked(object):
+    def test_prefix_tsquery(self):
+        ''' Every word is a prefix; Punctuation and underscores split words '''
+        assert _prefix_tsquery('Momota Japan') == 'momota:* & japan:*'
+        assert _prefix_tsquery("Kamura_Sonoda, o'") == 'kamura:* & sonoda:* & o:*'
+        assert _prefix_tsquery(' !? ') is None
+
+    def test_no_words(self):
+        ''' A query without words searches nothing '''
+        assert Match.search_ranked('--') is None
+
+    def test_prefixes(self, add_tournaments):
+        ''' Every word must match the start of a word (doubles teams included) '''
+        add_tournaments(1, name='Japan Open', teams=('Kamura_Sonoda', 'Viktor Axelsen'))
+        add_tournaments(1, name='Swiss Open')
+
+        assert sorted(search('sono jap')) == ['Japan Open F', 'Japan Open QF', 'Japan Open SF']
+        assert search('momota japan') == []
+
+    def test_rank(self, add_tournaments):
+        ''' Team names weigh more than tournament names; Ties are newest first '''
+        add_tournaments(1, name='Momota Cup', teams=('Anthony Ginting', 'Viktor Axelsen'))
+        add_tournaments(1, name='Swiss Open')
+
+        assert search('momota') == ['Swiss Open F', 'Swiss Open SF', 'Swiss Open QF', 'Momota Cup F', 'Momota Cup SF', 'Momota Cup QF']
+
+    def test_renamed_team(self, session, add_tournaments):
+        ''' Renaming a team refreshes the search vectors of its matches '''
+        add_tournaments(1)
+
+        team = Team.query.filter(Team.name == 'Kento Momota').one()
+        team.name = 'Kento Momota JPN'
+        session.flush()
+
+        assert len(search('jpn')) == 3
+
+
+class TestSearchView(ViewTestMixin):
+    def test_search(self, add_tournaments):
+        ''' Found matches are listed '''
+        add_tournaments(1, name='Japan Open')
+        add_tournaments(1, name='Swiss Open')
+
+        response = self.client.get(url_for('video.search', query='japan'))
+
+        assert response.status_code == 200
+        assert b'Japan Open' in response.data
+        assert b'Swiss Open' not in response.data
+
+    def test_empty_query(self):
+        ''' No query is an empty page, not an error '''
+        response = self.client.get(url_for('video.search'))
+
+        assert response.status_code == 200
@@ -0,0 +1,85 @@
+import datetime
+from urllib.parse import urlsplit, parse_qs
+
+from badmintontv.blueprints.video import signing
+from badmintontv.blueprints.video.signing import signed_video_url, verify_video_url, video_url_window_start
+
+
+def url_args(url):
+    '''Query string of a signed URL, as a dict'''
+    return {key: values[0] for key, values in parse_qs(urlsplit(url).query).items()}
+
+
+def freeze_time(monkeypatch, now):
+    '''Make `signing` see `now` (seconds since the epoch) as the current time'''
+    monkeypatch.setattr(signing.time, 'time', lambda: now)
+
+
+class TestSignedVideoUrl(object):
+    def test_round_trip(self, app):
+        ''' A signed URL is valid for its video '''
+        with app.test_request_context():
+            args = url_args(signed_video_url(1, 'Highlights', 7))
+
+        with app.test_request_context():
+            assert verify_video_url(1, 'Highlights', args) > 0
+            assert args['user'] == '7'
+
+    def test_other_video_user_or_type(self, app):
+        ''' A signed URL isn't valid for another video, type of highlights or user '''
+        with app.test_request_context():
+            args = url_args(signed_video_url(1, 'Highlights', 7))
+
+            assert verify_video_url(2, 'Highlights', args) is None
+            assert verify_video_url(1, 'Extended Highlights', args) is None
+            assert verify_video_url(1, 'Highlights', dict(args, user='8')) is None
+
+    def test_tampered_or_missing_fields(self, app):
+        ''' A URL whose expiry or signature was changed, or is missing, isn't valid '''
+        with app.test_request_context():
+            args = url_args(signed_video_url(1, 'Highlights', 7))
+
+            assert verify_video_url(1, 'Highlights', dict(args, expires=str(int(args['expires']) + 3600))) is None
+            assert verify_video_url(1, 'Highlights', dict(args, signature='0' * 64)) is None
+            assert verify_video_url(1, 'Highlights', dict(args, expires='never')) is None
+            assert verify_video_url(1, 'Highlights', {}) is None
+
+    def test_expiry(self, app, monkeypatch):
+        ''' A signed URL is valid for 1 to 2 windows, then expires '''
+        window = int(app.config['VIDEO_URL_DURATION'].total_seconds())
+        now = 1000 * window + 1
+
+        freeze_time(monkeypatch, now)
+        with app.test_request_context():
+            args = url_args(signed_video_url(1, 'Highlights', 7))
+
+        assert int(args['expires']) == 1002 * window
+
+        freeze_time(monkeypatch, 1002 * window - 1)
+        with app.test_request_context():
+            assert verify_video_url(1, 'Highlights', args) == 1
+
+        freeze_time(monkeypatch, 1002 * window)
+        with app.test_request_context():
+            assert verify_video_url(1, 'Highlights', args) is None
+
+    def test_same_url_during_a_window(self, app, monkeypatch):
+        ''' The URL only changes when a new window starts '''
+        window = int(app.config['VIDEO_URL_DURATION'].total_seconds())
+
+        urls = []
+        for now in (1000 * window, 1001 * window - 1, 1001 * window):
+            freeze_time(monkeypatch, now)
+            with app.test_request_context():
+                urls.append(signed_video_url(1, 'Highlights', 7))
+
+        assert urls[0] == urls[1]
+        assert urls[1] != urls[2]
+
+    def test_window_start(self, app, monkeypatch):
+        ''' Pages' validators change when the window does '''
+        window = int(app.config['VIDEO_URL_DURATION'].total_seconds())
+
+        freeze_time(monkeypatch, 1000 * window + 5)
+        with app.test_request_context():
+            assert video_url_window_start() == datetime.datetime.utcfromtimestamp(1000 * window)
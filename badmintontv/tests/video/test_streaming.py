@@ -0,0 +1,536 @@
+import os
+import shutil
+import datetime
+
+import pytest
+from flask import url_for
+from werkzeug.http import http_date
+from werkzeug.wsgi import FileWrapper
+from werkzeug.exceptions import NotFound
+
+from libs.tests import ViewTestMixin
+from badmintontv.blueprints.video.signing import signed_video_url
+from badmintontv.tests.video.test_signing import url_args
+from badmintontv.blueprints.video import media
+from badmintontv.blueprints.video.models import CatalogVersion, Video
+from badmintontv.blueprints.video.catalog import catalog_cache
+from badmintontv.blueprints.video.tasks import segment_video, encode_ladder_of_video, make_sprite_sheets_of_video
+from badmintontv.blueprints.video.streaming import send_video, send_playlist, send_thumbnail_track, stream_file, STREAM_MAX_RANGES
+
+# Contents of the test file: 1000 bytes, each the position mod 256
+DATA = bytes(i % 256 for i in range(1000))
+
+
+@pytest.fixture(scope='function')
+def path(tmpdir):
+    '''
+    Write `DATA` to a test file
+
+    Returns: Its path
+    '''
+    path = tmpdir.join('video.mp4')
+    path.write_binary(DATA)
+
+    return str(path)
+
+
+def stream(app, path, environ=None, **headers):
+    '''
+    Stream `path` for a request with `headers` (eg. `Range='bytes=0-9'`), and WSGI `environ` keys
+
+    Returns: `(response, body)`
+    '''
+    headers = {key.replace('_', '-'): value for key, value in headers.items()}
+
+    with app.test_request_context(headers=headers, environ_overrides=environ):
+        response = stream_file(path)
+
+    body = b''.join(response.response)
+    response.close()
+
+    return response, body
+
+
+def app_window(client):
+    '''Returns: `VIDEO_URL_DURATION`, in seconds'''
+    return int(client.application.config['VIDEO_URL_DURATION'].total_seconds())
+
+
+def etag_of(path):
+    '''Validator `stream_file` sends for `path`'''
+    stat = os.stat(path)
+    return '"{:x}-{:x}"'.format(int(stat.st_mtime), stat.st_size)
+
+
+class TestStreamFile(object):
+    def test_whole_file(self, app, path):
+        ''' No Range: 200 with the whole file '''
+        response, body = stream(app, path)
+
+        assert response.status_code == 200
+        assert response.content_length == len(DATA)
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        assert body == DATA
+
+    def test_single_range(self, app, path):
+        ''' 1 range: 206 with that part of the file '''
+        response, body = stream(app, path, Range='bytes=100-199')
+
+        assert response.status_code == 206
+        assert response.headers['Content-Range'] == 'bytes 100-199/1000'
+        assert response.content_length == 100
+        assert body == DATA[100:200]
+
+    def test_open_and_suffix_ranges(self, app, path):
+        ''' Ranges without an end, or of the last bytes, stop at the end of the file '''
+        response, body = stream(app, path, Range='bytes=990-')
+        assert response.headers['Content-Range'] == 'bytes 990-999/1000'
+        assert body == DATA[990:]
+
+        response, body = stream(app, path, Range='bytes=-10')
+        assert response.headers['Content-Range'] == 'bytes 990-999/1000'
+        assert body == DATA[-10:]
+
+        # A suffix longer than the file is the whole file
+        response, body = stream(app, path, Range='bytes=-5000')
+        assert response.headers['Content-Range'] == 'bytes 0-999/1000'
+        assert body == DATA
+
+    def test_range_past_the_end_is_clipped(self, app, path):
+        ''' A range ending after the file stops at its end '''
+        response, body = stream(app, path, Range='bytes=900-5000')
+
+        assert response.status_code == 206
+        assert response.headers['Content-Range'] == 'bytes 900-999/1000'
+        assert body == DATA[900:]
+
+    def test_several_ranges(self, app, path):
+        ''' Several ranges: 206 with a multipart/byteranges body '''
+        response, body = stream(app, path, Range='bytes=0-9,500-509')
+
+        assert response.status_code == 206
+        assert response.mimetype == 'multipart/byteranges'
+        assert response.content_length == len(body)
+
+        boundary = response.mimetype_params['boundary'].encode('ascii')
+        parts = body.split(b'--' + boundary)
+
+        assert parts[0] == b'\r\n'
+        assert parts[-1] == b'--\r\n'
+        assert parts[1] == b'\r\nContent-Type: video/mp4\r\nContent-Range: bytes 0-9/1000\r\n\r\n' + DATA[0:10] + b'\r\n'
+        assert parts[2] == b'\r\nContent-Type: video/mp4\r\nContent-Range: bytes 500-509/1000\r\n\r\n' + DATA[500:510] + b'\r\n'
+
+    def test_unsatisfiable_range(self, app, path):
+        ''' No range within the file: 416 '''
+        response, body = stream(app, path, Range='bytes=1000-1999')
+
+        assert response.status_code == 416
+        assert response.headers['Content-Range'] == 'bytes */1000'
+        assert body == b''
+
+    def test_too_many_ranges(self, app, path):
+        ''' More than `STREAM_MAX_RANGES` ranges: 200 with the whole file '''
+        ranges = ','.join('{}-{}'.format(i * 10, i * 10 + 1) for i in range(STREAM_MAX_RANGES + 1))
+        response, body = stream(app, path, Range='bytes=' + ranges)
+
+        assert response.status_code == 200
+        assert body == DATA
+
+    def test_if_range_etag(self, app, path):
+        ''' If-Range with the current ETag: 206; With another one: 200 with the whole file '''
+        response, body = stream(app, path, Range='bytes=0-9', If_Range=etag_of(path))
+        assert response.status_code == 206
+        assert body == DATA[:10]
+
+        response, body = stream(app, path, Range='bytes=0-9', If_Range='"0-0"')
+        assert response.status_code == 200
+        assert body == DATA
+
+    def test_if_range_date(self, app, path):
+        ''' If-Range with the current Last-Modified: 206; With another date: 200 with the whole file '''
+        mtime = datetime.datetime.utcfromtimestamp(int(os.stat(path).st_mtime))
+
+        response, body = stream(app, path, Range='bytes=0-9', If_Range=http_date(mtime))
+        assert response.status_code == 206
+
+        response, body = stream(app, path, Range='bytes=0-9', If_Range=http_date(mtime - datetime.timedelta(days=1)))
+        assert response.status_code == 200
+        assert body == DATA
+
+    def test_validators(self, app, path):
+        ''' The ETag and Last-Modified are those If-Range is checked against '''
+        response, body = stream(app, path)
+
+        assert response.headers['ETag'] == etag_of(path)
+        assert response.last_modified == datetime.datetime.utcfromtimestamp(int(os.stat(path).st_mtime))
+
+    def test_file_wrapper(self, app, path):
+        ''' The server's file wrapper sends the whole file only; Ranges are read up to their end '''
+        wrapped = []
+
+        def file_wrapper(f, chunk_size):
+            wrapped.append(f)
+            return FileWrapper(f, chunk_size)
+
+        environ = {'wsgi.file_wrapper': file_wrapper}
+
+        response, body = stream(app, path, environ)
+        assert body == DATA
+        assert len(wrapped) == 1
+
+        response, body = stream(app, path, environ, Range='bytes=100-199')
+        assert len(body) == response.content_length == 100
+        assert body == DATA[100:200]
+        assert len(wrapped) == 1
+
+    def test_missing_file(self, app, tmpdir):
+        ''' A missing file: 404 '''
+        with app.test_request_context():
+            with pytest.raises(NotFound):
+                stream_file(str(tmpdir.join('missing.mp4')))
+
+
+class TestSendVideo(object):
+    @pytest.fixture(autouse=True)
+    def vid_dir(self, app, tmpdir, monkeypatch):
+        monkeypatch.setitem(app.config, 'VID_DIR', str(tmpdir))
+
+    @pytest.fixture
+    def send(self, app, monkeypatch):
+        '''Returns: Function sending `path` the `delivery` way'''
+
+        def send(path, delivery):
+            monkeypatch.setitem(app.config, 'VIDEO_DELIVERY', delivery)
+
+            with app.test_request_context():
+                return send_video(path)
+
+        return send
+
+    def test_x_accel(self, send, tmpdir):
+        ''' nginx is pointed at the quoted path under `VIDEO_ACCEL_PREFIX` '''
+        response = send(str(tmpdir.join('Japan_Open', 'Japan Open F', '[Highlights] F.mp4')), 'x-accel')
+
+        assert response.headers['X-Accel-Redirect'] == '/protected-highlights/Japan_Open/Japan%20Open%20F/%5BHighlights%5D%20F.mp4'
+        assert response.data == b''
+        assert response.cache_control.private
+
+    def test_x_sendfile(self, send, tmpdir):
+        ''' Apache / lighttpd are pointed at the full path '''
+        path = str(tmpdir.join('Japan_Open', 'F.mp4'))
+
+        response = send(path, 'x-sendfile')
+
+        assert response.headers['X-Sendfile'] == path
+        assert response.data == b''
+
+    def test_outside_vid_dir(self, send, tmpdir):
+        ''' Paths outside `VID_DIR` are refused '''
+        with pytest.raises(NotFound):
+            send(str(tmpdir.join('..', 'secret.mp4')), 'x-accel')
+
+    def test_python(self, send, path):
+        ''' By default, Flask streams the file '''
+        response = send(path, 'python')
+
+        assert b''.join(response.response) == DATA
+        response.close()
+
+    def test_unknown_mode(self, send, path):
+        with pytest.raises(ValueError):
+            send(path, 'ftp')
+
+
+class TestSendPlaylist(object):
+    PLAYLIST = '#EXTM3U\n#EXT-X-MAP:URI="init.mp4"\n#EXTINF:6.0,\nseg0.m4s\n\n#EXT-X-ENDLIST\n'
+
+    def send(self, app, tmpdir, query_string):
+        path = tmpdir.join('index.m3u8')
+        path.write(self.PLAYLIST)
+
+        with app.test_request_context():
+            return send_playlist(str(path), query_string)
+
+    def test_signature_passed_on(self, app, tmpdir):
+        ''' Segments and the init segment get the query string; Tags and blank lines don't '''
+        response = self.send(app, tmpdir, 'user=1&signature=abc')
+
+        assert response.mimetype == 'application/vnd.apple.mpegurl'
+        assert response.get_data(as_text=True) == (
+            '#EXTM3U\n#EXT-X-MAP:URI="init.mp4?user=1&signature=abc"\n#EXTINF:6.0,\n'
+            'seg0.m4s?user=1&signature=abc\n\n#EXT-X-ENDLIST\n'
+        )
+
+    def test_no_query_string(self, app, tmpdir):
+        assert self.send(app, tmpdir, '').get_data(as_text=True) == self.PLAYLIST
+
+    def test_missing_file(self, app, tmpdir):
+        with app.test_request_context():
+            with pytest.raises(NotFound):
+                send_playlist(str(tmpdir.join('missing.m3u8')))
+
+
+class TestSendThumbnailTrack(object):
+    TRACK = 'WEBVTT\n\n00:00:00.000 --> 00:00:05.000\nsprite_000.jpg#xywh=160,0,160,90\n'
+
+    def test_signature_passed_on(self, app, tmpdir):
+        ''' Each sprite sheet gets the query string, before its fragment '''
+        path = tmpdir.join('thumbnails.vtt')
+        path.write(self.TRACK)
+
+        with app.test_request_context():
+            response = send_thumbnail_track(str(path), 'user=1&signature=abc')
+
+        assert response.mimetype == 'text/vtt'
+        assert response.get_data(as_text=True) == self.TRACK.replace('.jpg#', '.jpg?user=1&signature=abc#')
+
+
+class TestStream(ViewTestMixin):
+    @pytest.fixture(autouse=True)
+    def vid_dir(self, app, tmpdir, monkeypatch):
+        ''' Stream the test videos from a temporary `VID_DIR` '''
+        monkeypatch.setitem(app.config, 'VID_DIR', str(tmpdir))
+
+    @pytest.fixture(autouse=True)
+    def queued(self, monkeypatch):
+        ''' IDs of the videos whose ladder is queued (instead of sending the tasks to Celery) '''
+        queued = []
+        monkeypatch.setattr(encode_ladder_of_video, 'delay', queued.append)
+
+        return queued
+
+    def add_video(self, session, add_tournaments, tmpdir):
+        ''' Add 1 match, and write the file of its video; Returns: Video '''
+        video = add_tournaments(1)[0].renditions[0]
+        session.commit()
+
+        folder = tmpdir.join(video.match.folder, video.match.name).ensure(dir=True)
+        folder.join('[Highlights] {}'.format(video.match.filename)).write_binary(DATA)
+
+        return video
+
+    def test_stream(self, session, add_tournaments, tmpdir):
+        ''' Subscribers & admins can seek through a video '''
+        video = self.add_video(session, add_tournaments, tmpdir)
+        self.login()
+
+        response = self.client.get(url_for('video.stream', id=video.id, highlights_type='Highlights'), headers={'Range': 'bytes=10-19'})
+
+        assert response.status_code == 206
+        assert response.data == DATA[10:20]
+        assert response.cache_control.private
+
+    def test_anonymous(self, session, add_tournaments, tmpdir):
+        ''' Anonymous users are refused '''
+        video = self.add_video(session, add_tournaments, tmpdir)
+
+        response = self.client.get(url_for('video.stream', id=video.id, highlights_type='Highlights'))
+
+        assert response.status_code == 403
+
+    def test_grant(self, session, add_tournaments, tmpdir, queries):
+        ''' Once allowed, the next requests of the session don't load the user '''
+        video = self.add_video(session, add_tournaments, tmpdir)
+        self.login()
+        url = url_for('video.stream', id=video.id, highlights_type='Highlights')
+
+        self.client.get(url)
+        with self.client.session_transaction() as flask_session:
+            assert flask_session['stream_grant']['user_id'] == flask_session['user_id']
+        del queries[:]
+
+        response = self.client.get(url, headers={'Range': 'bytes=0-9'})
+
+        assert response.status_code == 206
+        assert not any('FROM users' in statement for statement in queries)
+
+    def test_signed_url(self, session, add_tournaments, tmpdir):
+        ''' A signed URL is played without a session, and may be cached until it expires '''
+        video = self.add_video(session, add_tournaments, tmpdir)
+        url = signed_video_url(video.id, 'Highlights', 1)
+
+        response = self.client.get(url, headers={'Range': 'bytes=0-9'})
+
+        assert response.status_code == 206
+        assert response.data == DATA[:10]
+        assert response.cache_control.public
+        assert 0 < response.cache_control.max_age <= 2 * app_window(self.client)
+
+    def test_tampered_url(self, session, add_tournaments, tmpdir):
+        ''' A signed URL for another video is a 403, even when logged in '''
+        video = self.add_video(session, add_tournaments, tmpdir)
+        self.login()
+        args = url_args(signed_video_url(video.id + 1, 'Highlights', 1))
+
+        response = self.client.get(url_for('video.stream', id=video.id, highlights_type='Highlights', **args))
+
+        assert response.status_code == 403
+
+    def test_match_page(self, session, add_tournaments, tmpdir):
+        ''' The match page plays the video from a signed URL '''
+        video = self.add_video(session, add_tournaments, tmpdir)
+        self.login()
+
+        response = self.client.get(url_for('video.match', id=video.id, highlights_type='Highlights', from_route='_', query='_'))
+
+        assert response.status_code == 200
+        assert url_args(signed_video_url(video.id, 'Highlights', 1))['signature'].encode() in response.data
+        assert b'hls.min.js' not in response.data
+        assert b'id="scrub-bar"' not in response.data
+
+    def test_unknown(self, session):
+        ''' An unknown video is a 404 '''
+        self.login()
+
+        response = self.client.get(url_for('video.stream', id=0, highlights_type='Highlights'))
+
+        assert response.status_code == 404
+
+    def segment(self, session, add_tournaments, tmpdir, sample_video):
+        ''' Add 1 match, with the sample video as its file, and segment it; Returns: Video '''
+        video = self.add_video(session, add_tournaments, tmpdir)
+        shutil.copy(sample_video, video.path(str(tmpdir)))
+
+        segment_video.run(video.id)
+        session.commit()
+
+        return video
+
+    def test_segment_video(self, session, add_tournaments, tmpdir, sample_video, queued):
+        ''' The task records the playlist of the video once, then queues its ladder '''
+        video = self.add_video(session, add_tournaments, tmpdir)
+        shutil.copy(sample_video, video.path(str(tmpdir)))
+        assert video.id in Video.find_ids_without(Video.hls_manifest)
+
+        assert segment_video.run(video.id) == '[Highlights] QF.hls/source/index.m3u8'
+        assert video.id not in Video.find_ids_without(Video.hls_manifest)
+        assert queued == [video.id]
+        assert segment_video.run(video.id) is None
+
+    def test_hls(self, session, add_tournaments, tmpdir, sample_video):
+        ''' The signed playlist passes its signature on to its segments, which are then served '''
+        video = self.segment(session, add_tournaments, tmpdir, sample_video)
+        url = signed_video_url(video.id, 'Highlights', 1, 'video.hls', filename='source/index.m3u8')
+        signature = url_args(url)['signature']
+
+        response = self.client.get(url)
+
+        assert response.status_code == 200
+        segments = [line for line in response.get_data(as_text=True).splitlines() if line and not line.startswith('#')]
+        assert segments and all(signature in segment for segment in segments)
+
+        response = self.client.get(url.split('index.m3u8')[0] + segments[0])
+
+        assert response.status_code == 200
+        assert response.mimetype == 'video/iso.segment'
+        assert response.data
+
+    def test_hls_match_page(self, app, session, add_tournaments, tmpdir, sample_video, monkeypatch):
+        ''' Once segmented, the match page plays the HLS playlist, natively or with hls.js (only loaded with its integrity hash) '''
+        video = self.segment(session, add_tournaments, tmpdir, sample_video)
+        self.login()
+        url = url_for('video.match', id=video.id, highlights_type='Highlights', from_route='_', query='_')
+
+        response = self.client.get(url)
+
+        assert b'source/index.m3u8' in response.data
+        assert b'data-hls="' in response.data
+        assert b'hls.min.js' not in response.data
+
+        monkeypatch.setitem(app.config, 'HLS_JS_INTEGRITY', 'sha384-test')
+
+        response = self.client.get(url)
+
+        assert b'hls.min.js" integrity="sha384-test" crossorigin="anonymous"></script>' in response.data
+
+    def test_segment_keeps_catalog(self, session, add_tournaments, tmpdir, sample_video):
+        ''' Recording a playlist bumps the match version: the catalog is kept, and only that video's match page is reloaded '''
+        video = self.add_video(session, add_tournaments, tmpdir)
+        shutil.copy(sample_video, video.path(str(tmpdir)))
+        id = video.id
+        self.login()
+
+        url = url_for('video.match', id=id, highlights_type='Highlights', from_route='_', query='_')
+        assert b'index.m3u8' not in self.client.get(url).data
+
+        catalog = catalog_cache.get()
+        version, match_version = CatalogVersion.current()
+
+        segment_video.run(id)
+        session.commit()
+
+        assert CatalogVersion.current() == (version, match_version + 1)
+        assert catalog_cache.get() is catalog
+        assert Video.find_changed_since(match_version) == [(id, 'Highlights')]
+        assert b'source/index.m3u8' in self.client.get(url).data
+
+    def test_hls_not_found(self, session, add_tournaments, tmpdir, sample_video):
+        ''' Not segmented yet, or not an HLS file: 404 '''
+        video = self.add_video(session, add_tournaments, tmpdir)
+        self.login()
+
+        response = self.client.get(url_for('video.hls', id=video.id, highlights_type='Highlights', filename='index.m3u8'))
+        assert response.status_code == 404
+
+        video = self.segment(session, add_tournaments, tmpdir, sample_video)
+
+        response = self.client.get(url_for('video.hls', id=video.id, highlights_type='Highlights', filename='../../[Highlights] QF.mp4'))
+        assert response.status_code == 404
+        response = self.client.get(url_for('video.hls', id=video.id, highlights_type='Highlights', filename='index.txt'))
+        assert response.status_code == 404
+
+    def test_ladder(self, session, add_tournaments, tmpdir, sample_video, monkeypatch):
+        ''' Once its ladder is encoded, the master playlist is played, and signs its variant playlists '''
+        monkeypatch.setattr(media, 'LADDER', (media.Rung('60p', 60, 100, 32),))
+        video = self.segment(session, add_tournaments, tmpdir, sample_video)
+
+        assert encode_ladder_of_video.run(video.id) == ['60p']
+        assert encode_ladder_of_video.run(video.id) is None
+        session.commit()
+        assert video.id not in Video.find_ids_without(Video.hls_master, Video.hls_manifest.isnot(None))
+
+        self.login()
+        response = self.client.get(url_for('video.match', id=video.id, highlights_type='Highlights', from_route='_', query='_'))
+        assert b'master.m3u8' in response.data
+
+        url = signed_video_url(video.id, 'Highlights', 1, 'video.hls', filename='master.m3u8')
+        response = self.client.get(url)
+        variants = [line for line in response.get_data(as_text=True).splitlines() if line and not line.startswith('#')]
+        assert sorted(variants) == ['60p/index.m3u8?' + url.split('?')[1], 'source/index.m3u8?' + url.split('?')[1]]
+
+        response = self.client.get(url.split('master.m3u8')[0] + variants[0])
+        assert response.status_code == 200
+
+    def test_sprites(self, session, add_tournaments, tmpdir, sample_video):
+        ''' The task makes the previews; The signed track passes its signature on to its sheets, shown by the match page '''
+        video = self.add_video(session, add_tournaments, tmpdir)
+        shutil.copy(sample_video, video.path(str(tmpdir)))
+
+        assert make_sprite_sheets_of_video.run(video.id) == '[Highlights] QF.sprites/thumbnails.vtt'
+        assert make_sprite_sheets_of_video.run(video.id) is None
+        session.commit()
+
+        url = signed_video_url(video.id, 'Highlights', 1, 'video.sprites', filename='thumbnails.vtt')
+        response = self.client.get(url)
+
+        assert response.status_code == 200
+        sheet = response.get_data(as_text=True).splitlines()[3].split('#')[0]
+        assert sheet == 'sprite_000.jpg?' + url.split('?')[1]
+
+        response = self.client.get(url.split('thumbnails.vtt')[0] + sheet)
+        assert response.status_code == 200
+        assert response.mimetype == 'image/jpeg'
+
+        self.login()
+        response = self.client.get(url_for('video.match', id=video.id, highlights_type='Highlights', from_route='_', query='_'))
+        assert b'<track kind="metadata" label="thumbnails"' in response.data
+        assert b'id="scrub-bar"' in response.data
+
+    def test_sprites_not_found(self, session, add_tournaments, tmpdir):
+        ''' No previews yet: 404 '''
+        video = self.add_video(session, add_tournaments, tmpdir)
+        self.login()
+
+        response = self.client.get(url_for('video.sprites', id=video.id, highlights_type='Highlights', filename='thumbnails.vtt'))
+
+        assert response.status_code == 404
@@ -0,0 +1,71 @@
+from flask import url_for
+
+from libs.tests import ViewTestMixin
+
+
+class TestBrowse(ViewTestMixin):
+    def test_tournament_to_matches(self, add_tournaments):
+        ''' A year's page lists its tournaments, newest first '''
+        add_tournaments(2)
+
+        response = self.client.get(url_for('video.tournament_to_matches', query='2022'))
+
+        assert response.status_code == 200
+        assert response.data.index(b'Open 1') < response.data.index(b'Open 0')
+
+    def test_team_to_matches(self, add_tournaments):
+        ''' A team's page is titled with its country '''
+        add_tournaments(1)
+
+        response = self.client.get(url_for('video.team_to_matches', query='Kento Momota'))
+
+        assert response.status_code == 200
+        assert b'Kento Momota (JPN)' in response.data
+
+    def test_team_to_matches_unknown_team(self):
+        ''' An unknown team has an empty page '''
+        response = self.client.get(url_for('video.team_to_matches', query='Nobody'))
+
+        assert response.status_code == 200
+
+    def test_country_to_matches(self, add_tournaments):
+        ''' A country's page lists the matches of its teams '''
+        add_tournaments(1)
+        add_tournaments(1, teams=('Anthony Ginting', 'Viktor Axelsen'))
+
+        response = self.client.get(url_for('video.country_to_matches', query='INA'))
+
+        assert response.status_code == 200
+        assert b'Open 1' in response.data
+        assert b'Open 0' not in response.data
+
+
+class TestDirectories(ViewTestMixin):
+    def test_teams(self, add_tournaments):
+        ''' Only the selected letter's teams are listed, with their stats '''
+        add_tournaments(1)
+        add_tournaments(1, teams=('Anthony Ginting', 'Viktor Axelsen'))
+
+        response = self.client.get(url_for('video.teams', letter='v'))
+
+        assert response.status_code == 200
+        assert b'Viktor Axelsen' in response.data
+        assert b'Anthony Ginting' not in response.data
+
+    def test_countries_default_letter(self, add_tournaments):
+        ''' The 1st letter is selected by default '''
+        add_tournaments(1)
+
+        response = self.client.get(url_for('video.countries'))
+
+        assert response.status_code == 200
+        assert b'DEN' in response.data
+        assert b'JPN' not in response.data
+
+
+class TestTournamentToMatches(ViewTestMixin):
+    def test_not_a_year(self):
+        ''' A non-numeric year is a 404 '''
+        response = self.client.get('/tournament_to_matches/not-a-year')
+
+        assert response.status_code == 404
@@ -0,0 +1,29 @@
+import pytest
+
+from badmintontv.blueprints.user.models import User
+from badmintontv.blueprints.view.models import View
+
+# Views are of the video tests' matches
+from badmintontv.tests.video.conftest import add_tournaments
+
+
+@pytest.fixture(scope='function')
+def add_views(session):
+    '''
+    Add views of the admin user
+
+    eg.
+        add_views(video, 60, 120)
+
+    Returns: Function adding 1 view of `video` per duration (in seconds)
+    '''
+
+    def add(video, *durations):
+        user = User.find_by_identity('admin@local.host')
+
+        for duration in durations:
+            session.add(View(ip='127.0.0.1', duration=duration, user=user, video=video))
+
+        session.flush()
+
+    return add
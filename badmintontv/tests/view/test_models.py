@@ -0,0 +1,61 @@
+import datetime
+
+import pytest
+
+from badmintontv.extensions import db
+from badmintontv.blueprints.view.models import View
+
+
+class TestDuration(object):
+    def test_duration_hms(self, add_tournaments, add_views):
+        ''' Seconds are shown as a time, and are an interval in SQL '''
+        video = add_tournaments(1)[0].renditions[0]
+        add_views(video, 303)
+
+        view = View.query.one()
+
+        assert view.duration_hms == datetime.time(0, 5, 3)
+        assert video.highlights_duration_hms == datetime.time(0, 5)
+        assert db.session.query(View.duration_hms).scalar() == datetime.timedelta(seconds=303)
+
+
+class TestWatchTime(object):
+    def test_per_video(self, add_tournaments, add_views):
+        ''' Views are counted, summed and averaged per video, most watched first '''
+        qf, sf, final = [match.renditions[0] for match in add_tournaments(1)]
+        add_views(qf, 60, 121)
+        add_views(final, 300)
+
+        rows = View.watch_time('video')
+
+        assert [(row.name, row.num_views, row.total_seconds, row.average_seconds) for row in rows] == [
+            ('Open 0 F (Highlights)', 1, 300, 300),
+            ('Open 0 QF (Highlights)', 2, 181, 91)
+        ]
+
+    def test_per_tournament_and_team(self, add_tournaments, add_views):
+        ''' A view counts for its tournament, and for both teams '''
+        add_views(add_tournaments(1)[0].renditions[0], 60)
+        add_views(add_tournaments(1, teams=('Anthony Ginting', 'Viktor Axelsen'))[0].renditions[0], 30, 30)
+
+        rows = View.watch_time('tournament')
+        assert [(row.name, row.total_seconds) for row in rows] == [('Open 0', 60), ('Open 1', 60)]
+
+        rows = View.watch_time('team', limit=2)
+        assert [(row.name, row.num_views, row.total_seconds) for row in rows] == [
+            ('Viktor Axelsen', 3, 120),
+            ('Kento Momota', 1, 60)
+        ]
+
+    def test_per_country(self, add_tournaments, add_views):
+        ''' A view counts once per country, even when both teams share it '''
+        add_views(add_tournaments(1, teams=('Kento Momota', 'Kodai Naraoka'))[0].renditions[0], 60)
+        add_views(add_tournaments(1)[0].renditions[0], 30)
+
+        rows = View.watch_time('country')
+
+        assert [(row.name, row.num_views, row.total_seconds) for row in rows] == [('JPN', 2, 90), ('DEN', 1, 30)]
+
+    def test_unknown_group(self):
+        with pytest.raises(ValueError):
+            View.watch_time('player')
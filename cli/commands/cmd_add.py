@@ -1,7 +1,7 @@
 import click
 import random
 
-from datetime import datetime, timedelta
+from datetime import datetime
 from faker import Faker
 from tqdm import tqdm
 
@@ -327,16 +327,8 @@ def views():
             random_id = random.randrange(0, num_videos) 
             video = db.session.query(Video)[random_id]
             
-            duration = video.highlights_duration
-            
-            duration_seconds = timedelta(
-                hours=duration.hour, 
-                minutes=duration.minute, 
-                seconds=duration.second
-            )
-            duration_seconds = duration_seconds.total_seconds()
-            duration_seconds = int(duration_seconds)
-            print(duration, duration_seconds)
+            # Watched anywhere from a few seconds to the whole video (in seconds)
+            duration = random.randint(1, max(video.highlights_duration, 1))
             
             # Create a fake unix timestamps 
             created_on = fake.date_time_between(
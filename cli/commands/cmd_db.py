@@ -1,12 +1,14 @@
 import click
 
 from sqlalchemy_utils import database_exists, create_database
+from sqlalchemy import inspect
 from sqlalchemy.schema import DropTable
 from sqlalchemy.ext.compiler import compiles
 
 from badmintontv.app import create_app
 from badmintontv.extensions import db
 from badmintontv.blueprints.user.models import User
+from badmintontv.blueprints.video.models import Match, Player
 
 # Create an app context for the database connection
 app = create_app()
@@ -109,7 +111,188 @@ def reset(ctx, with_testdb):
     ctx.invoke(seed)
 
 
+@click.command()
+def search_index():
+    '''
+    Add full-text search to an existing database, then (re)build every match's search vector
+    
+    Only needed once for databases created before `Match.search_vector` existed 
+    (`init` creates the column and its index)
+    '''
+    
+    db.session.execute('ALTER TABLE matches ADD COLUMN IF NOT EXISTS search_vector tsvector')
+    db.session.execute('CREATE INDEX IF NOT EXISTS ix_matches_search_vector ON matches USING gin (search_vector)')
+    
+    Match.refresh_search_vectors(db.session.connection())
+    
+    db.session.commit()
+
+
+@click.command()
+def normalize_matches():
+    '''
+    Split an existing database's `videos` into `matches` (1 row per match) and `videos` (1 row per highlights type)
+    
+    Video IDs are kept, so views, related videos and match page URLs stay valid.
+    Runs in a single transaction; Does nothing if the database is already normalized
+    '''
+    
+    if not inspect(db.engine).has_table('videos_teams'):
+        click.echo('Already normalized.')
+        return None
+    
+    # Create `matches` and `matches_teams`, on the session's connection so it's part of the same transaction 
+    # (`db.create_all()` would commit them on its own connection; Postgres DDL is transactional)
+    db.metadata.create_all(bind=db.session.connection())
+    
+    statements = [
+        
+        # 1 match per folder/name, with the details of its first video 
+        '''
+        INSERT INTO matches (created_on, updated_on, folder, name, filename, date, round, discipline, tournament_id)
+        SELECT DISTINCT ON (folder, name) created_on, updated_on, folder, name, filename, date, round, discipline, tournament_id
+        FROM videos
+        ORDER BY folder, name, id
+        ''',
+        
+        # Link every video to its match 
+        '''
+        ALTER TABLE videos 
+        ADD COLUMN match_id integer REFERENCES matches (id) ON UPDATE CASCADE ON DELETE CASCADE
+        ''',
+        '''
+        UPDATE videos SET match_id = matches.id
+        FROM matches
+        WHERE matches.folder = videos.folder AND matches.name = videos.name
+        ''',
+        'ALTER TABLE videos ALTER COLUMN match_id SET NOT NULL',
+        'CREATE INDEX ix_videos_match_id ON videos (match_id)',
+        'ALTER TABLE videos ADD CONSTRAINT uq_videos_match_id_highlights_type UNIQUE (match_id, highlights_type)',
+        
+        # Teams of each match, from its first video 
+        '''
+        INSERT INTO matches_teams (match_id, team_id)
+        SELECT videos.match_id, videos_teams.team_id
+        FROM videos_teams
+        JOIN videos ON videos.id = videos_teams.video_id
+        WHERE videos.id = (SELECT min(first.id) FROM videos AS first WHERE first.match_id = videos.match_id)
+        ''',
+        
+        # Drop the duplicated columns 
+        'DROP TABLE videos_teams',
+        '''
+        ALTER TABLE videos 
+        DROP COLUMN folder, 
+        DROP COLUMN name, 
+        DROP COLUMN filename, 
+        DROP COLUMN date, 
+        DROP COLUMN round, 
+        DROP COLUMN discipline, 
+        DROP COLUMN tournament_id, 
+        DROP COLUMN IF EXISTS search_vector
+        '''
+    ]
+    
+    for statement in statements:
+        db.session.execute(statement)
+    
+    Match.refresh_search_vectors(db.session.connection())
+    
+    db.session.commit()
+
+
+# Duration columns stored as seconds, and their table
+DURATION_COLUMNS = (
+    ('videos', 'highlights_duration'),
+    ('views', 'duration')
+)
+
+
+@click.command()
+def durations_to_seconds():
+    '''
+    Convert an existing database's `time` durations to `integer` seconds, in place
+    
+    Only needed once for databases created before durations were stored in seconds; 
+    Columns that are already integers are skipped
+    '''
+    
+    inspector = inspect(db.engine)
+    
+    for table, column in DURATION_COLUMNS:
+        types = {c['name']: c['type'] for c in inspector.get_columns(table)}
+        
+        if isinstance(types[column], db.Integer):
+            continue
+        
+        db.session.execute(
+            'ALTER TABLE {table} ALTER COLUMN {column} TYPE integer '
+            'USING EXTRACT(EPOCH FROM {column})::integer'.format(table=table, column=column)
+        )
+    
+    db.session.commit()
+
+
+@click.command()
+def players():
+    '''
+    Create the players of every team, and link them to their teams
+    
+    Only needed once for databases created before `Player` existed (new teams are linked 
+    at ingestion), or after renaming teams
+    '''
+    
+    # Create `players` and `teams_players`
+    db.create_all()
+    
+    num_teams = Player.backfill()
+    
+    click.echo('Linked the players of {} team(s).'.format(num_teams))
+
+
+# Derived file columns of `videos` (see `video/media.py`), and their type
+MEDIA_COLUMNS = (
+    ('hls_manifest', 'varchar(255)'),
+    ('hls_master', 'varchar(255)'),
+    ('hls_ladder', 'varchar(10)[]'),
+    ('poster', 'varchar(70)'),
+    ('sprites', 'varchar(255)'),
+    ('faststart', 'boolean'),
+    ('match_version', 'integer'),
+)
+
+# Columns of `catalog_versions` added since, and their type
+CATALOG_VERSION_COLUMNS = (
+    ('match_version', 'integer NOT NULL DEFAULT 0'),
+)
+
+
+@click.command()
+def media_columns():
+    '''
+    Add the derived file columns (HLS playlists, poster, sprites, ...) to an existing database's `videos`, 
+    and the match version to its `catalog_versions`
+    
+    Only needed once for databases created before these columns existed; Existing columns are skipped
+    '''
+    
+    for column, type_ in MEDIA_COLUMNS:
+        db.session.execute('ALTER TABLE videos ADD COLUMN IF NOT EXISTS {} {}'.format(column, type_))
+    
+    db.session.execute('CREATE INDEX IF NOT EXISTS ix_videos_match_version ON videos (match_version)')
+    
+    for column, type_ in CATALOG_VERSION_COLUMNS:
+        db.session.execute('ALTER TABLE catalog_versions ADD COLUMN IF NOT EXISTS {} {}'.format(column, type_))
+    
+    db.session.commit()
+
+
 # Add all commands to CLI
 cli.add_command(init)
 cli.add_command(seed)
 cli.add_command(reset)
+cli.add_command(search_index)
+cli.add_command(normalize_matches)
+cli.add_command(durations_to_seconds)
+cli.add_command(players)
+cli.add_command(media_columns)
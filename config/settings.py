@@ -35,11 +35,41 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_REDIS_MAX_CONNECTIONS = 5
 
+# Page cache for rendered catalog pages: 'lru', 'redis', 'simple' or 'null' (see `libs/util_cache.py`)
+PAGE_CACHE_TYPE = 'lru'
+PAGE_CACHE_SIZE = 512                   # Max number of entries ('lru' only)
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24       # Seconds ('redis' only)
+PAGE_CACHE_REDIS_URL = 'redis://:{}@{}:{}/1'.format(password, hostname, port)
+
 # Run these tasks on a set schedule
 CELERYBEAT_SCHEDULE = {
     'mark-soon-to-expire-credit-cards': {                                        # Name
         'task': 'badmintontv.blueprints.billing.tasks.mark_old_credit_cards',    # Task: Mark credit cards that are going to expire soon, or have expired
         'schedule': crontab(hour=0, minute=0)                                    # Schedule: Every day at midnight)
+    },
+    'compute-related-videos': {                                                  # Name
+        'task': 'badmintontv.blueprints.video.tasks.compute_related_videos',     # Task: Recompute "Up next" videos (co-views change every day)
+        'schedule': crontab(hour=3, minute=0)                                    # Schedule: Every day at 3am
+    },
+    'make-videos-faststart': {                                                   # Name
+        'task': 'badmintontv.blueprints.video.tasks.make_videos_faststart',      # Task: Move the index of new videos to the start of their file (retries any that failed)
+        'schedule': crontab(hour=3, minute=30)                                   # Schedule: Every day at 3:30am
+    },
+    'segment-videos': {                                                          # Name
+        'task': 'badmintontv.blueprints.video.tasks.segment_videos',             # Task: Segment new videos into HLS (retries any that failed)
+        'schedule': crontab(hour=4, minute=0)                                    # Schedule: Every day at 4am
+    },
+    'encode-ladders': {                                                          # Name
+        'task': 'badmintontv.blueprints.video.tasks.encode_ladders',             # Task: Encode missing bitrate ladders (resumes any that failed)
+        'schedule': crontab(hour=4, minute=30)                                   # Schedule: Every day at 4:30am
+    },
+    'make-posters': {                                                            # Name
+        'task': 'badmintontv.blueprints.video.tasks.make_posters',               # Task: Make missing posters (retries any that failed)
+        'schedule': crontab(hour=5, minute=0)                                    # Schedule: Every day at 5am
+    },
+    'make-sprite-sheets': {                                                      # Name
+        'task': 'badmintontv.blueprints.video.tasks.make_sprite_sheets',         # Task: Make missing scrubbing previews (retries any that failed)
+        'schedule': crontab(hour=5, minute=30)                                   # Schedule: Every day at 5:30am
     }
 }
 
@@ -136,5 +166,43 @@ MAIL_PORT = 587
 config_settings_dir = dirname(abspath(__file__))  # /badmintontv/config
 VID_DIR = os.path.join('/badmintontv', 'highlights')  # /badmintontv/highlights
 
+# How video files are sent, once the user is allowed to watch them (see `video/streaming.py`):
+#   'python'       Flask streams the file (development)
+#   'x-accel'      nginx streams it, from `X-Accel-Redirect: <VIDEO_ACCEL_PREFIX><path in VID_DIR>`
+#   'x-sendfile'   Apache (mod_xsendfile) / lighttpd stream it, from `X-Sendfile: <full path>`
+VIDEO_DELIVERY = 'python'
+
+# nginx `internal` location that serves `VID_DIR`, eg.
+#   location /protected-highlights/ { internal; alias /badmintontv/highlights/; }
+VIDEO_ACCEL_PREFIX = '/protected-highlights/'
+
+# Signed video URLs are renewed every `VIDEO_URL_DURATION`, and stay valid for 1 to 2 of them (see `video/signing.py`)
+VIDEO_URL_DURATION = timedelta(hours=1)
+
+# Poster cache (see `video/media.py`), served as static files, and the number of processes making posters
+POSTER_DIR = os.path.join(dirname(config_settings_dir), 'badmintontv', 'static', 'posters')
+POSTER_URL = '/static/posters'
+POSTER_WORKERS = 2
+
+# Max number of ffmpeg processes encoding a video's bitrate ladder at once, per task (see `video/media.py`)
+# Note: This isn't a global limit; With N Celery worker processes, up to N x `LADDER_WORKERS` encodes can run at once
+LADDER_WORKERS = 2
+
+# hls.js, loaded by the match page for adaptive bitrate outside Safari (see `video/templates/match.html`), 
+# pinned by the Subresource Integrity hash of that exact file ('sha384-...'), eg. from
+#   curl -s <HLS_JS_URL> | openssl dgst -sha384 -binary | openssl base64 -A
+# Note: hls.js isn't loaded until `HLS_JS_INTEGRITY` is set (browsers then play the HLS <source> natively, or the mp4)
+HLS_JS_URL = 'https://cdn.jsdelivr.net/npm/hls.js@1.4.12/dist/hls.min.js'
+HLS_JS_INTEGRITY = None
+
+# Bytes read at a time, when streaming a video without the server's file wrapper (see `video/streaming.py`)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# How long a session may stream videos before the user's subscription is checked again 
+STREAM_GRANT_DURATION = timedelta(minutes=30)
+
 METADATA_RUN_FILENAME = 'metadata_run.json'
 METADATA_MATCH_FILENAME = 'metadata_match.json'
+
+# Seconds between each check for a new catalog version (see `video/catalog.py`)
+CATALOG_VERSION_CHECK_INTERVAL = 5
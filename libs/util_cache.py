@@ -0,0 +1,202 @@
+import threading
+
+from collections import OrderedDict
+from flask import request, Markup
+from flask_babel import get_locale
+
+
+class LRUBackend(object):
+    '''In-process cache that evicts the least recently used entry once it holds `max_size` entries'''
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+
+            if value is not None:
+                self._entries.move_to_end(key)
+
+            return value
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SimpleBackend(object):
+    '''
+    Local stand-in for `RedisBackend`, used by tests
+
+    Entries are never evicted, so tests can count exactly what was cached
+    '''
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, value, timeout=None):
+        self._entries[key] = value
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend(object):
+    '''Cache shared by all workers, stored in Redis under `prefix`'''
+
+    def __init__(self, url, prefix='page_cache:'):
+        import redis
+
+        self.prefix = prefix
+        self._redis = redis.StrictRedis.from_url(url)
+
+    def get(self, key):
+        value = self._redis.get(self.prefix + key)
+
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, timeout=None):
+        self._redis.set(self.prefix + key, value, ex=timeout)
+
+    def clear(self):
+        keys = list(self._redis.scan_iter(match=self.prefix + '*', count=500))
+
+        # Delete in batches to keep each command small
+        for i in range(0, len(keys), 500):
+            self._redis.delete(*keys[i:i + 500])
+
+    def __len__(self):
+        return sum(1 for _ in self._redis.scan_iter(match=self.prefix + '*', count=500))
+
+
+class PageCache(object):
+    '''
+    Caches rendered pages (or page fragments)
+
+    Entries are keyed on the route, its query string and the current locale
+
+    Backends (`PAGE_CACHE_TYPE`):
+        'lru':      In-process LRU of `PAGE_CACHE_SIZE` entries (default)
+        'redis':    Shared between workers, stored at `PAGE_CACHE_REDIS_URL`
+        'simple':   Local stand-in for Redis, used by tests
+        'null':     Disable caching
+    '''
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.timeout = None
+        self.hits = 0
+        self.misses = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        '''
+        Set-up the backend selected in the app's config
+
+        Params:
+            app: Flask application instance
+        '''
+
+        cache_type = app.config.get('PAGE_CACHE_TYPE', 'lru')
+
+        if cache_type == 'redis':
+            self.backend = RedisBackend(app.config['PAGE_CACHE_REDIS_URL'])
+        elif cache_type == 'simple':
+            self.backend = SimpleBackend()
+        elif cache_type == 'lru':
+            self.backend = LRUBackend(app.config.get('PAGE_CACHE_SIZE', 512))
+        else:
+            self.backend = None
+
+        self.timeout = app.config.get('PAGE_CACHE_TIMEOUT')
+
+    def cached(self, render, *key_parts):
+        '''
+        Get the rendered page for the current request, rendering and caching it on a miss
+
+        Params:
+            render (function):   Renders the page; Only called on a miss
+            *key_parts:          Extra values that the page depends on (eg. catalog version)
+
+        Returns: Markup
+        '''
+
+        if self.backend is None:
+            return Markup(render())
+
+        key = self.make_key(*key_parts)
+
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return Markup(value)
+
+        self.misses += 1
+
+        value = render()
+        self.backend.set(key, value, timeout=self.timeout)
+
+        return Markup(value)
+
+    def make_key(self, *key_parts):
+        '''
+        Build a cache key for the current request
+
+        eg.
+            'video.team_to_matches|/team_to_matches/Kento%20Momota?|ja|42'
+
+        Returns: str
+        '''
+
+        parts = [request.endpoint, request.full_path, str(get_locale())]
+        parts.extend(str(part) for part in key_parts)
+
+        return '|'.join(parts)
+
+    def clear(self):
+        '''Remove all entries'''
+
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        '''
+        Hit/miss counters for this worker, used to size the cache
+
+        Returns: dict
+        '''
+
+        lookups = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups * 100) if lookups else 0,
+            'size': len(self.backend) if self.backend is not None else 0
+        }
@@ -65,3 +65,52 @@ def timedelta_months(months, compare_date=None):
     compare_date_with_delta = compare_date + datetime.timedelta(delta)
 
     return compare_date_with_delta
+
+
+def time_to_seconds(value):
+    '''
+    Converts a duration --> `int` seconds
+    
+    eg.
+        datetime.time(0, 5, 3) --> 303
+        '00:05:03' --> 303
+        303.4 --> 303
+    
+    Params:
+        value (datetime.time, str or number):   Duration, as a time of day, 'H:MM:SS' or seconds
+    
+    Returns: int
+    '''
+    
+    if isinstance(value, datetime.time):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    
+    if isinstance(value, str) and ':' in value:
+        seconds = 0
+        for part in value.split(':'):
+            seconds = seconds * 60 + float(part)
+        
+        return int(seconds)
+    
+    return int(float(value))
+
+
+def seconds_to_time(seconds):
+    '''
+    Converts `int` seconds --> `datetime.time`, for display
+    
+    eg.
+        303 --> datetime.time(0, 5, 3)
+    
+    Note: Durations of a day or more wrap around
+    
+    Returns: `datetime.time`, or None if `seconds` is None
+    '''
+    
+    if seconds is None:
+        return None
+    
+    minutes, second = divmod(int(seconds), 60)
+    hour, minute = divmod(minutes, 60)
+    
+    return datetime.time(hour % 24, minute, second)